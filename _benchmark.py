@@ -0,0 +1,204 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+
+from _manager import Manager
+
+
+class SysbenchResultParser(object):
+
+    """
+    Parse the output of `sysbench run` line by line into the per-interval series and the final summary.
+    """
+
+    INTERVAL_PATTERN = re.compile(
+        r'^\[\s*(?P<time>\d+)s\s*\]\s+thds:\s*(?P<threads>\d+)\s+tps:\s*(?P<tps>[\d.]+)\s+qps:\s*(?P<qps>[\d.]+)\s+'
+        r'\(r/w/o:\s*(?P<reads>[\d.]+)/(?P<writes>[\d.]+)/(?P<others>[\d.]+)\)\s+'
+        r'lat\s+\(ms,\s*(?P<percentile>\d+)%\):\s*(?P<latency>[\d.]+)\s+'
+        r'err/s:?\s*(?P<errors>[\d.]+)\s+reconn/s:?\s*(?P<reconnects>[\d.]+)'
+    )
+    SUMMARY_PATTERNS = [
+        ('reads', re.compile(r'^read:\s+(\d+)')),
+        ('writes', re.compile(r'^write:\s+(\d+)')),
+        ('others', re.compile(r'^other:\s+(\d+)')),
+        ('transactions', re.compile(r'^transactions:\s+\d+\s+\(([\d.]+) per sec\.\)')),
+        ('queries', re.compile(r'^queries:\s+\d+\s+\(([\d.]+) per sec\.\)')),
+        ('errors', re.compile(r'^ignored errors:\s+\d+\s+\(([\d.]+) per sec\.\)')),
+        ('reconnects', re.compile(r'^reconnects:\s+\d+\s+\(([\d.]+) per sec\.\)')),
+        ('total_time', re.compile(r'^total time:\s+([\d.]+)s')),
+        ('events', re.compile(r'^total number of events:\s+(\d+)')),
+        ('lat_min', re.compile(r'^min:\s+([\d.]+)')),
+        ('lat_avg', re.compile(r'^avg:\s+([\d.]+)')),
+        ('lat_max', re.compile(r'^max:\s+([\d.]+)')),
+        ('lat_percentile', re.compile(r'^\d+th percentile:\s+([\d.]+)')),
+    ]
+    PERCENTILE_PATTERN = re.compile(r'^(\d+)th percentile:')
+
+    def __init__(self):
+        self.series = []
+        self.summary = {}
+
+    def feed(self, line):
+        line = line.strip()
+        if not line:
+            return
+        match = self.INTERVAL_PATTERN.match(line)
+        if match:
+            point = dict([(key, float(value)) for key, value in match.groupdict().items()])
+            point['time'] = int(point['time'])
+            point['threads'] = int(point['threads'])
+            point['percentile'] = int(point['percentile'])
+            self.series.append(point)
+            return
+        for key, pattern in self.SUMMARY_PATTERNS:
+            if key in self.summary:
+                continue
+            match = pattern.match(line)
+            if match:
+                self.summary[key] = float(match.group(1))
+                if key == 'lat_percentile':
+                    self.summary['percentile'] = int(self.PERCENTILE_PATTERN.match(line).group(1))
+                break
+
+    @property
+    def result(self):
+        if 'transactions' not in self.summary:
+            return None
+        summary = dict(self.summary)
+        # the rates of the transactions and the queries are the tps and the qps of the run
+        summary['tps'] = summary.pop('transactions')
+        summary['qps'] = summary.pop('queries')
+        return {'series': self.series, 'summary': summary}
+
+
+class BenchmarkResultManager(Manager):
+
+    """
+    Keep the results of the test commands in a sqlite file, one row for every run with its series of the
+    intermediate reports and its timings of the loads and the queries, so that runs can be compared without
+    the terminal output.
+    """
+
+    RELATIVE_PATH = 'benchmark/'
+    DB_NAME = 'results.db'
+    SCHEMA_VERSION = 1
+    SERIES_FIELDS = ['time', 'threads', 'tps', 'qps', 'reads', 'writes', 'others', 'percentile', 'latency', 'errors', 'reconnects']
+    TIMING_FIELDS = ['phase', 'name', 'stream', 'start', 'cost']
+
+    def __init__(self, home_path, stdio=None):
+        super(BenchmarkResultManager, self).__init__(home_path, stdio=stdio)
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(os.path.join(self.path, self.DB_NAME), timeout=30)
+            self._init_schema()
+        return self._conn
+
+    def _init_schema(self):
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, test TEXT, '
+                               'deploy_name TEXT, config_hash TEXT, optimization INTEGER, stage TEXT, options TEXT, '
+                               'summary TEXT, created REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS runs_deploy ON runs (test, deploy_name, id)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS series (run_id INTEGER, time INTEGER, threads INTEGER, tps REAL, qps REAL, '
+                               'reads REAL, writes REAL, others REAL, percentile INTEGER, latency REAL, errors REAL, reconnects REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS series_run ON series (run_id, time)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS timings (run_id INTEGER, phase TEXT, name TEXT, stream INTEGER, start REAL, cost REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS timings_run ON timings (run_id, phase)')
+            self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('schema_version', str(self.SCHEMA_VERSION)))
+
+    @staticmethod
+    def config_hash(deploy_config):
+        md5 = hashlib.md5()
+        with open(deploy_config.yaml_path, 'rb') as f:
+            md5.update(f.read())
+        return md5.hexdigest()
+
+    @staticmethod
+    def dump_options(options, ignore=('password', )):
+        data = {}
+        for key, value in vars(options).items():
+            if key in ignore or value is None:
+                continue
+            if not isinstance(value, (int, float, bool, str)):
+                value = str(value)
+            data[key] = value
+        return json.dumps(data, sort_keys=True)
+
+    def add_run(self, test, deploy_name, config_hash, optimization, stage, options, result):
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (test, deploy_name, config_hash, optimization, stage, options, summary, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (test, deploy_name, config_hash, optimization, stage, options, json.dumps(result['summary'], sort_keys=True), time.time())
+            )
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                'INSERT INTO series VALUES (?, %s)' % ', '.join(['?'] * len(self.SERIES_FIELDS)),
+                [[run_id] + [point.get(field) for field in self.SERIES_FIELDS] for point in result.get('series', [])]
+            )
+            self.conn.executemany(
+                'INSERT INTO timings VALUES (?, %s)' % ', '.join(['?'] * len(self.TIMING_FIELDS)),
+                [[run_id] + [timing.get(field) for field in self.TIMING_FIELDS] for timing in result.get('timings', [])]
+            )
+        return run_id
+
+    def _run_info(self, row):
+        return {
+            'id': row[0],
+            'test': row[1],
+            'deploy_name': row[2],
+            'config_hash': row[3],
+            'optimization': row[4],
+            'stage': row[5],
+            'options': json.loads(row[6]) if row[6] else {},
+            'summary': json.loads(row[7]) if row[7] else {},
+            'created': row[8]
+        }
+
+    def get_runs(self, test, run_ids):
+        runs = []
+        for run_id in run_ids:
+            row = self.conn.execute('SELECT * FROM runs WHERE id = ? AND test = ?', (run_id, test)).fetchone()
+            if row:
+                runs.append(self._run_info(row))
+        return runs
+
+    def get_last_runs(self, test, deploy_name, limit=1):
+        rows = self.conn.execute('SELECT * FROM runs WHERE test = ? AND deploy_name = ? ORDER BY id DESC LIMIT ?', (test, deploy_name, limit)).fetchall()
+        return [self._run_info(row) for row in rows]
+
+    def get_series(self, run_id):
+        rows = self.conn.execute('SELECT %s FROM series WHERE run_id = ? ORDER BY time' % ', '.join(self.SERIES_FIELDS), (run_id, )).fetchall()
+        return [dict(zip(self.SERIES_FIELDS, row)) for row in rows]
+
+    def get_timings(self, run_id):
+        rows = self.conn.execute('SELECT %s FROM timings WHERE run_id = ? ORDER BY start' % ', '.join(self.TIMING_FIELDS), (run_id, )).fetchall()
+        return [dict(zip(self.TIMING_FIELDS, row)) for row in rows]
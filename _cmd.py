@@ -31,7 +31,6 @@ from optparse import OptionParser, BadOptionError, Option, IndentedHelpFormatter
 
 from colorama import Fore
 
-from core import ObdHome
 from _stdio import IO, FormtatText
 from _lock import LockMode
 from tool import DirectoryUtil, FileUtil, NetUtil, COMMAND_ENV
@@ -233,6 +232,8 @@ class ObdCommand(BaseCommand):
             ROOT_IO.track_limit += 1
             ROOT_IO.verbose('cmd: %s' % self.cmds)
             ROOT_IO.verbose('opts: %s' % self.opts)
+            # core pulls in the managers and the plugin loader, it is loaded only by the commands that run
+            from core import ObdHome
             obd = ObdHome(home_path=self.OBD_PATH, dev_mode=self.dev_mode, lock_mode=self.lock_mode, stdio=ROOT_IO)
             obd.set_options(self.opts)
             obd.set_cmds(self.cmds)
@@ -1254,6 +1255,7 @@ class MySQLTestCommand(TestMirrorCommand):
         self.parser.add_option('--cluster-mode', type='string', help="The mode of mysqltest")
         self.parser.add_option('--disable-reboot', action='store_true', help='Never reboot during test.', default=False)
         self.parser.add_option('--fast-reboot', action='store_true', help='Reboot using snapshots.', default=False)
+        self.parser.add_option('--parallel', type='int', help='How many cases run at the same time, each worker in its own database. The cases in the reboot list run one by one. [1]', default=1)
 
     def _do_command(self, obd):
         if self.cmds:
@@ -1288,6 +1290,7 @@ class SysBenchCommand(TestMirrorCommand):
         self.parser.add_option('-O', '--optimization', type='int', help='Optimization level {0/1/2}. [1] 0 - No optimization. 1 - Optimize some of the parameters which do not need to restart servers. 2 - Optimize all the parameters and maybe RESTART SERVERS for better performance.', default=1)
         self.parser.add_option('-S', '--skip-cluster-status-check', action='store_true', help='Skip cluster status check', default=False)
         self.parser.add_option('--mysql-ignore-errors', type='string', help='list of errors to ignore, or "all". ', default='1062')
+        self.parser.add_option('--compare', type='string', help='Compare the saved results of the runs instead of running a test. Separate multiple run IDs with commas. A single run ID is compared with the last run of the deployment.')
 
     def _do_command(self, obd):
         if self.cmds:
@@ -1319,6 +1322,8 @@ class TPCHCommand(TestMirrorCommand):
         self.parser.add_option('-O', '--optimization', type='int', help='Optimization level {0/1/2}. [1] 0 - No optimization. 1 - Optimize some of the parameters which do not need to restart servers. 2 - Optimize all the parameters and maybe RESTART SERVERS for better performance.', default=1)
         self.parser.add_option('--test-only', action='store_true', help='Only testing SQLs are executed. No initialization is executed.')
         self.parser.add_option('-S', '--skip-cluster-status-check', action='store_true', help='Skip cluster status check', default=False)
+        self.parser.add_option('--load-workers', type='int', help='Number of tables loaded at the same time. [1]', default=1)
+        self.parser.add_option('--streams', type='int', help='Number of concurrent query streams of the throughput test run after the power test. 0 disables the throughput test. [0]', default=0)
 
     def _do_command(self, obd):
         if self.cmds:
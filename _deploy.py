@@ -26,7 +26,7 @@ import re
 import sys
 import getpass
 import hashlib
-from copy import deepcopy
+from copy import deepcopy, copy
 from enum import Enum
 
 from ruamel.yaml.comments import CommentedMap
@@ -422,6 +422,7 @@ class ClusterConfig(object):
         self._package_hash = package_hash
         self._temp_conf = {}
         self._all_default_conf = {}
+        self._mutable_default_keys = []
         self._default_conf = {}
         self._global_conf = None
         self._server_conf = {}
@@ -490,7 +491,7 @@ class ClusterConfig(object):
     def __deepcopy__(self, memo):
         cluster_config = self.__class__(deepcopy(self.servers), self.name, self.version, self.tag, self.package_hash, self.parser)
         copy_attrs = ['origin_tag', 'origin_version', 'origin_package_hash', 'parser']
-        deepcopy_attrs = ['_temp_conf', '_default_conf', '_global_conf', '_server_conf', '_cache_server', '_original_global_conf', '_depends', '_original_servers', '_inner_config']
+        deepcopy_attrs = ['_temp_conf', '_default_conf', '_all_default_conf', '_mutable_default_keys', '_global_conf', '_server_conf', '_cache_server', '_original_global_conf', '_depends', '_original_servers', '_inner_config']
         for attr in copy_attrs:
             setattr(cluster_config, attr, getattr(self, attr))
         for attr in deepcopy_attrs:
@@ -575,11 +576,12 @@ class ClusterConfig(object):
         if name not in self._depends:
             return None
         cluster_config = self._depends[name]
-        if with_default:
-            config = cluster_config.get_server_conf_with_default(server) if server else cluster_config.get_global_conf_with_default()
-        else:
-            config = cluster_config.get_server_conf(server) if server else cluster_config.get_global_conf()
-        return deepcopy(config)
+        config = cluster_config.get_server_conf(server) if server else cluster_config.get_global_conf()
+        if config is None:
+            return None
+        config = deepcopy(config)
+        # the defaults are copied by _get_conf_with_default, so only the smaller configured layer is deep copied
+        return cluster_config._get_conf_with_default(config) if with_default else config
 
     def update_server_conf(self, server, key, value, save=True):
         if self._deploy_config is None:
@@ -642,14 +644,30 @@ class ClusterConfig(object):
                 items.append(key)
         return items
 
+    def _get_conf_with_default(self, conf):
+        # a new dict for the caller. The defaults are plain values except a few, so only those are copied
+        config = dict(self._all_default_conf)
+        for key in self._mutable_default_keys:
+            config[key] = deepcopy(config[key])
+        if conf:
+            config.update(conf)
+        return config
+
+    @staticmethod
+    def _copy_conf(conf):
+        # the shallow copy keeps the type and the comments of a yaml map, then the containers get their own copies
+        if conf is None:
+            return None
+        conf = copy(conf)
+        for key, value in list(conf.items()):
+            if isinstance(value, (dict, list, set)):
+                conf[key] = deepcopy(value)
+        return conf
+
     def get_server_conf_with_default(self, server):
         if server not in self._server_conf:
             return None
-        config = deepcopy(self._all_default_conf)
-        server_config = self.get_server_conf(server)
-        if server_config:
-            config.update(server_config)
-        return config
+        return self._get_conf_with_default(self.get_server_conf(server))
 
     def get_need_redeploy_items(self, server):
         if server not in self._server_conf:
@@ -674,12 +692,15 @@ class ClusterConfig(object):
     def update_temp_conf(self, temp_conf):
         self._default_conf = {}
         self._all_default_conf = {}
+        self._mutable_default_keys = []
         self._temp_conf = temp_conf
         for key in self._temp_conf:
             if self._temp_conf[key].require and self._temp_conf[key].default is not None:
                 self._default_conf[key] = self._temp_conf[key].default
             if self._temp_conf[key].default is not None:
                 self._all_default_conf[key] = self._temp_conf[key].default
+                if isinstance(self._temp_conf[key].default, (dict, list, set)):
+                    self._mutable_default_keys.append(key)
         self._global_conf = None
         self._unprocessed_global_conf = None
         self._clear_cache_server()
@@ -718,7 +739,7 @@ class ClusterConfig(object):
         if self._temp_conf:
             global_config = self._get_unprocessed_global_conf()
             for server in self._server_conf:
-                config = deepcopy(self._server_conf[server])
+                config = dict(self._server_conf[server])
                 config.update(global_config)
                 errors, items = self._check_param(config)
                 check_res[server] = {'errors': errors, 'items': items}
@@ -779,9 +800,7 @@ class ClusterConfig(object):
         return self._global_conf
 
     def get_global_conf_with_default(self):
-        config = deepcopy(self._all_default_conf)
-        config.update(self.get_global_conf())
-        return config
+        return self._get_conf_with_default(self.get_global_conf())
 
     def _add_base_dir(self, path):
         if not os.path.isabs(path):
@@ -864,7 +883,8 @@ class ClusterConfig(object):
                 self._origin_include_config = {}
             self._include_config = self._origin_include_config
         value = self._include_config.get(key, default) if key else self._include_config
-        return deepcopy(value)
+        # the include config is loaded once, only the containers need a copy for the caller
+        return deepcopy(value) if isinstance(value, (dict, list, set)) else value
 
     def get_rsync_list(self):
         if self._rsync_list is None:
@@ -896,17 +916,17 @@ class ClusterConfig(object):
         return self._cache_server[server]
 
     def get_original_global_conf(self, format_conf=False):
-        conf = deepcopy(self._original_global_conf)
+        conf = self._copy_conf(self._original_global_conf)
         format_conf and self._apply_temp_conf(conf)
         return conf
 
     def get_original_server_conf(self, server, format_conf=False):
-        conf = deepcopy(self._server_conf.get(server))
+        conf = self._copy_conf(self._server_conf.get(server))
         format_conf and self._apply_temp_conf(conf)
         return conf
 
     def get_original_server_conf_with_global(self, server, format_conf=False):
-        config = deepcopy(self.get_original_global_conf())
+        config = self.get_original_global_conf()
         config.update(self._server_conf.get(server, {}))
         format_conf and self._apply_temp_conf(config)
         return config
@@ -50,4 +50,18 @@ ENV_DEFAULT_CONFIRM = "IO_DEFAULT_CONFIRM"
 ENV_DISABLE_RSA_ALGORITHMS = 'OBD_DISABLE_RSA_ALGORITHMS'
 
 # set local connection when using host ip. {0/1} 0 - no local connection. 1 - local connection.
-ENV_HOST_IP_MODE = "HOST_IP_MODE"
\ No newline at end of file
+ENV_HOST_IP_MODE = "HOST_IP_MODE"
+# disable the shared ssh connection pool. {0/1}
+ENV_DISABLE_SSH_POOL = "OBD_DISABLE_SSH_POOL"
+
+# disable the tar stream transport for directories with many files. {0/1}
+ENV_DISABLE_TAR_TRANSPORT = "OBD_DISABLE_TAR_TRANSPORT"
+
+# relay the packages from host to host during installing. The control machine sends to at most N hosts at the same time and each host relays to N more. {0/N}
+ENV_DISTRIBUTE_FANOUT = "OBD_DISTRIBUTE_FANOUT"
+
+# disable the remote file cache which skips sending the file contents already on the host. {0/1}
+ENV_DISABLE_FILE_CACHE = "OBD_DISABLE_FILE_CACHE"
+
+# the timeout in seconds to wait for a major compaction of the test and optimize commands. {0/N} 0 - no timeout.
+ENV_MAJOR_COMPACTION_TIMEOUT = "OBD_MAJOR_COMPACTION_TIMEOUT"
@@ -24,15 +24,17 @@ from __future__ import absolute_import, division, print_function
 import re
 import os
 import sys
+import bisect
 import tempfile
 import time
 import pickle
+import sqlite3
 import string
 import fcntl
-import requests
 from glob import glob
 from enum import Enum
 from copy import deepcopy
+from threading import RLock
 from xml.etree import cElementTree
 from ssh import LocalClient
 try:
@@ -81,6 +83,251 @@ _SERVER_VARS['releasever'] = _RELEASE
 
 
 
+class PackageCatalog(object):
+
+    """
+    Package infos of a mirror indexed by md5, by name and by (name, arch).
+    The infos of every name are kept sorted by version and release, so an exact lookup is a binary search.
+    """
+
+    CATALOG_VERSION = 1
+
+    def __init__(self, infos=None):
+        self.version = self.CATALOG_VERSION
+        self._packages = {}
+        self._names = {}
+        self._name_archs = {}
+        if hasattr(infos, 'values'):
+            infos = infos.values()
+        for info in infos or []:
+            self[info.md5] = info
+
+    @staticmethod
+    def _insert(items, key, md5):
+        bisect.insort(items, (key, md5))
+
+    @staticmethod
+    def _remove(items, key, md5):
+        index = bisect.bisect_left(items, (key, md5))
+        if index < len(items) and items[index] == (key, md5):
+            del items[index]
+
+    def __setitem__(self, md5, info):
+        if md5 in self._packages:
+            del self[md5]
+        key = info.sort_key
+        self._packages[md5] = info
+        self._insert(self._names.setdefault(info.name, []), key, md5)
+        self._insert(self._name_archs.setdefault((info.name, info.arch), []), key, md5)
+
+    def __delitem__(self, md5):
+        info = self._packages.pop(md5)
+        key = info.sort_key
+        self._remove(self._names.get(info.name, []), key, md5)
+        self._remove(self._name_archs.get((info.name, info.arch), []), key, md5)
+
+    def __getitem__(self, md5):
+        return self._packages[md5]
+
+    def __contains__(self, md5):
+        return md5 in self._packages
+
+    def __iter__(self):
+        return iter(self._packages)
+
+    def __len__(self):
+        return len(self._packages)
+
+    def get(self, md5, default=None):
+        return self._packages.get(md5, default)
+
+    def keys(self):
+        return self._packages.keys()
+
+    def values(self):
+        return self._packages.values()
+
+    def names(self):
+        return self._names.keys()
+
+    def get_pkgs(self, name, arch=None, version=None):
+        """
+        Return the infos of name sorted by version and release in ascending order.
+        arch is a list of arch and version is exactly matched.
+        """
+        if arch is None:
+            lists = [self._names.get(name, [])]
+        else:
+            lists = [self._name_archs.get((name, _arch), []) for _arch in arch]
+        items = []
+        for _items in lists:
+            if version:
+                lower = (Version(version).__cmp_value__, )
+                start = bisect.bisect_left(_items, (lower, ))
+                end = start
+                while end < len(_items) and _items[end][0][0] == lower[0]:
+                    end += 1
+                _items = _items[start:end]
+            items += _items
+        items.sort()
+        return [self._packages[md5] for _, md5 in items]
+
+    def get_latest_pkg(self, name, arch=None, version=None, release=None):
+        for info in reversed(self.get_pkgs(name, arch=arch, version=version)):
+            if release and info.release != release:
+                continue
+            return info
+        return None
+
+
+class SqlitePackageCatalog(PackageCatalog):
+
+    """
+    A PackageCatalog kept in a sqlite file. Queries read only the matching rows, so a lookup does not load the
+    whole mirror. The rows are indexed by name, arch and a sortable version key, and the infos are pickled.
+    check(info) may drop the rows whose package is gone when they are read.
+    The connection is shared by the threads of the process, so every statement and transaction holds self._lock.
+    """
+
+    # 2: the numbers of version_key are padded to 20 digits
+    SCHEMA_VERSION = 2
+    KEY_SEPARATOR = '\x01'
+
+    def __init__(self, path, check=None, stdio=None):
+        self.path = path
+        self.check = check
+        self.stdio = stdio
+        self._lock = RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._init_schema()
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            version = self.get_meta('schema_version')
+            if version is not None and int(version) != self.SCHEMA_VERSION:
+                self._conn.execute('DROP TABLE IF EXISTS packages')
+                self._conn.execute('DELETE FROM meta')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS packages (md5 TEXT PRIMARY KEY, name TEXT, arch TEXT, '
+                               'version_key TEXT, release_key INTEGER, data BLOB)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS packages_name_arch ON packages (name, arch, version_key, release_key)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS packages_name ON packages (name, version_key, release_key)')
+            self.set_meta('schema_version', self.SCHEMA_VERSION)
+
+    def get_meta(self, key):
+        rows = self._query('SELECT value FROM meta WHERE key = ?', (key, ))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @classmethod
+    def version_key(cls, version):
+        # compares as text in the same order as Version does, 20 digits hold any unsigned 64-bit number
+        return cls.KEY_SEPARATOR.join(['%020d%s' % (num, suffix) for num, suffix in Version(version).__cmp_value__])
+
+    def _row(self, info):
+        return (info.md5, info.name, info.arch, self.version_key(info.version), info.release.__cmp_value__,
+                sqlite3.Binary(pickle.dumps(info, 2)))
+
+    def _load(self, rows):
+        infos = []
+        removed = []
+        for md5, data in rows:
+            info = pickle.loads(bytes(data))
+            if self.check and not self.check(info):
+                removed.append(md5)
+                continue
+            infos.append(info)
+        if removed:
+            with self._lock, self._conn:
+                self._conn.executemany('DELETE FROM packages WHERE md5 = ?', [(md5, ) for md5 in removed])
+        return infos
+
+    def __setitem__(self, md5, info):
+        row = self._row(info)
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?, ?)', row)
+
+    def __delitem__(self, md5):
+        with self._lock, self._conn:
+            if not self._conn.execute('DELETE FROM packages WHERE md5 = ?', (md5, )).rowcount:
+                raise KeyError(md5)
+
+    def get(self, md5, default=None):
+        infos = self._load(self._query('SELECT md5, data FROM packages WHERE md5 = ?', (md5, )))
+        return infos[0] if infos else default
+
+    def __getitem__(self, md5):
+        info = self.get(md5)
+        if info is None:
+            raise KeyError(md5)
+        return info
+
+    def __contains__(self, md5):
+        return self.get(md5) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM packages')[0][0]
+
+    def keys(self):
+        return [info.md5 for info in self.values()]
+
+    def values(self):
+        return self._load(self._query('SELECT md5, data FROM packages'))
+
+    def names(self):
+        return [row[0] for row in self._query('SELECT DISTINCT name FROM packages')]
+
+    def get_pkgs(self, name, arch=None, version=None):
+        sql = 'SELECT md5, data FROM packages WHERE name = ?'
+        args = [name]
+        if arch is not None:
+            sql += ' AND arch IN (%s)' % ', '.join(['?'] * len(arch))
+            args += list(arch)
+        if version:
+            sql += ' AND version_key = ?'
+            args.append(self.version_key(version))
+        sql += ' ORDER BY version_key, release_key, md5'
+        return self._load(self._query(sql, args))
+
+    def update(self, infos, source=None):
+        """
+        Make the catalog hold exactly infos. Only the new packages are written and the missing ones are deleted.
+        """
+        if hasattr(infos, 'values'):
+            infos = infos.values()
+        # the rows are compared and written under one lock, or a row written by another thread in between is lost
+        with self._lock:
+            exists = set([row[0] for row in self._conn.execute('SELECT md5 FROM packages').fetchall()])
+            md5s = set()
+            rows = []
+            for info in infos:
+                md5s.add(info.md5)
+                if info.md5 not in exists:
+                    rows.append(self._row(info))
+            removed = exists - md5s
+            with self._conn:
+                self._conn.executemany('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?, ?)', rows)
+                self._conn.executemany('DELETE FROM packages WHERE md5 = ?', [(md5, ) for md5 in removed])
+                if source is not None:
+                    self.set_meta('source', source)
+        self.stdio and getattr(self.stdio, 'verbose', print)('update %s: %s added, %s removed' % (self.path, len(rows), len(removed)))
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 class MirrorRepositoryType(Enum):
 
     LOCAL = 'local'
@@ -139,6 +386,19 @@ class MirrorRepository(object):
     def get_pkgs_info_with_score(self, **pattern):
         return []
 
+    def get_best_pkg_info_with_score(self, **pattern):
+        matchs = self.get_pkgs_info_with_score(**pattern)
+        if matchs:
+            return max(matchs, key=lambda x: x[1])
+        return None
+
+    def _get_fuzzy_pkgs(self, db, name, arch):
+        # the name is matched as a substring, so only the names are scanned and not every package
+        for pkg_name in list(db.names()):
+            if name in pkg_name:
+                for info in db.get_pkgs(pkg_name, arch=arch):
+                    yield info
+
 
 class RemotePackageInfo(PackageInfo):
 
@@ -253,6 +513,7 @@ class RemoteMirrorRepository(MirrorRepository):
     OTHER_DB_FILE = 'other_db.xml'
     REPO_AGE_FILE = '.rege_age'
     DB_CACHE_FILE = '.db'
+    CATALOG_FILE = '.catalog'
     PRIMARY_REPOMD_TYPE = 'primary'
 
     def __init__(self, mirror_path, meta_data, stdio=None):
@@ -283,6 +544,7 @@ class RemoteMirrorRepository(MirrorRepository):
         if not self.enabled:
             return False
         if self._available is None:
+            import requests
             try:
                 with timeout(5):
                     req = requests.request('get', self.baseurl)
@@ -298,31 +560,44 @@ class RemoteMirrorRepository(MirrorRepository):
             return self._db
         primary_repomd = self._get_repomd_by_type(self.PRIMARY_REPOMD_TYPE)
         if not primary_repomd:
-            return []
+            return PackageCatalog()
         file_path = self._get_repomd_data_file(primary_repomd)
         if not file_path:
-            return []
-        self._load_db_cache(file_path)
-        if self._db is None:
-            fp = FileUtil.unzip(file_path, stdio=self.stdio)
-            if not fp:
-                FileUtil.rm(file_path, stdio=self.stdio)
-                return []
-            self._db = {}
+            return PackageCatalog()
+        try:
+            catalog = SqlitePackageCatalog(self.get_catalog_file(self.mirror_path), stdio=self.stdio)
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+            return PackageCatalog()
+        # the catalog is rebuilt only when the primary file changed, and then only the new packages are written
+        source = os.path.basename(file_path)
+        if catalog.get_meta('source') != source:
+            infos = self._load_db_cache(file_path)
             try:
-                parser = cElementTree.iterparse(fp)
-                for event, elem in parser:
-                    if RemoteMirrorRepository.ns_cleanup(elem.tag) == 'package' and elem.attrib.get('type') == 'rpm':
-                        info = RemotePackageInfo(elem)
-                        self._db[info.md5] = info
-                self._dump_db_cache()
+                if infos is None:
+                    infos = self._parse_primary(file_path)
+                catalog.update(infos, source)
             except:
                 FileUtil.rm(file_path, stdio=self.stdio)
                 self.stdio and self.stdio.critical('failed to parse file %s, please retry later.' % file_path)
-                return []
+                return PackageCatalog()
+            if os.path.exists(self.get_db_cache_file(self.mirror_path)):
+                FileUtil.rm(self.get_db_cache_file(self.mirror_path), stdio=self.stdio)
+        self._db = catalog
         return self._db
 
+    def _parse_primary(self, file_path):
+        fp = FileUtil.unzip(file_path, stdio=self.stdio)
+        if not fp:
+            raise Exception('failed to unzip %s' % file_path)
+        parser = cElementTree.iterparse(fp)
+        for event, elem in parser:
+            if RemoteMirrorRepository.ns_cleanup(elem.tag) == 'package' and elem.attrib.get('type') == 'rpm':
+                yield RemotePackageInfo(elem)
+                elem.clear()
+
     def _load_db_cache(self, path):
+        # the pickle cache of the old versions is migrated to the catalog
         try:
             db_cacahe_path = self.get_db_cache_file(self.mirror_path)
             repomd_time = os.stat(path)[8]
@@ -330,22 +605,10 @@ class RemoteMirrorRepository(MirrorRepository):
             if cache_time > repomd_time:
                 self.stdio and getattr(self.stdio, 'verbose', print)('load %s' % db_cacahe_path)
                 with open(db_cacahe_path, 'rb') as f:
-                    self._db = pickle.load(f)
+                    return pickle.load(f)
         except:
             pass
-
-    def _dump_db_cache(self):
-        if self._db:
-            try:
-                db_cacahe_path = self.get_db_cache_file(self.mirror_path)
-                self.stdio and getattr(self.stdio, 'verbose', print)('dump %s' % db_cacahe_path)
-                with open(db_cacahe_path, 'wb') as f:
-                    pickle.dump(self._db, f)
-                return True
-            except:
-                self.stdio.exception('')
-                pass
-            return False
+        return None
 
     @staticmethod
     def ns_cleanup(qn):
@@ -367,6 +630,10 @@ class RemoteMirrorRepository(MirrorRepository):
     def get_db_cache_file(mirror_path):
         return os.path.join(mirror_path, RemoteMirrorRepository.DB_CACHE_FILE)
 
+    @staticmethod
+    def get_catalog_file(mirror_path):
+        return os.path.join(mirror_path, RemoteMirrorRepository.CATALOG_FILE)
+
     def _load_repo_age(self):
         try:
             with open(self.get_repo_age_file(self.mirror_path), 'r') as f:
@@ -439,16 +706,11 @@ class RemoteMirrorRepository(MirrorRepository):
         return self._repomds
 
     def get_all_pkg_info(self):
-        return [self.db[key] for key in self.db]
+        return list(self.db.values())
 
     def get_rpm_info_by_md5(self, md5, **pattern):
         if md5 in self.db:
             return self._pattern_check(self.db[md5], **pattern)
-        for key in self.db:
-            info = self.db[key]
-            if info.md5 == md5:
-                self.stdio and getattr(self.stdio, 'verbose', print)('%s translate info %s' % (md5, info.md5))
-                return self._pattern_check(info, **pattern)
         return None
 
     def get_rpm_pkg_by_info(self, pkg_info):
@@ -490,23 +752,7 @@ class RemoteMirrorRepository(MirrorRepository):
         self.stdio and getattr(self.stdio, 'verbose', print)('release is %s' % release)
         version = pattern['version'] if 'version' in pattern else None
         self.stdio and getattr(self.stdio, 'verbose', print)('version is %s' % version)
-        pkgs = []
-        for key in self.db:
-            info = self.db[key]
-            if info.name != name:
-                continue
-            if info.arch not in arch:
-                continue
-            if release and info.release != release:
-                continue
-            if version and version != info.version:
-                continue
-            pkgs.append(info)
-        if pkgs:
-            pkgs.sort()
-            return pkgs[-1]
-        else:
-            return None
+        return self.db.get_latest_pkg(name, arch=arch, version=version, release=release)
 
     def get_pkgs_info_with_score(self, **pattern):
         matchs = []
@@ -515,7 +761,7 @@ class RemoteMirrorRepository(MirrorRepository):
             info = None
             if pattern['md5'] in self.db:
                 info = self._pattern_check(self.db[pattern['md5']], **pattern)
-            return [info, (0xfffffffff, )] if info else matchs
+            return [[info, (0xfffffffff, )]] if info else matchs
         self.stdio and getattr(self.stdio, 'verbose', print)('md5 is None')
         if 'name' not in pattern and not pattern['name']:
             self.stdio and getattr(self.stdio, 'verbose', print)('name is None')
@@ -533,12 +779,10 @@ class RemoteMirrorRepository(MirrorRepository):
         else:
             pattern['version'] = None
         self.stdio and getattr(self.stdio, 'verbose', print)('version is %s' % pattern['version'])
-        for key in self.db:
-            info = self.db[key]
-            if pattern['name'] in info.name:
-                score = self.match_score(info, **pattern)
-                if score[0]:
-                    matchs.append([info, score])
+        for info in self._get_fuzzy_pkgs(self.db, pattern['name'], pattern['arch']):
+            score = self.match_score(info, **pattern)
+            if score[0]:
+                matchs.append([info, score])
         return matchs
 
     def match_score(self, info, name, arch, version=None, release=None):
@@ -566,6 +810,7 @@ class RemoteMirrorRepository(MirrorRepository):
 
     @staticmethod
     def download_file(url, save_path, stdio=None):
+        import requests
         try:
             with requests.get(url, stream=True) as fget:
                 file_size = int(fget.headers["Content-Length"])
@@ -605,11 +850,13 @@ class LocalMirrorRepository(MirrorRepository):
 
     MIRROR_TYPE = MirrorRepositoryType.LOCAL
     _DB_FILE = '.db'
+    _CATALOG_FILE = '.catalog'
 
     def __init__(self, mirror_path, stdio=None):
         super(LocalMirrorRepository, self).__init__(mirror_path, stdio=stdio)
-        self.db = {}
+        self.db = PackageCatalog()
         self.db_path = os.path.join(mirror_path, self._DB_FILE)
+        self.catalog_path = os.path.join(mirror_path, self._CATALOG_FILE)
         self.enabled = '-'
         self.available = True
         self._load_db()
@@ -618,31 +865,29 @@ class LocalMirrorRepository(MirrorRepository):
     def repo_age(self):
         return int(time.time())
 
+    @staticmethod
+    def _check_pkg(pkg):
+        path = getattr(pkg, 'path', False)
+        return path and os.path.exists(path)
+
     def _load_db(self):
         try:
+            self.db = SqlitePackageCatalog(self.catalog_path, check=self._check_pkg, stdio=self.stdio)
             if os.path.isfile(self.db_path):
+                # the pickle db of the old versions is migrated to the catalog
                 with open(self.db_path, 'rb') as f:
                     db = pickle.load(f)
-                    for key in db:
-                        data = db[key]
-                        path = getattr(data, 'path', False)
-                        if not path or not os.path.exists(path):
-                            continue
-                        self.db[key] = data
+                for key in db:
+                    if self._check_pkg(db[key]):
+                        self.db[key] = db[key]
+                os.remove(self.db_path)
         except:
             self.stdio.exception('')
             pass
 
     def _dump_db(self):
-        # 所有 dump方案都为临时
-        try:
-            with open(self.db_path, 'wb') as f:
-                pickle.dump(self.db, f)
-            return True
-        except:
-            self.stdio.exception('')
-            pass
-        return False
+        # the catalog is written when the packages are changed
+        return True
 
     def exist_pkg(self, pkg):
         return pkg.md5 in self.db
@@ -686,7 +931,7 @@ class LocalMirrorRepository(MirrorRepository):
         return None
 
     def get_all_pkg_info(self):
-        return [self.db[key] for key in self.db]
+        return list(self.db.values())
 
     def get_rpm_pkg_by_info(self, pkg_info):
         self.stdio and getattr(self.stdio, 'verbose', print)('get RPM package by %s' % pkg_info)
@@ -723,29 +968,7 @@ class LocalMirrorRepository(MirrorRepository):
         self.stdio and getattr(self.stdio, 'verbose', print)('release is %s' % release)
         version = pattern['version'] if 'version' in pattern else None
         self.stdio and getattr(self.stdio, 'verbose', print)('version is %s' % version)
-        pkgs = []
-        for key in self.db:
-            info = self.db[key]
-            if info.name != name:
-                continue
-            if info.arch not in arch:
-                continue
-            if release and info.release != release:
-                continue
-            if version and version != info.version:
-                continue
-            pkgs.append(info)
-        if pkgs:
-            pkgs.sort()
-            return pkgs[-1]
-        else:
-            return None
-
-    def get_best_pkg_info_with_score(self, **pattern):
-        matchs = self.get_pkgs_info_with_score(**pattern)
-        if matchs:
-            return max(matchs, key=lambda x: x[1])
-        return None
+        return self.db.get_latest_pkg(name, arch=arch, version=version, release=release)
 
     def get_pkgs_info_with_score(self, **pattern):
         matchs = []
@@ -754,7 +977,7 @@ class LocalMirrorRepository(MirrorRepository):
             info = None
             if pattern['md5'] in self.db:
                 info = self._pattern_check(self.db[pattern['md5']], **pattern)
-            return [info, (0xfffffffff, )] if info else matchs
+            return [[info, (0xfffffffff, )]] if info else matchs
         self.stdio and getattr(self.stdio, 'verbose', print)('md5 is None')
         if 'name' not in pattern and not pattern['name']:
             return matchs
@@ -771,12 +994,10 @@ class LocalMirrorRepository(MirrorRepository):
         else:
             pattern['version'] = None
         self.stdio and getattr(self.stdio, 'verbose', print)('version is %s' % pattern['version'])
-        for key in self.db:
-            info = self.db[key]
-            if pattern['name'] in info.name:
-                score = self.match_score(info, **pattern)
-                if score[0]:
-                    matchs.append([info, score])
+        for info in self._get_fuzzy_pkgs(self.db, pattern['name'], pattern['arch']):
+            score = self.match_score(info, **pattern)
+            if score[0]:
+                matchs.append([info, score])
         return matchs
 
     def match_score(self, info, name, arch, version=None, release=None):
@@ -792,7 +1013,7 @@ class LocalMirrorRepository(MirrorRepository):
         return c
 
     def get_info_list(self):
-        return [self.db[key] for key in self.db]
+        return list(self.db.values())
 
 
 class MirrorRepositoryConfig(object):
@@ -980,8 +1201,10 @@ class MirrorRepositoryManager(Manager):
         best = None
         source_mirror = None
         for mirror in mirrors:
-            t_best = mirror.get_best_pkg_info_with_score(**pattern)
+            t_best = mirror.get_best_pkg_info_with_score(**dict(pattern))
             self.stdio.verbose('%s found pkg: %s' % (mirror, t_best))
+            if t_best is None:
+                continue
             if best is None:
                 best = t_best
                 source_mirror = mirror
@@ -1093,6 +1316,7 @@ class MirrorRepositoryManager(Manager):
                 self.stdio.print("exit without any changes")
                 return True
 
+        import requests
         try:
             download_file_res = requests.get(url, timeout=(5, 5))
         except Exception as e:
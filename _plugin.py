@@ -24,13 +24,17 @@ import os
 import re
 import sys
 import time
+import marshal
+import hashlib
+import traceback
 from enum import Enum
 from glob import glob
 from copy import deepcopy, copy
+from multiprocessing.pool import ThreadPool
 
 from _manager import Manager
 from _rpm import Version
-from ssh import ConcurrentExecutor
+from ssh import ConcurrentExecutor, BatchCommand
 from tool import ConfigUtil, DynamicLoading, YamlLoader, FileUtil
 from _types import *
 
@@ -60,6 +64,8 @@ class Plugin(object):
         self.plugin_path = plugin_path
         self.version = Version(version)
         self.dev_mode = dev_mode
+        # a directory under the obd home for the data derived from the plugin files, set by the loader
+        self.cache_path = None
 
     def __str__(self):
         return '%s-%s-%s' % (self.component_name, self.PLUGIN_TYPE.name.lower(), self.version)
@@ -144,8 +150,94 @@ class PluginReturn(object):
         self.set_kwargs(**kwargs)
 
 
+class ParallelStdio(object):
+
+    OUTPUT_METHODS = ('print', 'warn', 'error', 'critical', 'verbose', 'log', 'print_list')
+    SYNC_METHODS = (
+        'start_loading', 'stop_loading', 'update_loading_text',
+        'start_progressbar', 'update_progressbar', 'finish_progressbar', 'interrupt_progressbar'
+    )
+
+    def __init__(self, stdio):
+        self.stdio = stdio
+        self.records = []
+
+    def sub_io(self, *args, **kwargs):
+        return self
+
+    def exception(self, msg='', *args, **kwargs):
+        self.records.append(('exception', (msg, traceback.format_exc()), {}))
+
+    def _record(self, name):
+        def record(*args, **kwargs):
+            self.records.append((name, args, kwargs))
+        return record
+
+    def _ignore(self, *args, **kwargs):
+        return False
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('stdio', 'records'):
+            raise AttributeError(name)
+        if name in self.OUTPUT_METHODS:
+            return self._record(name)
+        # the spinner and progress bar belong to the caller, a server task must not take them over
+        if name in self.SYNC_METHODS:
+            return self._ignore
+        return getattr(self.stdio, name)
+
+    def replay(self):
+        records, self.records = self.records, []
+        for name, args, kwargs in records:
+            if name == 'exception':
+                msg, exc = args
+                msg and self.stdio.error(msg)
+                self.stdio.verbose(exc)
+            else:
+                getattr(self.stdio, name)(*args, **kwargs)
+
+
+class ServerTask(object):
+
+    def __init__(self, server, client, stdio):
+        self.server = server
+        self.client = client
+        self.stdio = stdio
+        self.value = None
+        self.exception = None
+        self.time = 0
+
+    def __nonzero__(self):
+        return self.__bool__()
+
+    def __bool__(self):
+        return self.exception is None and bool(self.value)
+
+
+class PrefetchClient(object):
+
+    def __init__(self, client, returns):
+        self.client = client
+        self.returns = returns
+
+    def execute_command(self, command, *args, **kwargs):
+        if command in self.returns:
+            return self.returns[command]
+        return self.client.execute_command(command, *args, **kwargs)
+
+    def __getattr__(self, key):
+        if key.startswith('__') or key in ('client', 'returns'):
+            raise AttributeError(key)
+        return getattr(self.client, key)
+
+
 class PluginContext(object):
 
+    PARALLEL_WORKERS = 16
+    # seconds a launched process may take to show up in its pid file, and to listen on its port
+    START_EXIT_GRACE = 3
+    START_READY_TIMEOUT = 10
+
     def __init__(self, plugin_name, namespace, namespaces, deploy_name, repositories, components, clients, cluster_config, cmd, options, dev_mode, stdio):
         self.namespace = namespace
         self.namespaces = namespaces
@@ -189,6 +281,131 @@ class PluginContext(object):
     def set_variable(self, name, value):
         self.namespace.set_variable(name, value)
 
+    def parallel_execute(self, func, servers=None, workers=None, clients=None, **kwargs):
+        """
+        Run func(server, client, stdio, **kwargs) for every server concurrently with a bounded number of workers.
+        Returns a list of ServerTask in the order of servers. The output of every task is buffered and replayed
+        to the plugin stdio in the same order, so the log is not interleaved.
+        """
+        if clients is None:
+            clients = self.clients
+        if servers is None:
+            servers = self.cluster_config.servers if clients is self.clients else list(clients.keys())
+        tasks = []
+        for server in servers:
+            client = clients.get(server)
+            task_stdio = ParallelStdio(self.stdio)
+            if isinstance(client, ScriptPlugin.ClientForScriptPlugin):
+                client = ScriptPlugin.ClientForScriptPlugin(client.client, task_stdio)
+            tasks.append(ServerTask(server, client, task_stdio))
+        if not tasks:
+            return tasks
+
+        def run(task):
+            start_time = time.time()
+            try:
+                task.value = func(task.server, task.client, task.stdio, **kwargs)
+            except Exception as e:
+                task.exception = e
+                task.stdio.exception('%s RuntimeError: %s' % (task.server, e))
+            task.time = time.time() - start_time
+            return task
+
+        workers = min(len(tasks), workers if workers else self.PARALLEL_WORKERS)
+        if workers <= 1:
+            for task in tasks:
+                run(task)
+        else:
+            pool = ThreadPool(processes=workers)
+            try:
+                pool.map(run, tasks)
+            finally:
+                pool.close()
+        for task in tasks:
+            task.stdio.replay()
+        return tasks
+
+    def parallel_prefetch(self, commands, servers=None, clients=None, workers=None):
+        """
+        Execute the read only commands on every server concurrently and return clients which answer them from the cache.
+        """
+        if clients is None:
+            clients = self.clients
+        if servers is None:
+            servers = self.cluster_config.servers if clients is self.clients else list(clients.keys())
+        return self.parallel_probe(dict([(server, commands) for server in servers]), clients=clients, workers=workers)
+
+    def parallel_probe(self, server_commands, clients=None, workers=None, timeout=None):
+        """
+        Batch the read only commands of every server into one probe script, run the scripts concurrently and
+        return clients which answer them from the parsed results. Commands missing from the results fall back to
+        a real execution.
+        """
+        def probe(server, client, stdio):
+            stdio.verbose('%s probe %s commands' % (server, len(server_commands[server])))
+            return BatchCommand(server_commands[server]).execute(client, timeout=timeout, stdio=stdio)
+
+        probe_clients = {}
+        if clients is None:
+            clients = self.clients
+        servers = [server for server in server_commands if server in clients]
+        for task in self.parallel_execute(probe, servers=servers, workers=workers, clients=clients):
+            probe_clients[task.server] = PrefetchClient(clients[task.server], task.value if task.value else {})
+        return probe_clients
+
+    @staticmethod
+    def get_ready_check_command(pid_path, port):
+        # prints the pid of a live process, and then "listen" once the port is listening
+        port = hex(int(port))[2:].zfill(4).upper()
+        return "pid=`cat %s 2>/dev/null` && [ -n \"$pid\" ] && ls /proc/$pid >/dev/null 2>&1 && echo $pid && " \
+            "{ cat /proc/net/tcp /proc/net/tcp6 2>/dev/null | awk '{print $2,$4}' | grep -q ':%s 0A$' && echo listen; true; }" % (pid_path, port)
+
+    def wait_ready(self, targets, launched=None, exit_grace=None, ready_timeout=None, clients=None, workers=None):
+        """
+        Poll the servers concurrently until the process of every one listens on its port, instead of sleeping a fixed time.
+        targets maps a server to (pid_path, port) and launched maps a server to the time it was launched.
+        A process which is not alive after exit_grace seconds has failed, and one which is alive but not listening yet
+        is accepted at ready_timeout. Returns {server: (pid, listening, cost)}, and pid is None if the server failed.
+        """
+        if launched is None:
+            launched = {}
+        if exit_grace is None:
+            exit_grace = self.START_EXIT_GRACE
+        if ready_timeout is None:
+            ready_timeout = self.START_READY_TIMEOUT
+        if clients is None:
+            clients = self.clients
+
+        def check(server, client, stdio):
+            ret = client.execute_command(self.get_ready_check_command(*targets[server]))
+            return ret.stdout.strip().split('\n') if ret else []
+
+        start_time = time.time()
+        results = {}
+        pending = [server for server in (self.cluster_config.servers if clients is self.clients else clients) if server in targets]
+        interval = 0.2
+        while pending:
+            now = time.time()
+            for task in self.parallel_execute(check, pending, workers=workers, clients=clients):
+                server = task.server
+                elapsed = now - launched.get(server, start_time)
+                if task and task.value[-1] == 'listen':
+                    result = (task.value[0], True)
+                elif task:
+                    if elapsed < ready_timeout:
+                        continue
+                    result = (task.value[0], False)
+                elif elapsed < exit_grace:
+                    continue
+                else:
+                    result = (None, False)
+                pending.remove(server)
+                results[server] = result + (time.time() - launched.get(server, start_time), )
+            if pending:
+                time.sleep(interval)
+                interval = min(interval * 2, 1)
+        return results
+
 
 class SubIO(object):
 
@@ -437,6 +654,21 @@ class ParamPlugin(Plugin):
     PLUGIN_TYPE = PluginType.PARAM
     DEF_PARAM_YAML = 'parameter.yaml'
     FLAG_FILE = DEF_PARAM_YAML
+    SCHEMA_CACHE_VERSION = 1
+    TYPES = {
+        'DOUBLE': Double,
+        'BOOL': Boolean,
+        'INT': Integer,
+        'STRING': String,
+        'MOMENT': Moment,
+        'TIME': Time,
+        'CAPACITY': Capacity,
+        'CAPACITY_MB': CapacityMB,
+        'STRING_LIST': StringList,
+        'DICT': Dict,
+        'LIST': List,
+        'PARAM_LIST': StringOrKvList
+    }
 
     def __init__(self, component_name, plugin_path, version, dev_mode):
         super(ParamPlugin, self).__init__(component_name, plugin_path, version, dev_mode)
@@ -445,100 +677,151 @@ class ParamPlugin(Plugin):
         self._need_redploy_items = None
         self._had_modify_limit_items = None
         self._need_restart_items = None
+        self._essential_items = None
+        self._section_items = None
         self._params_default = None
 
+    @classmethod
+    def _plain(cls, value):
+        # turn the yaml nodes into the builtin types that marshal supports
+        if isinstance(value, dict):
+            return dict([(cls._plain(k), cls._plain(v)) for k, v in value.items()])
+        if isinstance(value, (list, tuple)):
+            return [cls._plain(v) for v in value]
+        for _type in (bool, int, float):
+            if isinstance(value, _type):
+                return _type(value)
+        return value
+
+    @property
+    def schema_cache_path(self):
+        # the plugin path may be the source tree in dev mode, so the cache is kept in the obd home.
+        # marshal data is only readable by the same python version
+        if not self.cache_path:
+            return None
+        key = hashlib.md5(os.path.abspath(self.def_param_yaml_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_path, '%s-%s.py%s%s.cache' % ((self.component_name, key) + tuple(sys.version_info[:2])))
+
+    def _load_param_configs(self):
+        with open(self.def_param_yaml_path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.md5(content).hexdigest()
+        cache_path = self.schema_cache_path
+        if cache_path:
+            try:
+                with open(cache_path, 'rb') as f:
+                    cache = marshal.load(f)
+                if cache.get('version') == self.SCHEMA_CACHE_VERSION and cache.get('digest') == digest:
+                    return cache['configs']
+            except:
+                pass
+        configs = self._plain(yaml.loads(content.decode('utf-8')))
+        if cache_path:
+            try:
+                if not os.path.isdir(self.cache_path):
+                    os.makedirs(self.cache_path)
+                tmp_path = '%s.%s' % (cache_path, os.getpid())
+                with open(tmp_path, 'wb') as f:
+                    marshal.dump({'version': self.SCHEMA_CACHE_VERSION, 'digest': digest, 'configs': configs}, f)
+                os.rename(tmp_path, cache_path)
+            except:
+                pass
+        return configs
+
     @property
     def params(self):
         if self._src_data is None:
             try:
-                TYPES = {
-                    'DOUBLE': Double,
-                    'BOOL': Boolean,
-                    'INT': Integer,
-                    'STRING': String,
-                    'MOMENT': Moment,
-                    'TIME': Time,
-                    'CAPACITY': Capacity,
-                    'CAPACITY_MB': CapacityMB,
-                    'STRING_LIST': StringList,
-                    'DICT': Dict,
-                    'LIST': List,
-                    'PARAM_LIST': StringOrKvList
-                }
                 self._src_data = {}
-                with open(self.def_param_yaml_path, 'rb') as f:
-                    configs = yaml.load(f)
-                    for conf in configs:
-                        try:
-                            param_type = ConfigUtil.get_value_from_dict(conf, 'type', 'STRING').upper()
-                            if param_type in TYPES:
-                                param_type = TYPES[param_type]
-                            else:
-                                param_type = String
-
-                            self._src_data[conf['name']] = ParamPlugin.ConfigItem(
-                                name=conf['name'],
-                                param_type=param_type,
-                                default=ConfigUtil.get_value_from_dict(conf, 'default', None),
-                                min_value=ConfigUtil.get_value_from_dict(conf, 'min_value', None),
-                                max_value=ConfigUtil.get_value_from_dict(conf, 'max_value', None),
-                                modify_limit=ConfigUtil.get_value_from_dict(conf, 'modify_limit', None),
-                                require=ConfigUtil.get_value_from_dict(conf, 'require', False),
-                                section=ConfigUtil.get_value_from_dict(conf, 'section', ""),
-                                essential=ConfigUtil.get_value_from_dict(conf, 'essential', False),
-                                need_reload=ConfigUtil.get_value_from_dict(conf, 'need_reload', False),
-                                need_restart=ConfigUtil.get_value_from_dict(conf, 'need_restart', False),
-                                need_redeploy=ConfigUtil.get_value_from_dict(conf, 'need_redeploy', False),
-                                description_en=ConfigUtil.get_value_from_dict(conf, 'description_en', None),
-                                description_local=ConfigUtil.get_value_from_dict(conf, 'description_local', None),
-                            )
-                        except:
-                            pass
+                for conf in self._load_param_configs():
+                    try:
+                        param_type = ConfigUtil.get_value_from_dict(conf, 'type', 'STRING').upper()
+                        if param_type in self.TYPES:
+                            param_type = self.TYPES[param_type]
+                        else:
+                            param_type = String
+
+                        self._src_data[conf['name']] = ParamPlugin.ConfigItem(
+                            name=conf['name'],
+                            param_type=param_type,
+                            default=ConfigUtil.get_value_from_dict(conf, 'default', None),
+                            min_value=ConfigUtil.get_value_from_dict(conf, 'min_value', None),
+                            max_value=ConfigUtil.get_value_from_dict(conf, 'max_value', None),
+                            modify_limit=ConfigUtil.get_value_from_dict(conf, 'modify_limit', None),
+                            require=ConfigUtil.get_value_from_dict(conf, 'require', False),
+                            section=ConfigUtil.get_value_from_dict(conf, 'section', ""),
+                            essential=ConfigUtil.get_value_from_dict(conf, 'essential', False),
+                            need_reload=ConfigUtil.get_value_from_dict(conf, 'need_reload', False),
+                            need_restart=ConfigUtil.get_value_from_dict(conf, 'need_restart', False),
+                            need_redeploy=ConfigUtil.get_value_from_dict(conf, 'need_redeploy', False),
+                            description_en=ConfigUtil.get_value_from_dict(conf, 'description_en', None),
+                            description_local=ConfigUtil.get_value_from_dict(conf, 'description_local', None),
+                        )
+                    except:
+                        pass
             except:
                 pass
         return self._src_data
 
+    def _build_indexes(self):
+        need_redploy_items = []
+        had_modify_limit_items = []
+        need_restart_items = []
+        essential_items = []
+        section_items = {}
+        params_default = {}
+        for conf in self.params.values():
+            if conf.need_redeploy:
+                need_redploy_items.append(conf)
+            if conf.had_modify_limit:
+                had_modify_limit_items.append(conf)
+            if conf.need_restart:
+                need_restart_items.append(conf)
+            if conf.essential:
+                essential_items.append(conf)
+            section_items.setdefault(conf.section, []).append(conf)
+            params_default[conf.name] = conf.default
+        self._need_redploy_items = need_redploy_items
+        self._had_modify_limit_items = had_modify_limit_items
+        self._need_restart_items = need_restart_items
+        self._essential_items = essential_items
+        self._section_items = section_items
+        self._params_default = params_default
+
     @property
     def redploy_params(self):
         if self._need_redploy_items is None:
-            self._need_redploy_items = []
-            params = self.params
-            for name in params:
-                conf = params[name]
-                if conf.need_redeploy:
-                    self._need_redploy_items.append(conf)
+            self._build_indexes()
         return self._need_redploy_items
 
     @property
     def modify_limit_params(self):
         if self._had_modify_limit_items is None:
-            self._had_modify_limit_items = []
-            params = self.params
-            for name in params:
-                conf = params[name]
-                if conf.had_modify_limit:
-                    self._had_modify_limit_items.append(conf)
+            self._build_indexes()
         return self._had_modify_limit_items
 
     @property
     def restart_params(self):
         if self._need_restart_items is None:
-            self._need_restart_items = []
-            params = self.params
-            for name in params:
-                conf = params[name]
-                if conf.need_restart:
-                    self._need_restart_items.append(conf)
+            self._build_indexes()
         return self._need_restart_items
 
+    @property
+    def essential_params(self):
+        if self._essential_items is None:
+            self._build_indexes()
+        return self._essential_items
+
+    @property
+    def section_params(self):
+        if self._section_items is None:
+            self._build_indexes()
+        return self._section_items
+
     @property
     def params_default(self):
         if self._params_default is None:
-            self._params_default = {}
-            params = self.params
-            for name in params:
-                conf = params[name]
-                self._params_default[conf.name] = conf.default
+            self._build_indexes()
         return self._params_default
 
 
@@ -684,7 +967,7 @@ class ComponentPluginLoader(object):
 
     PLUGIN_TYPE = None
 
-    def __init__(self, home_path, plugin_type=PLUGIN_TYPE, dev_mode=False, stdio=None):
+    def __init__(self, home_path, plugin_type=PLUGIN_TYPE, dev_mode=False, stdio=None, cache_path=None):
         if plugin_type:
             self.PLUGIN_TYPE = plugin_type
         if not self.PLUGIN_TYPE:
@@ -695,6 +978,7 @@ class ComponentPluginLoader(object):
         self.dev_mode = dev_mode
         self.stdio = stdio
         self.path = home_path
+        self.cache_path = cache_path
         self.component_name = os.path.split(self.path)[1]
         self._plugins = {}
 
@@ -707,6 +991,7 @@ class ComponentPluginLoader(object):
                 path, _ = os.path.split(flag_path)
                 _, version = os.path.split(path)
                 plugin = self.plguin_cls(self.component_name, path, version, self.dev_mode)
+                plugin.cache_path = self.cache_path
                 self._plugins[flag_path] = plugin
                 plugins.append(plugin)
         return plugins
@@ -779,11 +1064,13 @@ class %s(PyScriptPlugin):
 class PluginManager(Manager):
 
     RELATIVE_PATH = 'plugins'
+    CACHE_RELATIVE_PATH = '.cache/plugins'
     # The directory structure for plugin is ./plugins/{component_name}/{version}
 
     def __init__(self, home_path, dev_mode=False, stdio=None):
         super(PluginManager, self).__init__(home_path, stdio=stdio)
         self.dev_mode = dev_mode
+        self.cache_path = os.path.join(home_path, self.CACHE_RELATIVE_PATH)
         self.component_plugin_loaders = {}
         self.py_script_plugin_loaders = {}
         for plugin_type in PluginType:
@@ -797,7 +1084,7 @@ class PluginManager(Manager):
             return None
         loaders = self.component_plugin_loaders[plugin_type]
         if component_name not in loaders:
-            loaders[component_name] = ComponentPluginLoader(os.path.join(self.path, component_name), plugin_type, self.dev_mode, self.stdio)
+            loaders[component_name] = ComponentPluginLoader(os.path.join(self.path, component_name), plugin_type, self.dev_mode, self.stdio, self.cache_path)
         loader = loaders[component_name]
         return loader.get_best_plugin(version)
 
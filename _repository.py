@@ -22,11 +22,14 @@ from __future__ import absolute_import, division, print_function
 
 import os
 import sys
+import stat
 import time
+import shutil
 import hashlib
+import threading
 from glob import glob
 from multiprocessing import cpu_count
-from multiprocessing.pool import Pool
+from multiprocessing.pool import Pool, ThreadPool
 
 from _rpm import Package, PackageInfo, Version
 from _arch import getBaseArch
@@ -171,6 +174,156 @@ class Extractor(object):
         return True
 
 
+class CpioFormatError(Exception):
+    pass
+
+
+class StreamExtractor(object):
+
+    """
+    Extract the files in a single pass over the payload. The payload is decompressed once, the needed
+    entries are written as they arrive and the writes and chmods are handed to a thread pool.
+    """
+
+    CPIO_MAGIC = (b'070701', b'070702')
+    CPIO_HEADER_SIZE = 110
+    CPIO_TRAILER = 'TRAILER!!!'
+    BUFFER_SIZE = 1 << 20
+    # files larger than this are written by the reader itself instead of being buffered for the pool
+    MAX_BUFFER_FILE_SIZE = 8 << 20
+    MAX_PENDING = 32
+    WORKERS = 4
+
+    def __init__(self, pkg, files, stdio=None):
+        self.pkg = pkg
+        self.files = files
+        self.stdio = stdio
+        self.written = []
+        self._errors = []
+
+    @staticmethod
+    def _format_name(name):
+        name = name.lstrip('.')
+        return name if name.startswith('/') else '/' + name
+
+    @staticmethod
+    def _read(fileobj, size):
+        data = fileobj.read(size)
+        while len(data) < size:
+            chunk = fileobj.read(size - len(data))
+            if not chunk:
+                raise CpioFormatError('unexpected end of payload')
+            data += chunk
+        return data
+
+    def _skip(self, fileobj, size):
+        while size > 0:
+            chunk = fileobj.read(min(size, self.BUFFER_SIZE))
+            if not chunk:
+                raise CpioFormatError('unexpected end of payload')
+            size -= len(chunk)
+
+    def _save(self, infos, data):
+        for info in infos:
+            with FileUtil.open(info.target_path, 'wb', stdio=self.stdio) as f:
+                f.write(data)
+            os.chmod(info.target_path, info.mode)
+
+    def _save_async(self, infos, data):
+        def save():
+            try:
+                self._save(infos, data)
+            except Exception as e:
+                self._errors.append(e)
+            finally:
+                self._semaphore.release()
+        self._semaphore.acquire()
+        self._pool.apply_async(save)
+
+    def _save_stream(self, infos, fileobj, size):
+        with FileUtil.open(infos[0].target_path, 'wb', stdio=self.stdio) as f:
+            while size > 0:
+                chunk = fileobj.read(min(size, self.BUFFER_SIZE))
+                if not chunk:
+                    raise CpioFormatError('unexpected end of payload')
+                f.write(chunk)
+                size -= len(chunk)
+        os.chmod(infos[0].target_path, infos[0].mode)
+        for info in infos[1:]:
+            shutil.copyfile(infos[0].target_path, info.target_path)
+            os.chmod(info.target_path, info.mode)
+
+    def _walk(self, payload, pending):
+        # hard linked files keep the data only in the last entry of the same inode
+        hard_links = {}
+        offset = 0
+        while pending or hard_links:
+            header = self._read(payload, self.CPIO_HEADER_SIZE)
+            if header[:6] not in self.CPIO_MAGIC:
+                raise CpioFormatError('unsupported cpio magic %r' % header[:6])
+            fields = [int(header[i:i + 8], 16) for i in range(6, self.CPIO_HEADER_SIZE, 8)]
+            ino, mode, nlink, file_size, name_size = fields[0], fields[1], fields[4], fields[6], fields[11]
+            name = self._read(payload, name_size)[:-1].decode('utf-8', 'replace')
+            offset += self.CPIO_HEADER_SIZE + name_size
+            self._skip(payload, -offset % 4)
+            offset += -offset % 4
+            if name == self.CPIO_TRAILER:
+                # all the entries of an empty hard linked file have no data
+                for infos in hard_links.values():
+                    self.written += [info.target_path for info in infos]
+                    self._save(infos, b'')
+                hard_links = {}
+                break
+            infos = []
+            info = pending.pop(self._format_name(name), None)
+            if info:
+                infos.append(info)
+            if nlink > 1 and stat.S_ISREG(mode):
+                if not file_size:
+                    if infos:
+                        hard_links.setdefault(ino, []).extend(infos)
+                    continue
+                infos += hard_links.pop(ino, [])
+            if not infos:
+                self._skip(payload, file_size)
+            elif file_size > self.MAX_BUFFER_FILE_SIZE:
+                self.written += [info.target_path for info in infos]
+                self._save_stream(infos, payload, file_size)
+            else:
+                self.written += [info.target_path for info in infos]
+                self._save_async(infos, self._read(payload, file_size))
+            offset += file_size
+            self._skip(payload, -offset % 4)
+            offset += -offset % 4
+        return list(pending.keys())
+
+    def extract(self):
+        pending = {}
+        for info in self.files:
+            if not os.path.exists(info.target_path):
+                pending[self._format_name(info.src_path)] = info
+        if not pending:
+            return True
+        self._pool = ThreadPool(processes=self.WORKERS)
+        self._semaphore = threading.BoundedSemaphore(self.MAX_PENDING)
+        try:
+            with self.pkg.open() as rpm:
+                missing = self._walk(rpm.data_file, pending)
+        finally:
+            self._pool.close()
+            self._pool.join()
+        if self._errors:
+            raise self._errors[0]
+        if missing:
+            raise Exception('%s not found in package' % missing[0])
+        return True
+
+    def clear(self):
+        for path in self.written:
+            if os.path.exists(path):
+                os.remove(path)
+
+
 class ParallerExtractor(object):
 
     MAX_PARALLER = cpu_count() * 2 if cpu_count() else 8
@@ -190,11 +343,31 @@ class ParallerExtractor(object):
         if not self.files:
             return
         
-        if sys.version_info.major == 2 or COMMAND_ENV.get(ENV_DISABLE_PARALLER_EXTRACT, False):
+        if COMMAND_ENV.get(ENV_DISABLE_PARALLER_EXTRACT, False):
+            return self._single()
+        if not isinstance(self.pkg, LocalPackage):
+            ret = self._stream()
+            if ret is not None:
+                return ret
+        if sys.version_info.major == 2:
             return self._single()
         else:
             return self._paraller()
 
+    def _stream(self):
+        self.stdio and getattr(self.stdio, 'verbose', print)('extract mode: stream')
+        extractor = StreamExtractor(self.pkg, self.files, stdio=self.stdio)
+        try:
+            return extractor.extract()
+        except CpioFormatError as e:
+            self.stdio and getattr(self.stdio, 'verbose', print)('stream extract failed: %s' % e)
+            extractor.clear()
+            return None
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('')
+            extractor.clear()
+        return False
+
     def _single(self):
         self.stdio and getattr(self.stdio, 'verbose', print)('extract mode: single')
         return Extractor(
@@ -241,6 +414,7 @@ class ParallerExtractor(object):
 class Repository(PackageInfo):
     
     _DATA_FILE = '.data'
+    _DIGEST_FILE = '.filemd5s'
 
     def __init__(self, name, repository_dir, stdio=None):
         self.repository_dir = repository_dir
@@ -268,6 +442,51 @@ class Repository(PackageInfo):
         path = os.readlink(self.repository_dir) if os.path.islink(self.repository_dir) else self.repository_dir
         return os.path.join(path, Repository._DATA_FILE)
 
+    @property
+    def digest_file_path(self):
+        return os.path.join(os.path.dirname(self.data_file_path), Repository._DIGEST_FILE)
+
+    def file_digests(self):
+        """
+        Return {path: digest} of the regular files in the repository. The digests come from the filemd5s of the rpm,
+        repositories loaded before the digest file existed are hashed once and saved.
+        """
+        digests = {}
+        try:
+            with open(self.digest_file_path, 'r') as f:
+                for line in f:
+                    digest, path = line.rstrip('\n').split(' ', 1)
+                    digests[os.path.join(self.repository_dir, path)] = digest
+            return digests
+        except IOError:
+            pass
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('load %s failed' % self.digest_file_path)
+        if not self.hash:
+            return digests
+        for root, _, file_names in os.walk(self.repository_dir):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+                if os.path.islink(path) or root == self.repository_dir and file_name in (Repository._DATA_FILE, Repository._DIGEST_FILE):
+                    continue
+                m_sum = hashlib.md5()
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        m_sum.update(chunk)
+                digests[path] = m_sum.hexdigest()
+        self._dump_digests(digests)
+        return digests
+
+    def _dump_digests(self, digests):
+        try:
+            with open(self.digest_file_path, 'w') as f:
+                for path in sorted(digests):
+                    f.write('%s %s\n' % (digests[path], os.path.relpath(path, self.repository_dir)))
+            return True
+        except:
+            self.stdio and getattr(self.stdio, 'exception', print)('dump digests to %s failed' % self.digest_file_path)
+        return False
+
     def bin_list(self, plugin):
         files = []
         if self.version and self.hash:
@@ -382,6 +601,7 @@ class Repository(PackageInfo):
                                 break
                 
                 need_extract_files = []
+                digests = {}
                 for src_path in need_files:
                     if src_path not in files:
                         raise Exception('%s not found in packge' % src_path)
@@ -390,6 +610,7 @@ class Repository(PackageInfo):
                         return
                     idx = files[src_path]
                     if filemd5s[idx]:
+                        digests[target_path] = format_str(filemd5s[idx])
                         need_extract_files.append(ExtractFileInfo(
                             src_path,
                             target_path,
@@ -400,7 +621,8 @@ class Repository(PackageInfo):
                     else:
                         raise Exception('%s is directory' % src_path)
                 
-                ParallerExtractor(pkg, need_extract_files, stdio=self.stdio).extract()
+                if ParallerExtractor(pkg, need_extract_files, stdio=self.stdio).extract() is False:
+                    raise Exception('failed to extract files from %s' % pkg.path)
 
                 for link in links:
                     self.stdio and getattr(self.stdio, 'verbose', print)('link %s to %s' % (links[link], link))
@@ -416,7 +638,7 @@ class Repository(PackageInfo):
             self.md5 = pkg.md5
             self.arch = pkg.arch
             self.install_time = time.time()
-            if self._dump():
+            if self._dump_digests(digests) and self._dump():
                 return True
             else:
                 self.clear()
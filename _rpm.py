@@ -39,47 +39,74 @@ if sys.version_info.major == 2:
 
 class Version(str):
 
+    PATTERN = re.compile('(\\d+)([^\\.]*)')
+    # the parsed values of every version string seen, shared by all the instances
+    _CMP_VALUES = {}
+
     def __init__(self, bytes_or_buffer, encoding=None, errors=None):
         super(Version, self).__init__()
 
+    @classmethod
+    def _parse(cls, value):
+        return tuple([(int(_i), _s) for _i, _s in cls.PATTERN.findall(value)])
+
+    @classmethod
+    def _get_cmp_value(cls, value):
+        cmp_value = cls._CMP_VALUES.get(value)
+        if cmp_value is None:
+            cmp_value = cls._CMP_VALUES[value] = cls._parse(value)
+        return cmp_value
+
     @property
     def __cmp_value__(self):
-        return [(int(_i), _s) for _i, _s in re.findall('(\d+)([^\.]*)', self.__str__())]
+        try:
+            return self._cmp_value
+        except AttributeError:
+            self._cmp_value = self._get_cmp_value(self.__str__())
+            return self._cmp_value
+
+    def _other_cmp_value(self, value):
+        if type(value) is self.__class__:
+            return value.__cmp_value__
+        return self._get_cmp_value(str(value))
 
     def __eq__(self, value):
         if value is None:
             return False
-        return self.__cmp_value__ == self.__class__(value).__cmp_value__
+        return self.__cmp_value__ == self._other_cmp_value(value)
 
     def __gt__(self, value):
         if value is None:
             return True
-        return self.__cmp_value__ > self.__class__(value).__cmp_value__
+        return self.__cmp_value__ > self._other_cmp_value(value)
 
     def __ge__(self, value):
         if value is None:
             return True
-        return self.__eq__(value) or self.__gt__(value)
+        return self.__cmp_value__ >= self._other_cmp_value(value)
 
     def __lt__(self, value):
         if value is None:
             return False
-        return self.__cmp_value__ < self.__class__(value).__cmp_value__
+        return self.__cmp_value__ < self._other_cmp_value(value)
 
     def __le__(self, value):
         if value is None:
             return False
-        return self.__eq__(value) or self.__lt__(value)
+        return self.__cmp_value__ <= self._other_cmp_value(value)
 
 class Release(Version):
 
-    @property
-    def __cmp_value__(self):
-        m = re.search('(\d+)', self.__str__())
+    PATTERN = re.compile('(\\d+)')
+    _CMP_VALUES = {}
+
+    @classmethod
+    def _parse(cls, value):
+        m = cls.PATTERN.search(value)
         return int(m.group(0)) if m else -1
 
     def simple(self):
-        m = re.search('(\d+)', self.__str__())
+        m = self.PATTERN.search(self.__str__())
         return m.group(0) if m else ""
 
 class PackageInfo(object):
@@ -100,9 +127,13 @@ class PackageInfo(object):
     def __str__(self):
         return 'name: %s\nversion: %s\nrelease:%s\narch: %s\nmd5: %s' % (self.name, self.version, self.release, self.arch, self.md5)
 
+    @property
+    def sort_key(self):
+        return self.version.__cmp_value__, self.release.__cmp_value__
+
     @property
     def __cmp_value__(self):
-        return [self.version, self.release]
+        return self.sort_key
 
     def __hash__(self):
         return hash(self.md5)
@@ -28,18 +28,19 @@ import traceback
 import inspect2
 import six
 import logging
+import functools
 from copy import deepcopy
+from collections import OrderedDict
 from logging import handlers
 
 from enum import Enum
 from halo import Halo, cursor
 from colorama import Fore
-from prettytable import PrettyTable
 from progressbar import AdaptiveETA, Bar, SimpleProgress, ETA, FileTransferSpeed, Percentage, ProgressBar
-from types import MethodType
+from types import FunctionType
 from inspect2 import Parameter
 
-from log import Logger
+from log import Logger, AsyncLogHandler, LogBuffer, LogBufferHandler
 
 
 if sys.version_info.major == 3:
@@ -214,36 +215,46 @@ class LogSymbols(Enum):
     ERROR = FormtatText.error('x')
 
 
-class IOTable(PrettyTable):
+IOTable = None
 
-    @property
-    def align(self):
-        """Controls alignment of fields
-        Arguments:
-
-        align - alignment, one of "l", "c", or "r" """
-        return self._align
-
-    @align.setter
-    def align(self, val):
-        if not self._field_names:
-            self._align = {}
-        elif isinstance(val, dict):
-            val_map = val
-            for field in self._field_names:
-                if field in val_map:
-                    val = val_map[field]
-                    self._validate_align(val)
+
+def _load_io_table():
+    # prettytable is slow to import and most of the commands never print a table
+    global IOTable
+    if IOTable is None:
+        from prettytable import PrettyTable
+
+        class IOTable(PrettyTable):
+
+            @property
+            def align(self):
+                """Controls alignment of fields
+                Arguments:
+
+                align - alignment, one of "l", "c", or "r" """
+                return self._align
+
+            @align.setter
+            def align(self, val):
+                if not self._field_names:
+                    self._align = {}
+                elif isinstance(val, dict):
+                    val_map = val
+                    for field in self._field_names:
+                        if field in val_map:
+                            val = val_map[field]
+                            self._validate_align(val)
+                        else:
+                            val = 'l'
+                        self._align[field] = val
                 else:
-                    val = 'l'
-                self._align[field] = val
-        else:
-            if val:
-                self._validate_align(val)
-            else:
-                val = 'l'
-            for field in self._field_names:
-                self._align[field] = val
+                    if val:
+                        self._validate_align(val)
+                    else:
+                        val = 'l'
+                    for field in self._field_names:
+                        self._align[field] = val
+    return IOTable
 
 
 class IOHalo(Halo):
@@ -364,6 +375,7 @@ class MsgLevel(object):
 class IO(object):
 
     WIDTH = 64
+    MAX_TRACE_BUFFERS = 32
     VERBOSE_LEVEL = 0
     WARNING_PREV = FormtatText.warning('[WARN]')
     ERROR_PREV = FormtatText.error('[ERROR]')
@@ -384,6 +396,7 @@ class IO(object):
         self._trace_id = None
         self._log_name = 'default'
         self._trace_logger = None
+        self._trace_buffers = None
         self._log_cache = [] if use_cache else None
         self._root_io = root_io
         self.track_limit = track_limit
@@ -428,15 +441,37 @@ class IO(object):
                 self._log_name = log_name
             if trace_id:
                 self._trace_id = trace_id
-            self._trace_logger = None
+            self._close_trace_logger()
             return True
         return False
 
+    def set_trace_buffer(self, status):
+        """
+        Keep the latest lines of every trace in memory, so they can be read by read_trace_log without scanning the log files.
+        """
+        if self._root_io:
+            return False
+        if status:
+            if self._trace_buffers is None:
+                self._trace_buffers = OrderedDict()
+        else:
+            self._trace_buffers = None
+        self._close_trace_logger()
+        return True
+
+    def read_trace_log(self, trace_id, offset=None):
+        if self._root_io:
+            return self._root_io.read_trace_log(trace_id, offset)
+        buffers = self._trace_buffers
+        if buffers is None or trace_id not in buffers:
+            return None
+        return buffers[trace_id].read(offset)
+
     def __getstate__(self):
         state = {}
         for key in self.__dict__:
             state[key] = self.__dict__[key]
-        for key in ['_trace_logger', 'input_stream', 'sync_obj', '_out_obj', '_cur_out_obj', '_before_critical']:
+        for key in ['_trace_logger', '_trace_buffers', 'input_stream', 'sync_obj', '_out_obj', '_cur_out_obj', '_before_critical']:
             state[key] = None
         return state
 
@@ -451,9 +486,32 @@ class IO(object):
                 handler.setFormatter(logging.Formatter("[%%(asctime)s.%%(msecs)03d] [%s] [%%(levelname)s] %%(message)s" % self.trace_id, "%Y-%m-%d %H:%M:%S"))
             else:
                 handler.setFormatter(logging.Formatter("[%%(asctime)s.%%(msecs)03d] [%%(levelname)s] %%(message)s", "%Y-%m-%d %H:%M:%S"))
-            self._trace_logger.addHandler(handler)
+            self._trace_logger.addHandler(AsyncLogHandler(handler))
+            if self._trace_buffers is not None and self.trace_id:
+                buffer = self._trace_buffers.get(self.trace_id)
+                if buffer is None:
+                    buffer = self._trace_buffers[self.trace_id] = LogBuffer()
+                    while len(self._trace_buffers) > self.MAX_TRACE_BUFFERS:
+                        self._trace_buffers.popitem(last=False)
+                handler = LogBufferHandler(buffer)
+                handler.setFormatter(logging.Formatter("[%(asctime)s.%(msecs)03d] [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+                self._trace_logger.addHandler(handler)
         return self._trace_logger
 
+    def _flush_trace_logger(self):
+        if self._root_io:
+            return self._root_io._flush_trace_logger()
+        if self._trace_logger:
+            for handler in self._trace_logger.handlers:
+                handler.flush()
+
+    def _close_trace_logger(self):
+        if self._trace_logger:
+            for handler in self._trace_logger.handlers[:]:
+                handler.close()
+                self._trace_logger.removeHandler(handler)
+            self._trace_logger = None
+
     @property
     def trace_id(self):
         if self._root_io:
@@ -656,7 +714,7 @@ class IO(object):
         show_index = field_names is not None and show_index
         if show_index:
             show_index.insert(0, 'idx')
-        table = IOTable(field_names, **kwargs)
+        table = _load_io_table()(field_names, **kwargs)
         for row in ary:
             row = exp(row)
             if show_index:
@@ -721,10 +779,13 @@ class IO(object):
                     log_cache.append((levelno, line, args, kwargs))
 
     def _flush_log(self):
-        if not self._root_io and self.trace_logger and self._log_cache:
+        if self._root_io:
+            return
+        if self.trace_logger and self._log_cache:
             for levelno, line, args, kwargs in self._log_cache:
                 self.trace_logger.log(levelno, line, *args, **kwargs)
             self._log_cache = []
+        self._flush_trace_logger()
 
     def _log(self, levelno, msg, *args, **kwargs):
         if self.trace_logger:
@@ -741,6 +802,7 @@ class IO(object):
 
     def critical(self, msg, *args, **kwargs):
         self._print(MsgLevel.CRITICAL, '%s %s' % (self.ERROR_PREV, msg), *args, **kwargs)
+        self._flush_trace_logger()
         if not self._root_io:
             self.exit(kwargs['code'] if 'code' in kwargs else 255)
 
@@ -892,12 +954,42 @@ def safe_stdio_decorator(default_stdio=None):
     return decorated
 
 
+def safe_stdio_method(func):
+    """
+    Wrap a method whose parameters include stdio so that it always gets a StdIO, which defaults to the instance's stdio.
+    """
+    if getattr(func, '__safe_stdio__', False):
+        return func
+    parameters = list(inspect2.signature(func).parameters.values())
+    names = [parameter.name for parameter in parameters]
+    if "stdio" not in names or names.index("stdio") == 0:
+        return func
+    parameter = parameters[names.index("stdio")]
+    # the index in the arguments without self, a keyword only stdio can not be passed by position
+    index = names.index("stdio") - 1 if parameter.kind == Parameter.POSITIONAL_OR_KEYWORD else sys.maxsize
+    param_default = parameter.default
+    if param_default is Parameter.empty:
+        param_default = None
+
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        if len(args) > index:
+            args = args[:index] + (get_stdio(args[index]), ) + args[index + 1:]
+        elif "stdio" in kwargs:
+            kwargs["stdio"] = get_stdio(kwargs["stdio"])
+        else:
+            kwargs["stdio"] = get_stdio(param_default or getattr(self, "stdio", None))
+        return func(self, *args, **kwargs)
+    method.__wrapped__ = func
+    method.__safe_stdio__ = True
+    return method
+
+
 class SafeStdioMeta(type):
 
     @staticmethod
     def _init_wrapper_func(func):
         def wrapper(*args, **kwargs):
-            setattr(args[0], "_wrapper_func", {})
             func(*args, **kwargs)
             if "stdio" in args[0].__dict__:
                 args[0].__dict__["stdio"] = get_stdio(args[0].__dict__["stdio"])
@@ -914,36 +1006,22 @@ class SafeStdioMeta(type):
                 continue
             if isinstance(attr, (staticmethod, classmethod)):
                 attrs[key] = safe_stdio_decorator()(attr)
+            elif isinstance(attr, FunctionType):
+                attrs[key] = safe_stdio_method(attr)
         cls = type.__new__(mcs, name, bases, attrs)
+        # the methods inherited from a base which is not a SafeStdio, such as SshReturn for FeatureSshReturn
+        for key in dir(cls):
+            if key in attrs or (key.startswith("__") and key.endswith("__")):
+                continue
+            for base in cls.__mro__[1:]:
+                if key in base.__dict__:
+                    attr = base.__dict__[key]
+                    if not isinstance(base, SafeStdioMeta) and isinstance(attr, FunctionType):
+                        setattr(cls, key, safe_stdio_method(attr))
+                    break
         cls.__init__ = mcs._init_wrapper_func(cls.__init__)
         return cls
 
 
-class _StayTheSame(object):
-    pass
-
-
-STAY_THE_SAME = _StayTheSame()
-
-
 class SafeStdio(six.with_metaclass(SafeStdioMeta)):
-    _wrapper_func = {}
-
-    def __getattribute__(self, item):
-        _wrapper_func = super(SafeStdio, self).__getattribute__("_wrapper_func")
-        if item not in _wrapper_func:
-            attr = super(SafeStdio, self).__getattribute__(item)
-            if (not item.startswith("__") or not item.endswith("__")) and isinstance(attr, MethodType):
-                if "stdio" in inspect2.signature(attr).parameters:
-                    _wrapper_func[item] = safe_stdio_decorator(default_stdio=getattr(self, "stdio", None))(attr)
-                    return _wrapper_func[item]
-            _wrapper_func[item] = STAY_THE_SAME
-            return attr
-        if _wrapper_func[item] is STAY_THE_SAME:
-            return super(SafeStdio, self).__getattribute__(item)
-        return _wrapper_func[item]
-
-    def __setattr__(self, key, value):
-        if key in self._wrapper_func:
-            del self._wrapper_func[key]
-        return super(SafeStdio, self).__setattr__(key, value)
+    pass
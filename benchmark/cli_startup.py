@@ -0,0 +1,101 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Measure the cold start of the obd commands which only read the local state, and the modules they import.
+
+    python benchmark/cli_startup.py --repeat 10 --top 10
+
+The commands run against an empty obd home in a temporary directory. The import times need python 3.7 or later.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = [
+    ['--version'],
+    ['cluster', 'list'],
+    ['mirror', 'list', 'local'],
+    ['repo', 'list'],
+    ['display-trace', '00000000-0000-0000-0000-000000000000'],
+    ['env', 'show'],
+]
+
+
+def run_command(args, obd_home, importtime):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += [os.path.join(ROOT_PATH, '_cmd.py')] + args
+    env = dict(os.environ)
+    env['OBD_HOME'] = obd_home
+    start_time = time.time()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    _, stderr = process.communicate()
+    return time.time() - start_time, stderr.decode('utf-8', errors='replace')
+
+
+def parse_importtime(output):
+    # import time: self [us] | cumulative | imported package, the children are indented below their parent
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('   '):
+            continue
+        modules.append((name.strip(), int(cumulative)))
+    return modules
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--repeat', type='int', default=10, help='times to run every command. [10]')
+    parser.add_option('--top', type='int', default=0, help='show the N slowest top level imports of every command. [0]')
+    options, _ = parser.parse_args()
+
+    importtime = sys.version_info >= (3, 7)
+    work_dir = tempfile.mkdtemp(prefix='obd_bench_')
+    try:
+        # the first run creates the obd home, it is not a cold start of a command
+        run_command(['--version'], work_dir, False)
+        print('%-56s %8s %8s %8s' % ('command', 'min', 'median', 'imports'))
+        for args in COMMANDS:
+            costs = sorted([run_command(args, work_dir, False)[0] for _ in range(options.repeat)])
+            imports = parse_importtime(run_command(args, work_dir, True)[1]) if importtime else []
+            print('%-56s %6.0fms %6.0fms %6.0fms' % (
+                'obd ' + ' '.join(args), costs[0] * 1000, costs[len(costs) // 2] * 1000, sum([cost for _, cost in imports]) / 1000
+            ))
+            for name, cost in sorted(imports, key=lambda module: module[1], reverse=True)[:options.top]:
+                print('    %-52s %6.1fms' % (name, cost / 1000))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
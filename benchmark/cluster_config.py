@@ -0,0 +1,102 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Read the server configs of a large cluster the way the per-server loops of the plugins do.
+
+    python benchmark/cluster_config.py --servers 100 --params 400
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _deploy import ClusterConfig, ServerConfig
+from _plugin import ParamPlugin
+from _types import Integer, String, List
+
+
+def make_cluster_config(server_num, param_num):
+    temp_conf = {}
+    for i in range(param_num):
+        name = 'param_%04d' % i
+        if i % 50 == 0:
+            temp_conf[name] = ParamPlugin.ConfigItem(name, param_type=List, default=['a', 'b'])
+        elif i % 3 == 0:
+            temp_conf[name] = ParamPlugin.ConfigItem(name, param_type=Integer, default=i, require=i % 30 == 0)
+        else:
+            temp_conf[name] = ParamPlugin.ConfigItem(name, param_type=String, default='value_%d' % i)
+    servers = [ServerConfig('10.0.%d.%d' % (i // 250, i % 250), 'server%d' % i) for i in range(server_num)]
+    cluster_config = ClusterConfig(servers, 'oceanbase-ce', '4.2.0.0', None, None, None)
+    cluster_config.update_temp_conf(temp_conf)
+    cluster_config.set_global_conf(dict([('param_%04d' % i, i) for i in range(1, param_num, 40)]))
+    for i, server in enumerate(servers):
+        cluster_config.add_server_conf(server, {'zone': 'zone%d' % (i % 3), 'home_path': '/home/admin/server%d' % i, 'param_0001': 'server_%d' % i})
+    return cluster_config
+
+
+def run(name, func, cluster_config, repeat):
+    start_time = time.time()
+    for _ in range(repeat):
+        func(cluster_config)
+    print('%-24s %8.3fs' % (name, time.time() - start_time))
+
+
+def server_conf_with_default(cluster_config):
+    for server in cluster_config.servers:
+        cluster_config.get_server_conf_with_default(server)
+
+
+def global_conf_with_default(cluster_config):
+    for server in cluster_config.servers:
+        cluster_config.get_global_conf_with_default()
+
+
+def original_server_conf(cluster_config):
+    for server in cluster_config.servers:
+        cluster_config.get_original_server_conf_with_global(server, format_conf=True)
+
+
+def changed_global_conf(cluster_config):
+    # a changed layer drops the cached views, like an edit-config or an optimize does
+    cluster_config.set_global_conf(cluster_config.get_original_global_conf())
+    server_conf_with_default(cluster_config)
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--servers', type='int', default=100, help='number of servers. [100]')
+    parser.add_option('--params', type='int', default=400, help='number of parameters. [400]')
+    parser.add_option('--repeat', type='int', default=20, help='times to repeat every case. [20]')
+    options, _ = parser.parse_args()
+
+    cluster_config = make_cluster_config(options.servers, options.params)
+    run('server conf with default', server_conf_with_default, cluster_config, options.repeat)
+    run('global conf with default', global_conf_with_default, cluster_config, options.repeat)
+    run('original server conf', original_server_conf, cluster_config, options.repeat)
+    run('changed global conf', changed_global_conf, cluster_config, options.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Send the same directory to a remote host with the sftp and the tar transporter, and check that they leave the same modes.
+
+    python benchmark/dir_transfer.py --host 192.168.1.2 --user admin --files 2000
+
+The remote commands run with umask 077, so a mode that is not restored by the transporter shows up as a mismatch.
+It exits with 1 if the modes of the two copies differ.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _stdio import IO
+from ssh import SshClient, SshConfig, SftpTransfer, TarTransfer
+
+
+MODES = [0o644, 0o755, 0o600, 0o640, 0o700]
+DIR_MODES = [0o755, 0o750, 0o700]
+
+
+def make_dir(path, file_num, file_size):
+    for i in range(file_num):
+        dir_path = os.path.join(path, 'd%02d' % (i % 16))
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+            os.chmod(dir_path, DIR_MODES[i % len(DIR_MODES)])
+        file_path = os.path.join(dir_path, 'f%05d' % i)
+        with open(file_path, 'wb') as f:
+            f.write(os.urandom(file_size))
+        os.chmod(file_path, MODES[i % len(MODES)])
+    os.symlink('d00/f00000', os.path.join(path, 'link'))
+
+
+def remote_modes(client, remote_dir, stdio):
+    ret = client.execute_command("cd %s && find . -printf '%%m %%y %%P\\n' | sort -k 3" % remote_dir, stdio=stdio)
+    return ret.stdout.splitlines() if ret else None
+
+
+def run(name, transfer, client, local_dir, remote_dir, stdio):
+    client.execute_command('rm -rf %s && mkdir -p %s' % (remote_dir, remote_dir), stdio=stdio)
+    start_time = time.time()
+    ret = transfer.put_dir(local_dir, remote_dir)
+    cost = time.time() - start_time
+    print('%-6s %8.2fs  %s' % (name, cost, 'ok' if ret else 'failed'))
+    return remote_modes(client, remote_dir, stdio) if ret else None
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--host', help='remote host.')
+    parser.add_option('--port', type='int', default=22, help='ssh port. [22]')
+    parser.add_option('--user', default='root', help='ssh user. [root]')
+    parser.add_option('--password', help='ssh password.')
+    parser.add_option('--key', help='ssh private key file.')
+    parser.add_option('--files', type='int', default=2000, help='number of files. [2000]')
+    parser.add_option('--size', type='int', default=4096, help='size of every file in bytes. [4096]')
+    options, _ = parser.parse_args()
+    if not options.host:
+        parser.error('--host is required')
+
+    stdio = IO(0)
+    client = SshClient(SshConfig(options.host, options.user, options.password, options.key, options.port), stdio)
+    if not client.connect(stdio=stdio) or not client._open_sftp(stdio=stdio):
+        print('failed to connect to %s' % options.host)
+        sys.exit(1)
+    client.env_str = 'umask 077;' + client.env_str
+    work_dir = tempfile.mkdtemp(prefix='obd_bench_')
+    remote_dir = client.execute_command('mktemp -d /tmp/obd_bench_XXXXXX', stdio=stdio).stdout.strip()
+    try:
+        local_dir = os.path.join(work_dir, 'src')
+        os.makedirs(local_dir)
+        make_dir(local_dir, options.files, options.size)
+        sftp = run('sftp', SftpTransfer(client, stdio=stdio), client, local_dir, os.path.join(remote_dir, 'sftp'), stdio)
+        tar = run('tar', TarTransfer(client, codec=client.tar_codec, stdio=stdio), client, local_dir, os.path.join(remote_dir, 'tar'), stdio)
+        if sftp is None or tar is None:
+            sys.exit(1)
+        mismatches = [(a, b) for a, b in zip(sftp, tar) if a != b]
+        if len(sftp) != len(tar):
+            mismatches.append(('%d entries' % len(sftp), '%d entries' % len(tar)))
+        for a, b in mismatches[:20]:
+            print('sftp: %-40s tar: %s' % (a, b))
+        print('modes  %s' % ('differ' if mismatches else 'match'))
+        if mismatches:
+            sys.exit(1)
+    finally:
+        client.execute_command('rm -rf %s' % remote_dir, stdio=stdio)
+        client.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compare the rpm extract modes on a synthetic package.
+
+    python benchmark/rpm_extract.py --size 400 --files 500
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+import shutil
+import struct
+import hashlib
+import tempfile
+from optparse import OptionParser
+
+try:
+    import lzma
+except ImportError:
+    from backports import lzma
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _rpm import Package
+from _repository import ExtractFileInfo, ParallerExtractor, StreamExtractor
+
+
+RPM_LEAD = struct.Struct('!4sBBhh66shh16s')
+HEADER_MAGIC = b'\x8e\xad\xe8\x01\x00\x00\x00\x00'
+STRING, INT16, INT32, STRING_ARRAY = 6, 3, 4, 8
+
+
+def build_header(tags):
+    entries = b''
+    store = b''
+    for tag, tag_type, value in tags:
+        if tag_type == INT32:
+            store += b'\x00' * (-len(store) % 4)
+            data, count = struct.pack('!%dI' % len(value), *value), len(value)
+        elif tag_type == INT16:
+            store += b'\x00' * (-len(store) % 2)
+            data, count = struct.pack('!%dH' % len(value), *value), len(value)
+        elif tag_type == STRING_ARRAY:
+            data, count = b''.join([v.encode('utf-8') + b'\x00' for v in value]), len(value)
+        else:
+            data, count = value.encode('utf-8') + b'\x00', 1
+        entries += struct.pack('!iiii', tag, tag_type, len(store), count)
+        store += data
+    return HEADER_MAGIC + struct.pack('!ii', len(tags), len(store)) + entries + store
+
+
+def cpio_entry(name, data, mode, ino):
+    name = name.encode('utf-8') + b'\x00'
+    fields = [ino, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(name), 0]
+    header = b'070701' + b''.join([('%08x' % field).encode('ascii') for field in fields])
+    entry = header + name
+    entry += b'\x00' * (-len(entry) % 4)
+    entry += data
+    entry += b'\x00' * (-len(entry) % 4)
+    return entry
+
+
+def make_files(size_mb, file_num):
+    # one big binary and many small files, like the observer package
+    block = os.urandom(1 << 16)
+    files = [('./home/admin/oceanbase/bin/observer', int(size_mb * 0.7) << 20, 0o100755)]
+    small_size = max(((size_mb << 20) - files[0][1]) // max(file_num - 1, 1), 1)
+    for i in range(1, file_num):
+        files.append(('./home/admin/oceanbase/lib/lib%04d.so' % i, small_size, 0o100644))
+    for name, size, mode in files:
+        # half repeated and half random content to be about as compressible as a binary
+        data = (block * (size // len(block) + 1))[:size // 2] + os.urandom(size - size // 2)
+        yield name, data, mode
+
+
+def build_rpm(path, size_mb, file_num, preset):
+    compressor = lzma.LZMACompressor(preset=preset)
+    dirnames, basenames, dirindexes, md5s, modes = [], [], [], [], []
+    payload = tempfile.TemporaryFile()
+    for ino, (name, data, mode) in enumerate(make_files(size_mb, file_num), 1):
+        dirname, basename = os.path.split(name[1:])
+        dirname += '/'
+        if dirname not in dirnames:
+            dirnames.append(dirname)
+        basenames.append(basename)
+        dirindexes.append(dirnames.index(dirname))
+        md5s.append(hashlib.md5(data).hexdigest())
+        modes.append(mode)
+        payload.write(compressor.compress(cpio_entry(name, data, mode, ino)))
+    payload.write(compressor.compress(cpio_entry('TRAILER!!!', b'', 0, 0)))
+    payload.write(compressor.flush())
+
+    signature = build_header([(269, STRING, hashlib.md5(path.encode('utf-8')).hexdigest())])
+    header = build_header([
+        (1000, STRING, 'benchmark'),
+        (1001, STRING, '1.0.0'),
+        (1002, STRING, '1'),
+        (1022, STRING, 'x86_64'),
+        (1030, INT16, modes),
+        (1035, STRING_ARRAY, md5s),
+        (1036, STRING_ARRAY, [''] * len(basenames)),
+        (1116, INT32, dirindexes),
+        (1117, STRING_ARRAY, basenames),
+        (1118, STRING_ARRAY, dirnames),
+        (1125, STRING, 'xz'),
+    ])
+    with open(path, 'wb') as f:
+        f.write(RPM_LEAD.pack(b'\xed\xab\xee\xdb', 3, 0, 0, 1, b'benchmark', 1, 5, b''))
+        f.write(signature)
+        f.write(b'\x00' * (-len(signature) % 8))
+        f.write(header)
+        payload.seek(0)
+        shutil.copyfileobj(payload, f)
+    payload.close()
+
+
+def extract_files(pkg, target_dir):
+    with pkg.open() as rpm:
+        headers = rpm.headers
+    files = []
+    for basename, dirindex, mode in zip(headers['basenames'], headers['dirindexes'], headers['filemodes']):
+        src_path = '.' + os.path.join(headers['dirnames'][dirindex].decode(), basename.decode())
+        files.append(ExtractFileInfo(src_path, os.path.join(target_dir, src_path[2:]), mode & 0x1ff))
+    return files
+
+
+def run(name, extract, pkg, work_dir):
+    target_dir = os.path.join(work_dir, name)
+    start_time = time.time()
+    ret = extract(pkg, extract_files(pkg, target_dir))
+    cost = time.time() - start_time
+    shutil.rmtree(target_dir, ignore_errors=True)
+    print('%-10s %8.2fs  %s' % (name, cost, 'ok' if ret is not False else 'failed'))
+    return cost
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--size', type='int', default=400, help='payload size in MB. [400]')
+    parser.add_option('--files', type='int', default=500, help='number of files. [500]')
+    parser.add_option('--preset', type='int', default=2, help='xz preset of the payload. [2]')
+    parser.add_option('--rpm', help='use an existing rpm instead of a synthetic one.')
+    options, _ = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='obd_bench_')
+    try:
+        rpm_path = options.rpm
+        if not rpm_path:
+            rpm_path = os.path.join(work_dir, 'benchmark-1.0.0-1.x86_64.rpm')
+            start_time = time.time()
+            build_rpm(rpm_path, options.size, options.files, options.preset)
+            print('build %s (%d bytes) in %.2fs' % (rpm_path, os.path.getsize(rpm_path), time.time() - start_time))
+        pkg = Package(rpm_path)
+        paraller = run('paraller', lambda pkg, files: ParallerExtractor(pkg, files)._paraller(), pkg, work_dir)
+        stream = run('stream', lambda pkg, files: StreamExtractor(pkg, files).extract(), pkg, work_dir)
+        print('speedup    %8.2fx' % (paraller / max(stream, 0.001)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
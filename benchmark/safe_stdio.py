@@ -0,0 +1,82 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Measure the method dispatch of SshClient, which injects the stdio through SafeStdio.
+
+    python benchmark/safe_stdio.py --number 100000
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _stdio import IO
+from ssh import SshClient, SshConfig
+
+
+def run(name, func, number):
+    start_time = time.time()
+    func(number)
+    cost = time.time() - start_time
+    print('%-22s %8.3fs  %6.2fus/op' % (name, cost, cost * 1000000 / number))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--number', type='int', default=100000, help='number of operations. [100000]')
+    options, _ = parser.parse_args()
+
+    config = SshConfig('127.0.0.1')
+    stdio = IO(0)
+    client = SshClient(config, stdio)
+
+    def attribute(number):
+        for _ in range(number):
+            client.config
+
+    def call(number):
+        for _ in range(number):
+            client.get_env('PATH')
+
+    def call_with_stdio(number):
+        for _ in range(number):
+            client.get_env('PATH', stdio=stdio)
+
+    def client_per_task(number):
+        # like ConcurrentExecutor which creates a client for every task
+        for _ in range(number):
+            task_client = SshClient(config, stdio)
+            task_client.get_env('PATH')
+            task_client.is_localhost()
+
+    run('attribute', attribute, options.number)
+    run('call', call, options.number)
+    run('call with stdio', call_with_stdio, options.number)
+    run('client per task', client_per_task, options.number // 10)
+
+
+if __name__ == '__main__':
+    main()
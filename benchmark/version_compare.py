@@ -0,0 +1,93 @@
+# coding: utf-8
+# OceanBase Deploy.
+# Copyright (C) 2021 OceanBase
+#
+# This file is part of OceanBase Deploy.
+#
+# OceanBase Deploy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OceanBase Deploy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Compare and sort the packages of a mirror catalog, like the web catalog and the plugin loaders do.
+
+    python benchmark/version_compare.py --packages 5000
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+import random
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _rpm import PackageInfo, Version
+
+
+NAMES = ['oceanbase-ce', 'oceanbase-ce-libs', 'obproxy-ce', 'obagent', 'ocp-express', 'obclient', 'oblogproxy', 'ocp-server-ce', 'prometheus', 'grafana']
+ARCHS = ['x86_64', 'aarch64']
+DISTS = ['el7', 'el8']
+
+
+def make_catalog(number):
+    random.seed(number)
+    infos = []
+    for i in range(number):
+        version = '%d.%d.%d.%d' % (random.randint(1, 4), random.randint(0, 3), random.randint(0, 2), random.randint(0, 5))
+        release = '%d%08d.%s' % (random.randint(1, 110), random.randint(20210101, 20241231), random.choice(DISTS))
+        infos.append(PackageInfo(random.choice(NAMES), version, release, random.choice(ARCHS), '%032x' % i))
+    return infos
+
+
+def run(name, func, *args):
+    start_time = time.time()
+    func(*args)
+    print('%-16s %8.3fs' % (name, time.time() - start_time))
+
+
+def sort_packages(infos, repeat):
+    for _ in range(repeat):
+        sorted(infos)
+
+
+def latest_per_name(infos, repeat):
+    for _ in range(repeat):
+        latest = {}
+        for info in infos:
+            if info.name not in latest or info > latest[info.name]:
+                latest[info.name] = info
+
+
+def filter_versions(infos, repeat):
+    # like the version filter of the web catalog and the version checks of the plugins
+    for _ in range(repeat):
+        [info for info in infos if info.version >= '4.2.1.0' and Version(info.version) < Version('4.3')]
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--packages', type='int', default=5000, help='number of packages in the catalog. [5000]')
+    parser.add_option('--repeat', type='int', default=20, help='times to repeat every case. [20]')
+    options, _ = parser.parse_args()
+
+    infos = make_catalog(options.packages)
+    run('sort', sort_packages, infos, options.repeat)
+    run('latest per name', latest_per_name, infos, options.repeat)
+    run('filter versions', filter_versions, infos, options.repeat)
+
+
+if __name__ == '__main__':
+    main()
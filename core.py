@@ -22,32 +22,31 @@ from __future__ import absolute_import, division, print_function
 
 import re
 import os
+import json
 import time
 from optparse import Values
 from copy import deepcopy, copy
-import requests
 
 import tempfile
 from subprocess import call as subprocess_call
 
-from ssh import SshClient, SshConfig
+from ssh import SshClient, SshConfig, FanoutDistributor
 from tool import FileUtil, DirectoryUtil, YamlLoader, timeout, COMMAND_ENV, OrderedDict
 from _stdio import MsgLevel, FormtatText
-from _rpm import Version
-from _mirror import MirrorRepositoryManager, PackageInfo
+from _rpm import Version, PackageInfo
 from _plugin import PluginManager, PluginType, InstallPlugin, PluginContextNamespace
 from _deploy import DeployManager, DeployStatus, DeployConfig, DeployConfigStatus, Deploy
 from _repository import RepositoryManager, LocalPackage, Repository
 import _errno as err
 from _lock import LockManager, LockMode
-from _optimize import OptimizeManager
-from _environ import ENV_REPO_INSTALL_MODE, ENV_BASE_DIR
+from _environ import ENV_REPO_INSTALL_MODE, ENV_BASE_DIR, ENV_DISTRIBUTE_FANOUT
 from const import OB_OFFICIAL_WEBSITE
 
 
 class ObdHome(object):
 
     HOME_LOCK_RELATIVE_PATH = 'obd.conf'
+    MYSQLTEST_CASE_COSTS_FILE = 'mysqltest_case_costs.json'
 
     def __init__(self, home_path, dev_mode=False, lock_mode=None, stdio=None):
         self.home_path = home_path
@@ -60,6 +59,7 @@ class ObdHome(object):
         self._plugin_manager = None
         self._lock_manager = None
         self._optimize_manager = None
+        self._benchmark_manager = None
         self.stdio = None
         self._stdio_func = None
         self.ssh_clients = {}
@@ -77,6 +77,7 @@ class ObdHome(object):
     @property
     def mirror_manager(self):
         if not self._mirror_manager:
+            from _mirror import MirrorRepositoryManager
             self._mirror_manager = MirrorRepositoryManager(self.home_path, self.lock_manager, self.stdio)
         return self._mirror_manager
 
@@ -107,9 +108,17 @@ class ObdHome(object):
     @property
     def optimize_manager(self):
         if not self._optimize_manager:
+            from _optimize import OptimizeManager
             self._optimize_manager = OptimizeManager(self.home_path, stdio=self.stdio)
         return self._optimize_manager
 
+    @property
+    def benchmark_manager(self):
+        if not self._benchmark_manager:
+            from _benchmark import BenchmarkResultManager
+            self._benchmark_manager = BenchmarkResultManager(self.home_path, stdio=self.stdio)
+        return self._benchmark_manager
+
     def _global_ex_lock(self):
         self.lock_manager.global_ex_lock()
 
@@ -834,10 +843,17 @@ class ObdHome(object):
     def servers_repository_install(self, ssh_clients, servers, repository, install_plugin):
         self._call_stdio('start_loading', 'Remote %s repository install' % repository)
         self._call_stdio('verbose', 'Remote %s repository integrity check' % repository)
+        remote_home_paths = {}
+        install_servers = OrderedDict()
         for server in servers:
             self._call_stdio('verbose', '%s %s repository integrity check' % (server, repository))
             client = ssh_clients[server]
             remote_home_path = client.execute_command('echo ${OBD_HOME:-"$HOME"}/.obd').stdout.strip()
+            remote_home_paths[server] = remote_home_path
+            # servers on the same host share the repository under the remote obd home
+            copy_key = (client.config.host, client.config.username, remote_home_path)
+            if copy_key in install_servers:
+                continue
             remote_repository_data_path = repository.data_file_path.replace(self.home_path, remote_home_path)
             remote_repository_data = client.execute_command('cat %s' % remote_repository_data_path).stdout
             self._call_stdio('verbose', '%s %s install check' % (server, repository))
@@ -854,16 +870,51 @@ class ObdHome(object):
                     self._call_stdio('verbose', '%s %s need to be updated' % (server, repository))
             except:
                 self._call_stdio('verbose', '%s %s need to be installed ' % (server, repository))
+            install_servers[copy_key] = server
+
+        def push(server):
+            client = ssh_clients[server]
+            remote_home_path = remote_home_paths[server]
+            self._call_stdio('verbose', '%s %s installing' % (server, repository))
+            files = []
             for file_path in repository.file_list(install_plugin):
-                remote_file_path = file_path.replace(self.home_path, remote_home_path)
-                self._call_stdio('verbose', '%s %s installing' % (server, repository))
-                if not client.put_file(file_path, remote_file_path):
-                    self._call_stdio('stop_loading', 'fail')
+                if not os.path.islink(file_path) and file_path not in digests:
+                    files = None
+                    break
+                files.append((file_path, os.path.relpath(file_path, repository.repository_dir), digests.get(file_path)))
+            if files is not None:
+                remote_repository_dir = repository.repository_dir.replace(self.home_path, remote_home_path)
+                if not client.put_files_by_digest(files, remote_repository_dir, hard_link=True):
                     return False
-            client.put_file(repository.data_file_path, remote_repository_data_path)
+            else:
+                for file_path in repository.file_list(install_plugin):
+                    remote_file_path = file_path.replace(self.home_path, remote_home_path)
+                    if not client.put_file(file_path, remote_file_path):
+                        return False
+            client.put_file(repository.data_file_path, repository.data_file_path.replace(self.home_path, remote_home_path))
             self._call_stdio('verbose', '%s %s installed' % (server, repository.name))
-        self._call_stdio('stop_loading', 'succeed')
-        return True
+            return True
+
+        install_servers = list(install_servers.values())
+        digests = repository.file_digests() if install_servers else {}
+        try:
+            fanout = int(COMMAND_ENV.get(ENV_DISTRIBUTE_FANOUT, 0))
+        except ValueError:
+            fanout = 0
+        if fanout > 0 and len(install_servers) > 1:
+            names = [os.path.relpath(file_path, repository.repository_dir) for file_path in repository.file_list(install_plugin)]
+            names.append(os.path.relpath(repository.data_file_path, repository.repository_dir))
+
+            def relay(source, target):
+                source_dir = repository.repository_dir.replace(self.home_path, remote_home_paths[source])
+                target_dir = repository.repository_dir.replace(self.home_path, remote_home_paths[target])
+                return ssh_clients[source].relay_dir(ssh_clients[target], source_dir, target_dir, names, stdio=self.stdio)
+
+            ret = all(FanoutDistributor(fanout, stdio=self.stdio).distribute(install_servers, push, relay).values())
+        else:
+            ret = all(push(server) for server in install_servers)
+        self._call_stdio('stop_loading', 'succeed' if ret else 'fail')
+        return ret
 
     def servers_repository_lib_check(self, ssh_clients, servers, repository, install_plugin, msg_lv='error'):
         ret = True
@@ -3435,6 +3486,8 @@ class ObdHome(object):
         env['cursor'] = cursor
         env['host'] = opts.test_server.ip
         env['port'] = db.port
+        case_costs_path = os.path.join(deploy.config_dir, self.MYSQLTEST_CASE_COSTS_FILE)
+        env['case_costs'] = self._load_mysqltest_case_costs(case_costs_path)
 
         namespace.set_variable('env', env)
         mysqltest_init_plugin = self.plugin_manager.get_best_py_script_plugin('init', 'mysqltest', ob_repository.version)
@@ -3583,6 +3636,7 @@ class ObdHome(object):
                     self.call_plugin(mysqltest_collect_log_plugin, target_repository, test_name='reboot_failed')
                     break
         result = env.get('case_results', [])
+        self._dump_mysqltest_case_costs(case_costs_path, env['case_costs'], result)
         passcnt = len(list(filter(lambda x: x["ret"] == 0, result)))
         totalcnt = len(env.get('run_test_cases', []))
         failcnt = totalcnt - passcnt
@@ -3602,7 +3656,100 @@ class ObdHome(object):
             return True
         return False
 
+    def _load_mysqltest_case_costs(self, path):
+        try:
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        except:
+            self._call_stdio('exception', 'failed to load case costs from %s' % path)
+        return {}
+
+    def _dump_mysqltest_case_costs(self, path, case_costs, case_results):
+        # the cost of the last run of every case, which schedules the cases of the parallel mode
+        for case_result in case_results:
+            case_costs[case_result['name']] = round(case_result['cost'], 3)
+        try:
+            with FileUtil.open(path, 'w', stdio=self.stdio) as f:
+                json.dump(case_costs, f)
+        except:
+            self._call_stdio('exception', 'failed to dump case costs to %s' % path)
+
+    def _save_benchmark_result(self, test, deploy, opts, ret, stage=None):
+        result = ret.get_return('result') if ret else None
+        if not result:
+            self._call_stdio('verbose', 'No %s result to save' % test)
+            return
+        try:
+            run_id = self.benchmark_manager.add_run(
+                test=test,
+                deploy_name=deploy.name,
+                config_hash=self.benchmark_manager.config_hash(deploy.deploy_config),
+                optimization=getattr(opts, 'optimization', 0),
+                stage=stage,
+                options=self.benchmark_manager.dump_options(opts),
+                result=result
+            )
+            if hasattr(opts, 'compare'):
+                self._call_stdio('print', '%s result saved as run %s. Use `--compare %s` to compare it with other runs.' % (test, run_id, run_id))
+            else:
+                self._call_stdio('print', '%s result saved as run %s' % (test, run_id))
+        except:
+            self._call_stdio('exception', 'failed to save %s result' % test)
+
+    def _compare_benchmark_results(self, test, name, run_ids):
+        # the runs of another test are reported as missing
+        runs = self.benchmark_manager.get_runs(test, run_ids)
+        if len(run_ids) == 1 and len(runs) == 1:
+            # compare the given baseline with the last run of the deployment
+            runs += [run for run in self.benchmark_manager.get_last_runs(test, name) if run['id'] != runs[0]['id']]
+        missing = set(run_ids) - set([run['id'] for run in runs])
+        if missing:
+            self._call_stdio('error', 'No such %s run: %s' % (test, ', '.join([str(run_id) for run_id in sorted(missing)])))
+            return False
+        if len(runs) < 2:
+            self._call_stdio('error', 'At least two %s runs are required for comparison' % test)
+            return False
+
+        baseline = runs[0]['summary']
+        def value(summary, key):
+            if key not in summary:
+                return '-'
+            text = '%.2f' % summary[key]
+            if summary is not baseline and baseline.get(key):
+                text += ' (%+.2f%%)' % ((summary[key] - baseline[key]) * 100.0 / baseline[key])
+            return text
+
+        rows = []
+        for run in runs:
+            summary = run['summary']
+            options = run['options']
+            rows.append([
+                run['id'],
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['created'])),
+                run['deploy_name'],
+                run['config_hash'][:8],
+                run['optimization'],
+                options.get('script_name', '-'),
+                options.get('threads', '-'),
+                value(summary, 'tps'),
+                value(summary, 'qps'),
+                value(summary, 'lat_avg'),
+                value(summary, 'lat_percentile'),
+                value(summary, 'errors'),
+            ])
+        self._call_stdio('print_list', rows, ['Run', 'Time', 'Deploy', 'Config', 'Optimization', 'Script', 'Threads', 'TPS', 'QPS', 'Avg Latency(ms)', 'Percentile Latency(ms)', 'Errors/s'], title='%s compare' % test)
+        return True
+
     def sysbench(self, name, opts):
+        if getattr(opts, 'compare', None):
+            try:
+                run_ids = [int(run_id) for run_id in opts.compare.split(',') if run_id.strip()]
+            except ValueError:
+                self._call_stdio('error', 'Invalid run id list: %s' % opts.compare)
+                return False
+            return self._compare_benchmark_results('sysbench', name, run_ids)
+
         self._call_stdio('verbose', 'Get Deploy by name')
         deploy = self.deploy_manager.get_deploy_config(name)
         self.set_deploy(deploy)
@@ -3733,7 +3880,9 @@ class ObdHome(object):
                 optimization_init = True
                 if not self._test_optimize_operation(repository=repository, ob_repository=ob_repository, stage='test', connect_namespaces=connect_namespaces, connect_plugin=connect_plugin, optimize_envs=kwargs):
                     return False
-            if self.call_plugin(run_test_plugin, repository):
+            ret = self.call_plugin(run_test_plugin, repository)
+            if ret:
+                self._save_benchmark_result('sysbench', deploy, opts, ret, stage='test' if optimization else None)
                 return True
             return False
         finally:
@@ -3841,7 +3990,9 @@ class ObdHome(object):
                         repository=repository, ob_repository=repository, stage='test',
                         connect_namespaces=[namespace], connect_plugin=connect_plugin, optimize_envs=kwargs):
                     return False
-            if self.call_plugin(run_test_plugin, repository, db=db, cursor=cursor, **kwargs):
+            ret = self.call_plugin(run_test_plugin, repository, db=db, cursor=cursor, **kwargs)
+            if ret:
+                self._save_benchmark_result('tpch', deploy, opts, ret, stage='test' if optimization else None)
                 return True
             return False
         except Exception as e:
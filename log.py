@@ -21,7 +21,11 @@
 from __future__ import absolute_import, division, print_function
 
 
+import os
+import sys
 import logging
+import threading
+from collections import deque
 from logging import handlers
 
 
@@ -33,4 +37,162 @@ class Logger(logging.Logger):
         self.buffer_size = 0
 
     def _log(self, level, msg, args, end='\n', **kwargs):
-        return super(Logger, self)._log(level, msg, args, **kwargs)
\ No newline at end of file
+        return super(Logger, self)._log(level, msg, args, **kwargs)
+
+    def findCaller(self, *args, **kwargs):
+        # the trace formatter never prints the caller, walking the stack for it is a waste
+        if sys.version_info.major == 2:
+            return '(unknown file)', 0, '(unknown function)'
+        return '(unknown file)', 0, '(unknown function)', None
+
+
+class AsyncLogHandler(logging.Handler):
+
+    """
+    Keep the records in memory and let a background thread write them to the target handler in batches,
+    so the caller does not wait for formatting and file I/O. When the buffer is full the caller writes it.
+    """
+
+    CAPACITY = 10000
+    INTERVAL = 0.1
+
+    def __init__(self, handler, capacity=None, interval=None):
+        super(AsyncLogHandler, self).__init__(handler.level)
+        self.handler = handler
+        self.capacity = capacity if capacity else self.CAPACITY
+        self.interval = interval if interval else self.INTERVAL
+        self._records = deque()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = os.getpid()
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, name='obd-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        if self._closed or self._pid != os.getpid():
+            # the writer thread does not exist in a forked process
+            self.handler.handle(record)
+            return
+        try:
+            # args may change after this call, so the message is formatted now and the rest in the writer
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                if not record.exc_text:
+                    record.exc_text = (self.handler.formatter or logging.Formatter()).formatException(record.exc_info)
+                record.exc_info = None
+            self._records.append(record)
+            if len(self._records) >= self.capacity:
+                self._drain()
+        except Exception:
+            self.handleError(record)
+
+    def _work(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._drain()
+
+    def _drain(self):
+        with self._write_lock:
+            records = []
+            try:
+                while True:
+                    records.append(self._records.popleft())
+            except IndexError:
+                pass
+            if records:
+                self._write(records)
+
+    def _write(self, records):
+        handler = self.handler
+        if not isinstance(handler, logging.FileHandler):
+            for record in records:
+                handler.handle(record)
+            return
+        # one flush for the whole batch instead of one per record
+        handler.acquire()
+        try:
+            for record in records:
+                try:
+                    if isinstance(handler, handlers.BaseRotatingHandler) and handler.shouldRollover(record):
+                        handler.doRollover()
+                    if handler.stream is None:
+                        handler.stream = handler._open()
+                    handler.stream.write(handler.format(record) + getattr(handler, 'terminator', '\n'))
+                except Exception:
+                    handler.handleError(record)
+            if handler.stream:
+                handler.stream.flush()
+        finally:
+            handler.release()
+
+    def flush(self):
+        self._drain()
+        self.handler.flush()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            if self._pid == os.getpid():
+                self._wakeup.set()
+                self._thread.join()
+            self._drain()
+        self.handler.close()
+        super(AsyncLogHandler, self).close()
+
+
+class LogBuffer(object):
+
+    """
+    The latest lines of a log in memory. The offset counts every char ever appended,
+    so a reader which passes back the offset it got only reads the new lines.
+    """
+
+    CAPACITY = 4 << 20
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity if capacity else self.CAPACITY
+        self._lines = deque()
+        self._size = 0
+        self._start = 0
+        self._lock = threading.Lock()
+
+    def append(self, line):
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line)
+            while self._size > self.capacity and len(self._lines) > 1:
+                size = len(self._lines.popleft())
+                self._size -= size
+                self._start += size
+
+    def read(self, offset=None):
+        with self._lock:
+            end = self._start + self._size
+            if not offset or offset <= self._start:
+                return ''.join(self._lines), end
+            lines = []
+            size = end - offset
+            # the new lines are at the tail
+            for line in reversed(self._lines):
+                if size <= 0:
+                    break
+                lines.append(line)
+                size -= len(line)
+            content = ''.join(reversed(lines))
+            return content[-size:] if size < 0 else content, end
+
+
+class LogBufferHandler(logging.Handler):
+
+    def __init__(self, buffer):
+        super(LogBufferHandler, self).__init__()
+        self.buffer = buffer
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
@@ -22,17 +22,20 @@ from __future__ import absolute_import, division, print_function
 
 import os
 import re
+from collections import OrderedDict
 
 from _plugin import InstallPlugin
 from _deploy import InnerConfigKeywords
-from tool import YamlLoader
+from _environ import ENV_DISTRIBUTE_FANOUT
+from ssh import FanoutDistributor
+from tool import YamlLoader, COMMAND_ENV
 
 
 def install_repo(plugin_context, obd_home, install_repository, install_plugin, check_repository, check_file_map,
                  msg_lv, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
 
-    def install_to_home_path():
+    def install_to_home_path(client, remote_home_path, remote_obd_home):
         repo_dir = install_repository.repository_dir.replace(obd_home, remote_obd_home, 1)
         if is_lib_repo:
             home_path = os.path.join(remote_home_path, 'lib')
@@ -60,25 +63,11 @@ def install_repo(plugin_context, obd_home, install_repository, install_plugin, c
             else:
                 success = client.execute_command("%(install_cmd)s ${source} ${target}" % {"install_cmd": install_cmd}) and success
         return success
-    stdio = plugin_context.stdio
-    clients = plugin_context.clients
-    servers = cluster_config.servers
-    is_lib_repo = install_repository.name.endswith("-libs")
-    is_utils_repo = install_repository.name.endswith("-utils")
-    home_path_map = {}
-    for server in servers:
-        server_config = cluster_config.get_server_conf(server)
-        home_path_map[server] = server_config.get("home_path")
-
-    is_ln_install_mode = cluster_config.is_ln_install_mode()
 
-    # remote install repository
-    stdio.start_loading('Remote %s repository install' % install_repository)
-    stdio.verbose('Remote %s repository integrity check' % install_repository)
-    for server in servers:
-        client = clients[server]
+    # return True if the repository need to be sent to the server, None if failed
+    def check_server(server, client, stdio):
         remote_home_path = home_path_map[server]
-        install_file_items = install_plugin.file_map(install_repository).values()
+        remote_obd_home = None
         stdio.verbose('%s %s repository integrity check' % (server, install_repository))
         if is_ln_install_mode:
             remote_obd_home = client.execute_command('echo ${OBD_HOME:-"$HOME"}/.obd').stdout.strip()
@@ -91,6 +80,8 @@ def install_repo(plugin_context, obd_home, install_repository, install_plugin, c
             else:
                 install_path = remote_home_path
             client.execute_command('mkdir -p {}'.format(install_path))
+        remote_obd_home_map[server] = remote_obd_home
+        install_path_map[server] = install_path
         remote_repository_data_path = os.path.join(install_path, '.data')
         remote_repository_data = client.execute_command('cat %s' % remote_repository_data_path).stdout
         stdio.verbose('%s %s install check' % (server, install_repository))
@@ -102,44 +93,139 @@ def install_repo(plugin_context, obd_home, install_repository, install_plugin, c
             elif data == install_repository:
                 # Version sync. Check for damages (TODO)
                 stdio.verbose('%s %s has installed ' % (server, install_repository))
-                if not install_to_home_path():
+                if not install_to_home_path(client, remote_home_path, remote_obd_home):
                     stdio.error("Failed to install repository {} to {}".format(install_repository, remote_home_path))
-                    return False
-                continue
+                    return None
+                return False
             else:
                 stdio.verbose('%s %s need to be updated' % (server, install_repository))
         except:
             stdio.exception('')
             stdio.verbose('%s %s need to be installed ' % (server, install_repository))
+        return True
 
-        stdio.verbose('%s %s installing' % (server, install_repository))
-        sub_io = stdio.sub_io()
+    def digest_files():
+        digests = install_repository.file_digests()
+        files = []
         for file_item in install_file_items:
             file_path = os.path.join(install_repository.repository_dir, file_item.target_path)
-            remote_file_path = os.path.join(install_path, file_item.target_path)
             if file_item.type == InstallPlugin.FileItemType.DIR:
-                if os.path.isdir(file_path) and not client.put_dir(file_path, remote_file_path, stdio=sub_io):
-                    stdio.stop_loading('fail')
-                    return False
+                for root, dir_names, file_names in os.walk(file_path):
+                    files += [os.path.join(root, name) for name in dir_names + file_names]
             else:
-                if not client.put_file(file_path, remote_file_path, stdio=sub_io):
-                    stdio.stop_loading('fail')
-                    return False
+                files.append(file_path)
+        ret = []
+        for path in files:
+            if os.path.isfile(path) and not os.path.islink(path) and path not in digests:
+                return None
+            ret.append((path, os.path.relpath(path, install_repository.repository_dir), digests.get(path)))
+        return ret
+
+    def put_server(server, client, stdio):
+        install_path = install_path_map[server]
+        stdio.verbose('%s %s installing' % (server, install_repository))
+        sub_io = stdio.sub_io()
+        if install_files is not None:
+            # only the contents not cached on the host are sent, the repository under the obd home is hard linked
+            if not client.put_files_by_digest(install_files, install_path, hard_link=is_ln_install_mode, stdio=sub_io):
+                return False
+        else:
+            for file_item in install_file_items:
+                file_path = os.path.join(install_repository.repository_dir, file_item.target_path)
+                remote_file_path = os.path.join(install_path, file_item.target_path)
+                if file_item.type == InstallPlugin.FileItemType.DIR:
+                    if os.path.isdir(file_path) and not client.put_dir(file_path, remote_file_path, stdio=sub_io):
+                        return False
+                else:
+                    if not client.put_file(file_path, remote_file_path, stdio=sub_io):
+                        return False
         if is_ln_install_mode:
             # save data file for later comparing
-            client.put_file(install_repository.data_file_path, remote_repository_data_path, stdio=sub_io)
+            client.put_file(install_repository.data_file_path, os.path.join(install_path, '.data'), stdio=sub_io)
+        return True
+
+    def link_server(server, client, stdio):
+        if is_ln_install_mode:
             # link files to home_path
-            install_to_home_path()
+            install_to_home_path(client, home_path_map[server], remote_obd_home_map[server])
         stdio.verbose('%s %s installed' % (server, install_repository.name))
+        return True
+
+    def relay_names():
+        names = set()
+        for file_item in install_file_items:
+            file_path = os.path.join(install_repository.repository_dir, file_item.target_path)
+            if file_item.type != InstallPlugin.FileItemType.DIR or os.path.isdir(file_path):
+                names.add(file_item.target_path)
+        if is_ln_install_mode:
+            names.add('.data')
+        return sorted(names)
+
+    def distribute(install_servers):
+        # servers sharing one remote path, such as the repository under the remote obd home, need only one copy
+        copy_servers = OrderedDict()
+        for server in install_servers:
+            client = clients[server]
+            copy_servers.setdefault((client.config.host, client.config.username, install_path_map[server]), server)
+        copy_servers = list(copy_servers.values())
+        try:
+            fanout = int(COMMAND_ENV.get(ENV_DISTRIBUTE_FANOUT, 0))
+        except ValueError:
+            fanout = 0
+        if fanout <= 0 or len(copy_servers) <= 1:
+            return all(plugin_context.parallel_execute(put_server, copy_servers))
+
+        names = relay_names()
+        zones = {}
+        for server in copy_servers:
+            zones[server] = cluster_config.get_server_conf(server).get('zone')
+
+        def push(server):
+            task = plugin_context.parallel_execute(put_server, [server])[0]
+            return bool(task)
+
+        def relay(source, target):
+            return clients[source].relay_dir(clients[target], install_path_map[source], install_path_map[target], names)
+
+        distributor = FanoutDistributor(fanout, stdio=stdio)
+        return all(distributor.distribute(copy_servers, push, relay, zones).values())
+
+    stdio = plugin_context.stdio
+    clients = plugin_context.clients
+    servers = cluster_config.servers
+    is_lib_repo = install_repository.name.endswith("-libs")
+    is_utils_repo = install_repository.name.endswith("-utils")
+    home_path_map = {}
+    install_path_map = {}
+    remote_obd_home_map = {}
+    for server in servers:
+        server_config = cluster_config.get_server_conf(server)
+        home_path_map[server] = server_config.get("home_path")
+
+    is_ln_install_mode = cluster_config.is_ln_install_mode()
+    install_file_items = install_plugin.file_map(install_repository).values()
+
+    # remote install repository
+    stdio.start_loading('Remote %s repository install' % install_repository)
+    stdio.verbose('Remote %s repository integrity check' % install_repository)
+    tasks = plugin_context.parallel_execute(check_server, servers)
+    if [task for task in tasks if task.exception is not None or task.value is None]:
+        stdio.stop_loading('fail')
+        return False
+    install_servers = [task.server for task in tasks if task.value]
+    if install_servers:
+        install_files = digest_files()
+        if not distribute(install_servers) or not all(plugin_context.parallel_execute(link_server, install_servers)):
+            stdio.stop_loading('fail')
+            return False
     stdio.stop_loading('succeed')
 
     # check lib
     def check_lib():
-        lib_check = True
         stdio.start_loading('Remote %s repository lib check' % check_repository)
-        for server in servers:
+
+        def check_server_lib(server, client, stdio):
             stdio.verbose('%s %s repository lib check' % (server, check_repository))
-            client = clients[server]
             remote_home_path = home_path_map[server]
             need_libs = set()
             client.add_env('LD_LIBRARY_PATH', '%s/lib:' % remote_home_path, True)
@@ -155,11 +241,18 @@ def install_repo(plugin_context, obd_home, install_repository, install_plugin, c
                         stdio.error('Failed to execute repository lib check.')
                         return
                     need_libs.update(libs)
+            client.add_env('LD_LIBRARY_PATH', '', True)
             if need_libs:
                 for lib in need_libs:
                     getattr(stdio, msg_lv, '%s %s require: %s' % (server, check_repository, lib))
-                lib_check = False
-            client.add_env('LD_LIBRARY_PATH', '', True)
+                return False
+            return True
+
+        tasks = plugin_context.parallel_execute(check_server_lib, servers)
+        for task in tasks:
+            if task.exception is None and task.value is None:
+                return
+        lib_check = all(tasks)
 
         if msg_lv == 'error':
             stdio.stop_loading('succeed' if lib_check else 'fail')
@@ -28,40 +28,40 @@ from _deploy import RsyncConfig
 def rsync(plugin_context, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
     stdio = plugin_context.stdio
-    clients = plugin_context.clients
 
     rsync_configs = cluster_config.get_rsync_list()
     if not rsync_configs:
         return plugin_context.return_true()
 
     stdio.start_loading("Synchronizing runtime dependencies")
-    succeed = True
     for rsync_config in rsync_configs:
         source_path = rsync_config.get(RsyncConfig.SOURCE_PATH)
         target_path = rsync_config.get(RsyncConfig.TARGET_PATH)
         if os.path.isabs(target_path):
             rsync_config[RsyncConfig.TARGET_PATH] = os.path.normpath('./' + target_path)
 
-    sub_io = stdio.sub_io()
-    for server in cluster_config.servers:
+    def rsync_server(server, client, stdio):
         server_config = cluster_config.get_server_conf(server)
-        client = clients[server]
         home_path = server_config['home_path']
+        succeed = True
         for rsync_config in rsync_configs:
             source_path = rsync_config.get(RsyncConfig.SOURCE_PATH)
             target_path = rsync_config.get(RsyncConfig.TARGET_PATH)
             if os.path.isdir(source_path):
                 stdio.verbose('put local dir %s to %s: %s.' % (source_path, server, target_path))
-                if not client.put_dir(source_path, os.path.join(home_path, target_path), stdio=sub_io):
+                if not client.put_dir(source_path, os.path.join(home_path, target_path), stdio=stdio.sub_io()):
                     stdio.warn('failed to put local dir %s to %s: %s.' % (source_path, server, target_path))
                     succeed = False
             elif os.path.exists(source_path):
                 stdio.verbose('put local file %s to %s: %s.' % (source_path, server, target_path))
-                if not client.put_file(source_path, os.path.join(home_path, target_path), stdio=sub_io):
+                if not client.put_file(source_path, os.path.join(home_path, target_path), stdio=stdio.sub_io()):
                     stdio.warn('failed to put local file %s to %s: %s.' % (source_path, server, target_path))
                     succeed = False
             else:
                 stdio.verbose('%s is not found.' % source_path)
+        return succeed
+
+    succeed = all(plugin_context.parallel_execute(rsync_server))
     if succeed:
         stdio.stop_loading("succeed")
         return plugin_context.return_true()
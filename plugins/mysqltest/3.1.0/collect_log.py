@@ -27,10 +27,16 @@ def collect_log(plugin_context, env, test_name=None, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
     clients = plugin_context.clients
     stdio = plugin_context.stdio
+    # the failed cases of the parallel workers, whose logs are collected in one go
+    test_names = env.pop('collect_log_cases', None)
     if not env.get('collect_log', False):
         stdio.verbose('collect_log is False')
         return
 
+    if test_name is None and test_names:
+        for test_name in test_names:
+            collect_log(plugin_context, env, test_name, *args, **kwargs)
+        return
     if test_name is None:
         case_results = env.get('case_results', [])
         if case_results:
@@ -26,6 +26,8 @@ import time
 import shlex
 import requests
 import urllib
+import threading
+from collections import deque
 from subprocess import Popen, PIPE
 from copy import deepcopy
 from ssh import LocalClient
@@ -178,6 +180,315 @@ def slb_request(case_name, exec_id, slb_host, op='lock', stdio=None):
         return False
 
 
+def get_exec_sql_cmd(opt, cluster_config):
+    sys_pwd = cluster_config.get_global_conf().get('root_password', '')
+    return "%s -h%s -P%s -uroot %s -A -Doceanbase -e" % (opt.get('obclient_bin', 'obclient'), opt['host'], opt['port'], ("-p'%s'" % sys_pwd) if sys_pwd else '')
+
+
+def set_static_typing_engine(opt, cluster_config, cursor, stdio):
+    if opt.get('_enable_static_typing_engine') is None:
+        return
+    sql = "select value from oceanbase.__all_virtual_sys_parameter_stat where name like '_enable_static_typing_engine';"
+    ret = cursor.fetchone(sql)
+    if ret and str(ret.get('value')).lower() != str(opt['_enable_static_typing_engine']).lower():
+        LocalClient.execute_command('%s "alter system set _enable_static_typing_engine = %s;select sleep(2);"' % (get_exec_sql_cmd(opt, cluster_config), opt['_enable_static_typing_engine']), stdio=stdio)
+
+
+def run_case(test, env, cluster_config, cursor, stdio):
+    test_name = test
+    opt = {}
+    for key in env:
+        if key != 'cursor':
+            opt[key] = env[key]
+
+    opt['connector'] = 'ob'
+    opt['mysql_mode'] = True
+    test_file_suffix = opt['test_file_suffix']
+    result_file_suffix = opt['result_file_suffix']
+    record_file_suffix = opt['record_file_suffix']
+    mysqltest_bin = opt.get('mysqltest_bin', 'mysqltest')
+    obclient_bin = opt.get('obclient_bin', 'obclient')
+
+    soft = 3600
+    buffer = 0
+    if opt.get('source_limit'):
+        if test_name in opt['source_limit']:
+            soft = opt['source_limit'][test_name]
+        elif 'g.default' in opt['source_limit']:
+            soft = opt['source_limit']['g.default']
+
+        if 'g.buffer' in opt['source_limit']:
+            buffer = opt['source_limit']['g.buffer']
+    case_timeout = soft + buffer
+
+    if opt.get('case_timeout'):
+        case_timeout = opt['case_timeout']
+
+    # support explain select w/o px hit
+    # force-explain-xxxx 的结果文件目录为
+    # - explain_r/mysql
+    # - explain_r/oracle
+    # 其余的结果文件目录为
+    # - r/mysql
+    # - r/oracle
+    suffix = ''
+    opt_explain_dir = ''
+    if 'force-explain-as-px' in opt:
+        suffix = '.use_px'
+        opt_explain_dir = 'explain_r/'
+    elif 'force-explain-as-no-px' in opt:
+        suffix = '.no_use_px'
+        opt_explain_dir = 'explain_r/'
+
+    opt['case_mode'] = 'mysql'
+    if 'mode' not in opt:
+        opt['mode'] = 'both'
+    if opt['mode'] == 'mysql' or opt['mode'] == 'oracle':
+        opt['case_mode'] = opt['mode']
+    if opt['mode'] == 'both':
+        if test.endswith('_mysql'):
+            opt['case_mode'] = 'mysql'
+        if test.endswith('_oracle'):
+            opt['case_mode'] = 'oracle'
+
+    get_result_dir = lambda path: os.path.join(path, opt_explain_dir, opt['case_mode'])
+
+    if len(test.split('.')) == 2:
+        suite_name, test = test.split('.')
+        result_dir = get_result_dir(os.path.join(opt['result_dir'], suite_name, 'r'))
+        if os.path.exists(result_dir):
+            opt['result_dir'] = result_dir
+        else:
+            opt['result_dir'] = get_result_dir(os.path.join(opt['suite_dir'], suite_name, 'r'))
+        opt['record_dir'] = get_result_dir(os.path.join(opt['record_dir'], suite_name, 'r'))
+        opt['test_file'] = os.path.join(opt['suite_dir'], suite_name, 't', test + test_file_suffix)
+        if not os.path.isfile(opt['test_file']):
+            inner_test_file = os.path.join(inner_suite_dir, suite_name, 't', test + test_file_suffix)
+            if os.path.isfile(inner_test_file):
+                opt['test_file'] = inner_test_file
+                opt['result_dir'] = get_result_dir(os.path.join(inner_suite_dir, suite_name, 'r'))
+
+    else:
+        opt['test_file'] = os.path.join(opt['test_dir'], test + test_file_suffix)
+        opt['record_dir'] = get_result_dir(os.path.join(opt['record_dir']))
+        if not os.path.isfile(opt['test_file']):
+            inner_test_file = os.path.join(inner_test_dir, test + test_file_suffix)
+            if os.path.isfile(inner_test_file):
+                opt['test_file'] = inner_test_file
+                opt['result_dir'] = get_result_dir(inner_result_dir)
+        else:
+            opt['result_dir'] = get_result_dir(opt['result_dir'])
+    # owner
+    owner = "anonymous"
+    try:
+        cmd_t = "grep -E '#\s*owner\s*:' " + opt['test_file'] + " | awk -F':' '{print $2}' | head -n 1"
+        p = Popen(cmd_t, stdout=PIPE, stderr=PIPE, shell=True)
+        output, errput = p.communicate()
+        owner = output.decode("utf-8").strip()
+    except:
+        stdio.verbose("fail open %s" % (opt['test_file']))
+
+    opt['record_file'] = os.path.join(opt['record_dir'], test + suffix + record_file_suffix)
+    opt['result_file'] = os.path.join(opt['result_dir'], test + suffix + result_file_suffix)
+    if opt['filter'] == 'slave':
+        opt['slave_cmp'] = 1
+        result_file = os.path.join(opt['result_dir'], test + suffix + '.slave' + result_file_suffix)
+        if os.path.exists(result_file):
+            opt['slave_cmp'] = 0
+            opt['result_file'] = result_file
+
+    if not opt['is_business']:
+        ce_result_file = re.sub(r'\.result$', '.ce.result', opt['result_file'])
+        if os.path.exists(ce_result_file):
+            opt['result_file'] = ce_result_file
+
+    if 'my_host' in opt or 'oracle_host' in opt:
+        # compare mode
+        pass
+
+    exec_sql_cmd = get_exec_sql_cmd(opt, cluster_config)
+    server_engine_cmd = '''%s "select value from __all_virtual_sys_parameter_stat where name like '_enable_static_typing_engine';"''' % exec_sql_cmd
+    result = LocalClient.execute_command(server_engine_cmd, timeout=3600, stdio=stdio)
+    stdio.verbose('query engine result: {}'.format(result.stdout))
+    if not result:
+        stdio.error('engine failed, exit code %s. error msg: %s' % (result.code, result.stderr))
+    obmysql_ms0_dev = str(opt['host'])
+    if ':' in opt['host']:
+        # todo: obproxy没有网卡设备选项，可能会遇到问题。如果obproxy支持IPv6后续进行改造
+        devname = cluster_config.get_server_conf(opt['test_server']).get('devname')
+        if devname:
+            obmysql_ms0_dev = '{}%{}'.format(opt['host'], devname)
+    update_env = {
+        'OBMYSQL_PORT': str(opt['port']),
+        'OBMYSQL_MS0': str(opt['host']),
+        'OBMYSQL_MS0_DEV': obmysql_ms0_dev,
+        'OBMYSQL_PWD': str(opt['password']),
+        'OBMYSQL_USR': opt['user'],
+        'PATH': os.getenv('PATH'),
+        'OBSERVER_DIR': cluster_config.get_server_conf(opt['test_server'])['home_path'],
+        'IS_BUSINESS': str(opt['is_business'])
+    }
+    test_env = deepcopy(os.environ.copy())
+    test_env.update(update_env)
+    if opt.get('case_mode'):
+        test_env['TENANT'] = opt['case_mode']
+        if opt.get('user'):
+            test_env['OBMYSQL_USR'] = str(opt['user'] + '@' + opt['case_mode'])
+        else:
+            test_env['OBMYSQL_USR'] = 'root'
+    if 'java' in opt:
+        opt['connector'] = 'ob'
+
+    if cursor:
+        set_static_typing_engine(opt, cluster_config, cursor, stdio)
+
+    start_time = time.time()
+    cmd = 'timeout %s %s %s' % (case_timeout, mysqltest_bin, str(Arguments(opt)))
+    try:
+        stdio.verbose('local execute: %s ' % cmd)
+        p = Popen(shlex.split(cmd), env=test_env, stdout=PIPE, stderr=PIPE)
+        output, errput = p.communicate()
+        retcode = p.returncode
+        if retcode == 124:
+            output = ''
+            if 'source_limit' in opt and 'g.buffer' in opt['source_limit']:
+                errput = "%s secs out of soft limit (%s secs), sql may be hung, please check" % (opt['source_limit']['g.buffer'], case_timeout)
+            else:
+                errput = "%s seconds timeout, sql may be hung, please check" % case_timeout
+        elif isinstance(errput, bytes):
+            errput = errput.decode(errors='replace')
+    except Exception as e:
+        errput = str(e)
+        output = ''
+        retcode = 255
+    cost = time.time() - start_time
+
+    patterns = ['output', 'NAME', 'SORT', 'SCAN', 'LIMIT', 'EXCHANGE', 'GET', 'FUNCTION', 'MERGE', 'JOIN', 'MATERIAL',
+                'DISTINCT', 'SUBPLAN', 'UNION|ALL', 'EXPRESSION', 'SCALAR', 'HASH', 'VALUES', 'DELETE', 'result',
+                'reject', '=====', '-------', 'conds', 'output', 'access', 'GROUP', 'DELETE', 'UPDATE', 'INSERT',
+                'CONNECT', 'nil', 'values', 'COUNT', '^$']
+    count = 0
+    # 不处理liboblog的结果对比
+    if re.search("liboblog_r", errput):
+        stdio.verbose("do nothing for liboblog")
+    elif (opt['filter'] == 'slave' and opt['slave_cmp'] == 1) or opt['filter'] == 'j' or opt['filter'] == 'jp':
+        diff = errput.split('\n')
+        for line in diff:
+            match = 0
+            if re.search(r"^\+", line) or re.search(r"^\-", line):
+                for pattern in patterns:
+                    if re.search(pattern, line):
+                        match = match + 1
+                        continue
+                if match == 0:
+                    count = count + 1
+                    break
+        if count == 0:
+            # 处理slave/java 模式下result文件不存在的情况
+            if re.search(r"\+", errput):
+                stdio.verbose('ignore explain plan diff')
+                retcode = 0
+
+    return {"name": test_name, "ret": retcode, "output": output, "cmd": cmd, "errput": errput, 'cost': cost, 'owner': owner}
+
+
+def get_login_user(env):
+    # the same user as the one Arguments passes to mysqltest
+    user, password = 'root', env.get('password')
+    if env.get('user'):
+        user = env['user']
+        if 'connector' not in env or env['connector'] == 'ob':
+            user = user + '@' + env['case_mode']
+    if env.get('tenant'):
+        user, password = 'root@' + env['tenant'], ''
+    return user, password
+
+
+def execute_sql(env, sql, stdio):
+    user, password = get_login_user(env)
+    password = ("-p'%s'" % password) if password else ''
+    cmd = '%s -h%s -P%s -u%s %s -A -e "%s"' % (env.get('obclient_bin', 'obclient'), env['host'], env['port'], user, password, sql)
+    return LocalClient.execute_command(cmd, stdio=stdio)
+
+
+def reset_database(env, stdio):
+    # a parallel worker runs in its own database of the test tenant, which is recreated instead of rebooting the cluster
+    ret = execute_sql(env, 'drop database if exists `{0}`; create database `{0}`'.format(env['database']), stdio)
+    if not ret:
+        stdio.warn('failed to reset database %s: %s' % (env['database'], ret.stderr))
+    return bool(ret)
+
+
+def drop_database(env, stdio):
+    ret = execute_sql(env, 'drop database if exists `{0}`'.format(env['database']), stdio)
+    if not ret:
+        stdio.warn('failed to drop database %s: %s' % (env['database'], ret.stderr))
+    return bool(ret)
+
+
+def run_parallel(env, test_set, cluster_config, stdio):
+    """
+    Run the cases on env['parallel'] workers. The workers take the cases by the cost of their last run,
+    the longest first, so that the long cases do not start at the end.
+    """
+    case_costs = env.get('case_costs') or {}
+    known_costs = sorted(case_costs.values())
+    default_cost = known_costs[len(known_costs) // 2] if known_costs else 0
+    tests = deque(sorted(test_set, key=lambda test: case_costs.get(test, default_cost), reverse=True))
+    total_test_count = len(tests)
+    auto_retry = env.get('auto_retry')
+    lock = threading.Lock()
+    results = []
+    worker_envs = []
+
+    def work(worker_env, worker_id):
+        need_reset = True
+        while True:
+            with lock:
+                if not tests:
+                    return
+                test = tests.popleft()
+            for retry in range(2 if auto_retry else 1):
+                if need_reset and not reset_database(worker_env, stdio):
+                    # the case would run on whatever the last one left in the database
+                    result = {'name': test, 'ret': 1, 'output': '', 'cmd': '', 'errput': 'failed to reset database %s' % worker_env['database'], 'cost': 0, 'owner': ''}
+                    continue
+                result = run_case(test, worker_env, cluster_config, None, stdio)
+                # a failed case may leave anything in the database
+                need_reset = result['ret'] != 0
+                if not need_reset:
+                    break
+            with lock:
+                results.append(result)
+                if result['ret']:
+                    stdio.print(result['errput'])
+                    case_status = FormtatText.error("[  FAILED  ]")
+                else:
+                    case_status = FormtatText.success('[       OK ]')
+                stdio.print("%s%s %s ( %f s ) ( %s / %s ) [worker %d]" % (case_status, result['name'], result['owner'], result['cost'], len(results), total_test_count, worker_id))
+
+    threads = []
+    for worker_id in range(min(env['parallel'], total_test_count)):
+        worker_env = {}
+        for key in env:
+            if key != 'cursor':
+                worker_env[key] = env[key]
+        worker_env['database'] = '%s_%d' % (env.get('database') or 'test', worker_id)
+        for key in ['tmp_dir', 'var_dir', 'log_dir']:
+            if worker_env.get(key):
+                worker_env[key] = os.path.join(worker_env[key], 'worker%d' % worker_id)
+        worker_envs.append(worker_env)
+        thread = threading.Thread(target=work, args=(worker_env, worker_id))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    for worker_env in worker_envs:
+        drop_database(worker_env, stdio)
+    return results
+
+
 def run_test(plugin_context, env, *args, **kwargs):
 
     def return_true(**kw):
@@ -205,6 +516,25 @@ def run_test(plugin_context, env, *args, **kwargs):
     need_reboot = env.get('need_reboot', False)
     collect_all = env.get('collect_all', False)
     collect_log = False
+    if (env.get('parallel') or 1) > 1 and not env.get('parallel_finished') and not (slb_host and exec_id):
+        # the cases which need a reboot, and the oracle cases which have no database of their own, still run one by one after the others
+        oracle_mode = env.get('mode') == 'oracle'
+        parallel_cases = [test for test in test_set if test not in reboot_cases and test not in run_test_cases and not (oracle_mode or test.endswith('_oracle'))]
+        stdio.print('Run %d cases on %d workers' % (len(parallel_cases), env['parallel']))
+        if cursor:
+            set_static_typing_engine(env, cluster_config, cursor, stdio)
+        run_test_cases += parallel_cases
+        parallel_results = run_parallel(env, parallel_cases, cluster_config, stdio)
+        case_results += parallel_results
+        test_set = env['test_set'] = [test for test in test_set if test not in parallel_cases]
+        index = 0
+        env['parallel_finished'] = True
+        # the logs of the failed cases are collected once the workers are done, before the rest of the cases run
+        failed_cases = [result['name'] for result in parallel_results if result['ret']]
+        if failed_cases and collect_all:
+            collect_log = True
+            env['collect_log_cases'] = failed_cases
+            return return_true()
     total_test_count = len(test_set)
     while index < total_test_count:
         test = test_set[index]
@@ -222,207 +552,10 @@ def run_test(plugin_context, env, *args, **kwargs):
         retry_msg = "in auto retry mode" if is_retry else ""
         label = FormtatText.info("[ RUN      ]")
         stdio.start_loading('%sRunning case: %s ( %s / %s ) %s' % (label, test, index+1, total_test_count, retry_msg))
-        test_name = test
-        opt = {}
-        for key in env:
-            if key != 'cursor':
-                opt[key] = env[key]
-
-        opt['connector'] = 'ob'
-        opt['mysql_mode'] = True
-        test_file_suffix = opt['test_file_suffix']
-        result_file_suffix = opt['result_file_suffix']
-        record_file_suffix = opt['record_file_suffix']
-        mysqltest_bin = opt.get('mysqltest_bin', 'mysqltest')
-        obclient_bin = opt.get('obclient_bin', 'obclient')
-
-        soft = 3600
-        buffer = 0
-        if opt.get('source_limit'):
-            if test_name in opt['source_limit']:
-                soft = opt['source_limit'][test_name]
-            elif 'g.default' in opt['source_limit']:
-                soft = opt['source_limit']['g.default']
-
-            if 'g.buffer' in opt['source_limit']:
-                buffer = opt['source_limit']['g.buffer']
-        case_timeout = soft + buffer
-
-        if opt.get('case_timeout'):
-            case_timeout = opt['case_timeout']
-
-        # support explain select w/o px hit
-        # force-explain-xxxx 的结果文件目录为
-        # - explain_r/mysql
-        # - explain_r/oracle
-        # 其余的结果文件目录为
-        # - r/mysql
-        # - r/oracle
-        suffix = ''
-        opt_explain_dir = ''
-        if 'force-explain-as-px' in opt:
-            suffix = '.use_px'
-            opt_explain_dir = 'explain_r/'
-        elif 'force-explain-as-no-px' in opt:
-            suffix = '.no_use_px'
-            opt_explain_dir = 'explain_r/'
-
-        opt['case_mode'] = 'mysql'
-        if 'mode' not in opt:
-            opt['mode'] = 'both'
-        if opt['mode'] == 'mysql' or opt['mode'] == 'oracle':
-            opt['case_mode'] = opt['mode']
-        if opt['mode'] == 'both':
-            if test.endswith('_mysql'):
-                opt['case_mode'] = 'mysql'
-            if test.endswith('_oracle'):
-                opt['case_mode'] = 'oracle'
-
-        get_result_dir = lambda path: os.path.join(path, opt_explain_dir, opt['case_mode'])
-
-        if len(test.split('.')) == 2:
-            suite_name, test = test.split('.')
-            result_dir = get_result_dir(os.path.join(opt['result_dir'], suite_name, 'r'))
-            if os.path.exists(result_dir):
-                opt['result_dir'] = result_dir
-            else:
-                opt['result_dir'] = get_result_dir(os.path.join(opt['suite_dir'], suite_name, 'r'))
-            opt['record_dir'] = get_result_dir(os.path.join(opt['record_dir'], suite_name, 'r'))
-            opt['test_file'] = os.path.join(opt['suite_dir'], suite_name, 't', test + test_file_suffix)
-            if not os.path.isfile(opt['test_file']):
-                inner_test_file = os.path.join(inner_suite_dir, suite_name, 't', test + test_file_suffix)
-                if os.path.isfile(inner_test_file):
-                    opt['test_file'] = inner_test_file
-                    opt['result_dir'] = get_result_dir(os.path.join(inner_suite_dir, suite_name, 'r'))
-
-        else:
-            opt['test_file'] = os.path.join(opt['test_dir'], test + test_file_suffix)
-            opt['record_dir'] = get_result_dir(os.path.join(opt['record_dir']))
-            if not os.path.isfile(opt['test_file']):
-                inner_test_file = os.path.join(inner_test_dir, test + test_file_suffix)
-                if os.path.isfile(inner_test_file):
-                    opt['test_file'] = inner_test_file
-                    opt['result_dir'] = get_result_dir(inner_result_dir)
-            else:
-                opt['result_dir'] = get_result_dir(opt['result_dir'])
-        # owner
-        owner = "anonymous"
-        try:
-            cmd_t = "grep -E '#\s*owner\s*:' " + opt['test_file'] + " | awk -F':' '{print $2}' | head -n 1"
-            p = Popen(cmd_t, stdout=PIPE, stderr=PIPE, shell=True)
-            output, errput = p.communicate()
-            owner = output.decode("utf-8").strip()
-        except:
-            stdio.verbose("fail open %s" % (opt['test_file']))
-
-        opt['record_file'] = os.path.join(opt['record_dir'], test + suffix + record_file_suffix)
-        opt['result_file'] = os.path.join(opt['result_dir'], test + suffix + result_file_suffix)
-        if opt['filter'] == 'slave':
-            opt['slave_cmp'] = 1
-            result_file = os.path.join(opt['result_dir'], test + suffix + '.slave' + result_file_suffix)
-            if os.path.exists(result_file):
-                opt['slave_cmp'] = 0
-                opt['result_file'] = result_file
-
-        if not opt['is_business']:
-            ce_result_file = re.sub(r'\.result$', '.ce.result', opt['result_file'])
-            if os.path.exists(ce_result_file):
-                opt['result_file'] = ce_result_file
-
-        if 'my_host' in opt or 'oracle_host' in opt:
-            # compare mode
-            pass
-
-        sys_pwd = cluster_config.get_global_conf().get('root_password', '')
-        exec_sql_cmd = "%s -h%s -P%s -uroot %s -A -Doceanbase -e" % (obclient_bin, opt['host'], opt['port'], ("-p'%s'" % sys_pwd) if sys_pwd else '')
-        server_engine_cmd = '''%s "select value from __all_virtual_sys_parameter_stat where name like '_enable_static_typing_engine';"''' % exec_sql_cmd
-        result = LocalClient.execute_command(server_engine_cmd, timeout=3600, stdio=stdio)
-        stdio.verbose('query engine result: {}'.format(result.stdout))
-        if not result:
-            stdio.error('engine failed, exit code %s. error msg: %s' % (result.code, result.stderr))
-        obmysql_ms0_dev = str(opt['host'])
-        if ':' in opt['host']:
-            # todo: obproxy没有网卡设备选项，可能会遇到问题。如果obproxy支持IPv6后续进行改造
-            devname = cluster_config.get_server_conf(opt['test_server']).get('devname')
-            if devname:
-                obmysql_ms0_dev = '{}%{}'.format(opt['host'], devname)
-        update_env = {
-            'OBMYSQL_PORT': str(opt['port']),
-            'OBMYSQL_MS0': str(opt['host']),
-            'OBMYSQL_MS0_DEV': obmysql_ms0_dev,
-            'OBMYSQL_PWD': str(opt['password']),
-            'OBMYSQL_USR': opt['user'],
-            'PATH': os.getenv('PATH'),
-            'OBSERVER_DIR': cluster_config.get_server_conf(opt['test_server'])['home_path'],
-            'IS_BUSINESS': str(opt['is_business'])
-        }
-        test_env = deepcopy(os.environ.copy())
-        test_env.update(update_env)
-        if opt.get('case_mode'):
-            test_env['TENANT'] = opt['case_mode']
-            if opt.get('user'):
-                test_env['OBMYSQL_USR'] = str(opt['user'] + '@' + opt['case_mode'])
-            else:
-                test_env['OBMYSQL_USR'] = 'root'
-        if 'java' in opt:
-            opt['connector'] = 'ob'
-
-        if opt['_enable_static_typing_engine'] is not None:
-            sql = "select value from oceanbase.__all_virtual_sys_parameter_stat where name like '_enable_static_typing_engine';"
-            ret = cursor.fetchone(sql)
-            if ret and str(ret.get('value')).lower() != str(opt['_enable_static_typing_engine']).lower():
-                LocalClient.execute_command('%s "alter system set _enable_static_typing_engine = %s;select sleep(2);"' % (exec_sql_cmd, opt['_enable_static_typing_engine']), stdio=stdio)
-
-        start_time = time.time()
-        cmd = 'timeout %s %s %s' % (case_timeout, mysqltest_bin, str(Arguments(opt)))
-        try:
-            stdio.verbose('local execute: %s ' % cmd)
-            p = Popen(shlex.split(cmd), env=test_env, stdout=PIPE, stderr=PIPE)
-            output, errput = p.communicate()
-            retcode = p.returncode
-            if retcode == 124:
-                output = ''
-                if 'source_limit' in opt and 'g.buffer' in opt['source_limit']:
-                    errput = "%s secs out of soft limit (%s secs), sql may be hung, please check" % (opt['source_limit']['g.buffer'], case_timeout)
-                else:
-                    errput = "%s seconds timeout, sql may be hung, please check" % case_timeout
-            elif isinstance(errput, bytes):
-                errput = errput.decode(errors='replace')
-        except Exception as e:
-            errput = str(e)
-            output = ''
-            retcode = 255
-        cost = time.time() - start_time
-
-        case_info = "%s %s ( %f s )" % (test_name, owner, cost)
-
-        patterns = ['output', 'NAME', 'SORT', 'SCAN', 'LIMIT', 'EXCHANGE', 'GET', 'FUNCTION', 'MERGE', 'JOIN', 'MATERIAL',
-                    'DISTINCT', 'SUBPLAN', 'UNION|ALL', 'EXPRESSION', 'SCALAR', 'HASH', 'VALUES', 'DELETE', 'result',
-                    'reject', '=====', '-------', 'conds', 'output', 'access', 'GROUP', 'DELETE', 'UPDATE', 'INSERT',
-                    'CONNECT', 'nil', 'values', 'COUNT', '^$']
-        count = 0
-        # 不处理liboblog的结果对比
-        if re.search("liboblog_r", errput):
-            stdio.verbose("do nothing for liboblog")
-        elif (opt['filter'] == 'slave' and opt['slave_cmp'] == 1) or opt['filter'] == 'j' or opt['filter'] == 'jp':
-            diff = errput.split('\n')
-            for line in diff:
-                match = 0
-                if re.search(r"^\+", line) or re.search(r"^\-", line):
-                    for pattern in patterns:
-                        if re.search(pattern, line):
-                            match = match + 1
-                            continue
-                    if match == 0:
-                        count = count + 1
-                        break
-            if count == 0:
-                # 处理slave/java 模式下result文件不存在的情况
-                if re.search(r"\+", errput):
-                    stdio.verbose('ignore explain plan diff')
-                    retcode = 0
-
-        result = {"name": test_name, "ret": retcode, "output": output, "cmd": cmd, "errput": errput, 'cost': cost}
+        result = run_case(test, env, cluster_config, cursor, stdio)
+        retcode = result['ret']
+        errput = result['errput']
+        case_info = "%s %s ( %f s )" % (result['name'], result['owner'], result['cost'])
         stdio.stop_loading('fail' if retcode else 'succeed')
         stdio.verbose('exited code %s' % retcode)
         if retcode:
@@ -433,7 +566,7 @@ def run_test(plugin_context, env, *args, **kwargs):
             case_status = FormtatText.success('[       OK ]')
         stdio.print("%s%s" % (case_status, case_info))
         if retcode == 0 and slb_host and exec_id:
-            slb_request(test_name, exec_id=exec_id, slb_host=slb_host, op='success', stdio=stdio)
+            slb_request(result['name'], exec_id=exec_id, slb_host=slb_host, op='success', stdio=stdio)
         if retcode == 0:
             # success
             case_results.append(result)
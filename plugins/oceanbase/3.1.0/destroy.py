@@ -20,34 +20,58 @@
 
 from __future__ import absolute_import, division, print_function
 
+import os
+from threading import Lock
+
 from _errno import EC_CLEAN_PATH_FAILED
 
-global_ret = True
+
+def get_clean_paths(server_config):
+    # a directory inside another one is removed together with it
+    paths = []
+    for key in ['home_path', 'data_dir', 'redo_dir', 'clog_dir', 'ilog_dir', 'slog_dir']:
+        if server_config.get(key):
+            paths.append(os.path.normpath(server_config[key]))
+    clean_paths = []
+    for path in sorted(set(paths), key=len):
+        if not [parent for parent in clean_paths if path.startswith(parent.rstrip('/') + '/')]:
+            clean_paths.append(path)
+    return clean_paths
+
+
+def get_clean_script(paths):
+    # the directories are removed at the same time, every one prints its index and the exit code of rm
+    lines = ['(rm -fr %s/ >/dev/null 2>&1; echo "%s:$?") &' % (path, idx) for idx, path in enumerate(paths)]
+    lines.append('wait')
+    return '\n'.join(lines)
 
 
 def destroy(plugin_context, *args, **kwargs):
-    def clean(server, path):
-        client = clients[server]
-        ret = client.execute_command('rm -fr %s/' % (path), timeout=-1)
-        if not ret:
-            # print stderror
-            global global_ret
-            global_ret = False
-            stdio.warn(EC_CLEAN_PATH_FAILED.format(server=server, path=path))
-        else:
-            stdio.verbose('%s:%s cleaned' % (server, path))
     cluster_config = plugin_context.cluster_config
-    clients = plugin_context.clients
     stdio = plugin_context.stdio
-    stdio.start_loading('observer work dir cleaning')
-    for server in cluster_config.servers:
-        server_config = cluster_config.get_server_conf(server)
-        stdio.verbose('%s work path cleaning', server)
-        clean(server, server_config['home_path'])
-        for key in ['data_dir', 'redo_dir', 'clog_dir', 'ilog_dir', 'slog_dir']:
-            if server_config.get(key):
-                clean(server, server_config[key])
-    if global_ret:
+    text = 'observer work dir cleaning'
+    progress = {'done': 0}
+    lock = Lock()
+
+    def clean_server(server, client, sub_stdio):
+        sub_stdio.verbose('%s work path cleaning', server)
+        paths = get_clean_paths(cluster_config.get_server_conf(server))
+        ret = client.execute_command(get_clean_script(paths), timeout=-1)
+        codes = dict([line.split(':', 1) for line in ret.stdout.strip().split('\n') if ':' in line])
+        failed = []
+        for idx, path in enumerate(paths):
+            if codes.get(str(idx)) == '0':
+                sub_stdio.verbose('%s:%s cleaned' % (server, path))
+            else:
+                failed.append(path)
+                sub_stdio.warn(EC_CLEAN_PATH_FAILED.format(server=server, path=path))
+        with lock:
+            progress['done'] += 1
+            stdio.update_loading_text('%s (%s/%s)' % (text, progress['done'], len(cluster_config.servers)))
+        return not failed
+
+    stdio.start_loading(text)
+    if all(plugin_context.parallel_execute(clean_server)):
         stdio.stop_loading('succeed')
         plugin_context.return_true()
     else:
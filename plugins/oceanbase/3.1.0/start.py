@@ -132,22 +132,20 @@ def start(plugin_context, *args, **kwargs):
             root_servers[zone] = '%s:%s:%s' % (server.ip, config['rpc_port'], config['mysql_port'])
     rs_list_opt  = '-r \'%s\'' % ';'.join([root_servers[zone] for zone in root_servers])
 
-    for server in cluster_config.servers:
-        client = clients[server]
+    def construct_cmd(server, client, stdio):
         server_config = cluster_config.get_server_conf(server)
         home_path = server_config['home_path']
 
         if not server_config.get('data_dir'):
             server_config['data_dir'] = '%s/store' % home_path
 
-        if client.execute_command('ls %s/ilog/' % server_config['data_dir']).stdout.strip():
-            need_bootstrap = False
+        bootstrapped = bool(client.execute_command('ls %s/ilog/' % server_config['data_dir']).stdout.strip())
 
         remote_pid_path = '%s/run/observer.pid' % home_path
         remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
         if remote_pid:
             if client.execute_command('ls /proc/%s' % remote_pid):
-                continue
+                return bootstrapped, None
 
         stdio.verbose('%s start command construction' % server)
         if getattr(options, 'without_parameter', False) and client.execute_command('ls %s/etc/observer.config.bin' % home_path):
@@ -194,11 +192,20 @@ def start(plugin_context, *args, **kwargs):
         else:
             cmd.append('-p %s' % server_config['mysql_port'])
 
-        clusters_cmd[server] = 'cd %s; %s/bin/observer %s' % (home_path, home_path, ' '.join(cmd))
+        return bootstrapped, 'cd %s; %s/bin/observer %s' % (home_path, home_path, ' '.join(cmd))
+
+    for task in plugin_context.parallel_execute(construct_cmd):
+        if not task.value:
+            stdio.stop_loading('fail')
+            return
+        bootstrapped, server_cmd = task.value
+        if bootstrapped:
+            need_bootstrap = False
+        if server_cmd:
+            clusters_cmd[task.server] = server_cmd
 
-    for server in clusters_cmd:
+    def start_server(server, client, stdio):
         environments = deepcopy(cluster_config.get_environments())
-        client = clients[server]
         server_config = cluster_config.get_server_conf(server)
         stdio.verbose('starting %s observer', server)
         if 'LD_LIBRARY_PATH' not in environments:
@@ -206,16 +213,19 @@ def start(plugin_context, *args, **kwargs):
         with EnvVariables(environments, client):
             ret = client.execute_command(clusters_cmd[server])
         if not ret:
-            stdio.stop_loading('fail')
             stdio.error(EC_OBSERVER_FAIL_TO_START_WITH_ERR.format(server=server, stderr=ret.stderr))
-            return
+            return False
+        return True
+
+    if not all(plugin_context.parallel_execute(start_server, list(clusters_cmd.keys()))):
+        stdio.stop_loading('fail')
+        return
     stdio.stop_loading('succeed')
 
     stdio.start_loading('observer program health check')
     time.sleep(3)
-    failed = []
-    for server in cluster_config.servers:
-        client = clients[server]
+
+    def health_check(server, client, stdio):
         server_config = cluster_config.get_server_conf(server)
         home_path = server_config['home_path']
         remote_pid_path = '%s/run/observer.pid' % home_path
@@ -223,8 +233,13 @@ def start(plugin_context, *args, **kwargs):
         remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
         if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
             stdio.verbose('%s observer[pid: %s] started', server, remote_pid)
-        else:
-            failed.append(EC_OBSERVER_FAIL_TO_START.format(server=server))
+            return True
+        return False
+
+    failed = []
+    for task in plugin_context.parallel_execute(health_check):
+        if not task:
+            failed.append(EC_OBSERVER_FAIL_TO_START.format(server=task.server))
     if failed:
         stdio.stop_loading('fail')
         for msg in failed:
@@ -31,6 +31,15 @@ stdio = None
 success = True
 production_mode = False
 
+HOST_FACT_COMMANDS = [
+    'cat /proc/sys/fs/aio-max-nr /proc/sys/fs/aio-nr',
+    'ulimit -a',
+    'sysctl -a',
+    'cat /proc/meminfo',
+    'cat /proc/net/dev'
+]
+
+
 def get_port_socket_inode(client, port):
     port = hex(port)[2:].zfill(4).upper()
     cmd = "bash -c 'cat /proc/net/{tcp*,udp*}' | awk -F' ' '{print $2,$10}' | grep '00000000:%s' | awk -F' ' '{print $2}' | uniq" % port
@@ -387,6 +396,8 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
                     interfaces[devname] = []
                 interfaces[devname].append(ip)
 
+    # collect the host facts of all ips concurrently, the checks below read them from the cache
+    servers_clients = plugin_context.parallel_prefetch(HOST_FACT_COMMANDS, clients=servers_clients)
     for ip in servers_disk:
         client = servers_clients[ip]
         ip_servers = servers_memory[ip]['servers'].keys()
@@ -23,18 +23,19 @@ from __future__ import absolute_import, division, print_function
 
 def status(plugin_context, *args, **kwargs):
     cluster_config = plugin_context.cluster_config
-    clients = plugin_context.clients
-    stdio = plugin_context.stdio
-    cluster_status = {}
-    for server in cluster_config.servers:
+
+    def server_status(server, client, stdio):
         server_config = cluster_config.get_server_conf(server)
-        client = clients[server]
-        cluster_status[server] = 0
         if 'home_path' not in server_config:
             stdio.print('%s home_path is empty', server)
-            continue
+            return 0
         remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
         remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
         if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
-            cluster_status[server] = 1
+            return 1
+        return 0
+
+    cluster_status = {}
+    for task in plugin_context.parallel_execute(server_status):
+        cluster_status[task.server] = task.value if task.value else 0
     return plugin_context.return_true(cluster_status=cluster_status)
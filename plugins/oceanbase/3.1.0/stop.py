@@ -21,7 +21,6 @@
 from __future__ import absolute_import, division, print_function
 
 import json
-import time
 import requests
 
 from tool import NetUtil
@@ -39,26 +38,39 @@ def config_url(ocp_config_server, appname, cid):
     return cfg_url, cleanup_config_url_content, register_to_config_url
 
 
-def get_port_socket_inode(client, port):
-    port = hex(port)[2:].zfill(4).upper()
-    cmd = "bash -c 'cat /proc/net/{tcp*,udp*}' | awk -F' ' '{print $2,$10}' | grep '00000000:%s' | awk -F' ' '{print $2}' | uniq" % port
-    res = client.execute_command(cmd)
-    if not res or not res.stdout.strip():
-        return []
-    return res.stdout.strip().split('\n')
+STOP_TIMEOUT = 90
+STOP_FORCE_TIMEOUT = 75
 
 
-def port_release_check(client, pid, port, count):
-    socket_inodes = get_port_socket_inode(client, port)
-    if not socket_inodes:
-        return True
-    if count < 5:
-        ret = client.execute_command("ls -l /proc/%s/fd/ |grep -E 'socket:\[(%s)\]'" % (pid, '|'.join(socket_inodes)))
-        if ret:
-            return not ret.stdout.strip()
-        else:
-            return not client.execute_command("ls -l /proc/%s" % pid)
-    return False
+def get_stop_script(pid_path, home_path, mysql_port, rpc_port):
+    """
+    The whole stop of an observer as one script: kill it, wait until its ports are released and remove the pid file.
+    A port counts as released once no socket listens on it or the observer is gone. When the wait reaches the force
+    time, the observer is killed by its command line and the ports must not be listened on by anyone any more.
+    """
+    ports = ' '.join([hex(port)[2:].zfill(4).upper() for port in [mysql_port, rpc_port] if port])
+    return '''pid=`cat {pid_path} 2>/dev/null`
+if [ -z "$pid" ] || ! ps uax | egrep " $pid " | grep -v grep >/dev/null; then echo not_running; exit 0; fi
+echo "stopping $pid"
+kill -9 $pid
+start=`date +%s`
+sleep 1
+while true; do
+    now=`date +%s`
+    busy=''
+    for port in {ports}; do
+        if cat /proc/net/tcp* /proc/net/udp* 2>/dev/null | awk '{{print $2}}' | grep -q "00000000:$port"; then
+            if [ $((now - start)) -ge {force} ] || [ -d /proc/$pid ]; then busy="$busy $port"; fi
+        fi
+    done
+    if [ -z "$busy" ]; then rm -f {pid_path}; echo stopped; exit 0; fi
+    if [ $((now - start)) -ge {timeout} ]; then echo "port not released:$busy"; exit 1; fi
+    if [ $((now - start)) -ge {force} ] && [ -z "$forced" ]; then
+        forced=1
+        if [ -d /proc/$pid ]; then pkill -9 -u `whoami` -f '{home_path}/bin/observer -p {mysql_port}'; fi
+    fi
+    sleep 0.5
+done'''.format(pid_path=pid_path, home_path=home_path, ports=ports, mysql_port=mysql_port, force=STOP_FORCE_TIMEOUT, timeout=STOP_TIMEOUT)
 
 
 def stop(plugin_context, *args, **kwargs):
@@ -79,59 +91,25 @@ def stop(plugin_context, *args, **kwargs):
                 stdio.warn('%s status code %s' % (cleanup_config_url_content, response.status_code))
         except:
             stdio.warn('failed to clean up the configuration url content')
-    servers = {}
-    for server in cluster_config.servers:
+
+    def stop_server(server, client, stdio):
         server_config = cluster_config.get_server_conf(server)
-        client = clients[server]
         if 'home_path' not in server_config:
             stdio.verbose('%s home_path is empty', server)
-            continue
+            return True
         remote_pid_path = '%s/run/observer.pid' % server_config['home_path']
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ps uax | egrep " %s " | grep -v grep' % remote_pid):
-            stdio.verbose('%s observer[pid:%s] stopping ...' % (server, remote_pid))
-            client.execute_command('kill -9 %s' % (remote_pid))
-            servers[server] = {
-                'client': client,
-                'mysql_port': server_config['mysql_port'],
-                'rpc_port': server_config['rpc_port'],
-                'pid': remote_pid,
-                'path': remote_pid_path
-            }
-        else:
+        stop_script = get_stop_script(remote_pid_path, server_config['home_path'], server_config['mysql_port'], server_config['rpc_port'])
+        ret = client.execute_command(stop_script, timeout=-1)
+        if ret.stdout.strip() == 'not_running':
             stdio.verbose('%s observer is not running ...' % server)
-    count = 30
-    time.sleep(1)
-    while count and servers:
-        tmp_servers = {}
-        for server in servers:
-            data = servers[server]
-            client = clients[server]
-            stdio.verbose('%s check whether the port is released' % server)
-            for key in ['rpc_port', 'mysql_port']:
-                if data[key] and not port_release_check(data['client'], data['pid'], data[key], count):
-                    tmp_servers[server] = data
-                    break
-                data[key] = ''
-            else:
-                client.execute_command('rm -f %s' % (data['path']))
-                stdio.verbose('%s observer is stopped', server)
-        servers = tmp_servers
-        count -= 1
-        if count and servers:
-            if count == 5:
-                for server in servers:
-                    data = servers[server]
-                    server_config = cluster_config.get_server_conf(server)
-                    client = clients[server]
-                    client.execute_command(
-                        "if [[ -d /proc/%s ]]; then pkill -9 -u `whoami` -f '%s/bin/observer -p %s';fi" %
-                        (data['pid'], server_config['home_path'], server_config['mysql_port']))
-            time.sleep(3)
+            return True
+        stdio.verbose('%s observer %s' % (server, ret.stdout.strip().replace('\n', ', ')))
+        return bool(ret)
 
-    if servers:
+    failed_servers = [task.server for task in plugin_context.parallel_execute(stop_server) if not task]
+    if failed_servers:
         stdio.stop_loading('fail')
-        for server in servers:
+        for server in failed_servers:
             stdio.warn('%s port not released', server)
     else:
         stdio.stop_loading('succeed')
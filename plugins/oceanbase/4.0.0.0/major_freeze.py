@@ -20,7 +20,7 @@
 
 from __future__ import absolute_import, division, print_function
 
-import time
+from tool import CompactionWaiter
 
 
 def major_freeze(plugin_context, cursor, *args, **kwargs):
@@ -33,27 +33,8 @@ def major_freeze(plugin_context, cursor, *args, **kwargs):
     tenant_id = tenant_id["TENANT_ID"]
     # Major freeze
     stdio.start_loading('Merge')
-    sql_frozen_scn = "select FROZEN_SCN, LAST_SCN from oceanbase.CDB_OB_MAJOR_COMPACTION where tenant_id = '%s'" % tenant_id
-    merge_version = cursor.fetchone(sql_frozen_scn)
-    if merge_version is False:
+    if not CompactionWaiter(cursor, tenant_id=tenant_id, stdio=stdio).major_freeze(tenant_name):
+        stdio.stop_loading('fail')
         return
-    merge_version = merge_version['FROZEN_SCN']
-    if cursor.execute("alter system major freeze tenant = %s" % tenant_name) is False:
-        return
-    while True:
-        current_version = cursor.fetchone(sql_frozen_scn)
-        if current_version is False:
-            return
-        current_version = current_version.get("FROZEN_SCN")
-        if int(current_version) > int(merge_version):
-            break
-        time.sleep(5)
-    while True:
-        ret = cursor.fetchone(sql_frozen_scn)
-        if ret is False:
-            return
-        if int(ret.get("FROZEN_SCN", 0)) / 1000 == int(ret.get("LAST_SCN", 0)) / 1000:
-            break
-        time.sleep(5)
     stdio.stop_loading('succeed')
     return plugin_context.return_true()
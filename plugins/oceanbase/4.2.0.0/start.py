@@ -125,6 +125,7 @@ def start(plugin_context, *args, **kwargs):
         cfg_url = "http://{0}:{1}/services?Action=ObRootServiceInfo&ObCluster={2}".format(obc_ip, obc_port, appname)
 
     stdio.start_loading('Start observer')
+    start_time = time.time()
     for server in cluster_config.original_servers:
         config = cluster_config.get_server_conf(server)
         zone = config['zone']
@@ -132,28 +133,36 @@ def start(plugin_context, *args, **kwargs):
             root_servers[zone] = '%s:%s:%s' % (server.ip, config['rpc_port'], config['mysql_port'])
     rs_list_opt  = '-r \'%s\'' % ';'.join([root_servers[zone] for zone in root_servers])
 
+    # the read only checks of every server are sent as one script per host
+    without_parameter = getattr(options, 'without_parameter', False)
+    server_commands = {}
     for server in cluster_config.servers:
-        client = clients[server]
         server_config = cluster_config.get_server_conf(server)
         home_path = server_config['home_path']
-
         if not server_config.get('data_dir'):
             server_config['data_dir'] = '%s/store' % home_path
-            
         if not server_config.get('local_ip') and not server_config.get('devname'):
             server_config['local_ip'] = server.ip
+        server_commands[server] = ['ls %s/clog/tenant_1/' % server_config['data_dir'], 'cat %s/run/observer.pid' % home_path]
+        if without_parameter:
+            server_commands[server].append('ls %s/etc/observer.config.bin' % home_path)
+    probe_clients = plugin_context.parallel_probe(server_commands)
+    probe_time = time.time()
 
-        if client.execute_command('ls %s/clog/tenant_1/' % server_config['data_dir']).stdout.strip():
-            need_bootstrap = False
+    def construct_cmd(server, client, stdio):
+        server_config = cluster_config.get_server_conf(server)
+        home_path = server_config['home_path']
+
+        bootstrapped = bool(client.execute_command('ls %s/clog/tenant_1/' % server_config['data_dir']).stdout.strip())
 
         remote_pid_path = '%s/run/observer.pid' % home_path
         remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
         if remote_pid:
             if client.execute_command('ls /proc/%s' % remote_pid):
-                continue
+                return bootstrapped, None
 
         stdio.verbose('%s start command construction' % server)
-        if getattr(options, 'without_parameter', False) and client.execute_command('ls %s/etc/observer.config.bin' % home_path):
+        if without_parameter and client.execute_command('ls %s/etc/observer.config.bin' % home_path):
             use_parameter = False
         else:
             use_parameter = True
@@ -198,11 +207,21 @@ def start(plugin_context, *args, **kwargs):
         else:
             cmd.append('-p %s' % server_config['mysql_port'])
 
-        clusters_cmd[server] = 'cd %s; %s/bin/observer %s' % (home_path, home_path, ' '.join(cmd))
+        return bootstrapped, 'cd %s; %s/bin/observer %s' % (home_path, home_path, ' '.join(cmd))
 
-    for server in clusters_cmd:
+    for task in plugin_context.parallel_execute(construct_cmd, servers=cluster_config.servers, clients=probe_clients):
+        if not task.value:
+            stdio.stop_loading('fail')
+            return
+        bootstrapped, server_cmd = task.value
+        if bootstrapped:
+            need_bootstrap = False
+        if server_cmd:
+            clusters_cmd[task.server] = server_cmd
+    construct_time = time.time()
+
+    def start_server(server, client, stdio):
         environments = deepcopy(cluster_config.get_environments())
-        client = clients[server]
         server_config = cluster_config.get_server_conf(server)
         stdio.verbose('starting %s observer', server)
         if 'LD_LIBRARY_PATH' not in environments:
@@ -210,25 +229,45 @@ def start(plugin_context, *args, **kwargs):
         with EnvVariables(environments, client):
             ret = client.execute_command(clusters_cmd[server])
         if not ret:
-            stdio.stop_loading('fail')
             stdio.error(EC_OBSERVER_FAIL_TO_START_WITH_ERR.format(server=server, stderr=ret.stderr))
+            return False
+        return time.time()
+
+    launched = {}
+    launch_tasks = plugin_context.parallel_execute(start_server, list(clusters_cmd.keys()))
+    launch_time = time.time()
+    for task in launch_tasks:
+        if not task:
+            stdio.stop_loading('fail')
             return
+        launched[task.server] = task.value
     stdio.stop_loading('succeed')
 
     stdio.start_loading('observer program health check')
-    time.sleep(3)
+
+    # every server is polled until its observer listens on the rpc port
     failed = []
+    targets = {}
     for server in cluster_config.servers:
-        client = clients[server]
         server_config = cluster_config.get_server_conf(server)
-        home_path = server_config['home_path']
-        remote_pid_path = '%s/run/observer.pid' % home_path
-        stdio.verbose('%s program health check' % server)
-        remote_pid = client.execute_command('cat %s' % remote_pid_path).stdout.strip()
-        if remote_pid and client.execute_command('ls /proc/%s' % remote_pid):
-            stdio.verbose('%s observer[pid: %s] started', server, remote_pid)
-        else:
+        targets[server] = ('%s/run/observer.pid' % server_config['home_path'], server_config['rpc_port'])
+    results = plugin_context.wait_ready(targets, launched)
+    ready_time = {}
+    for server in cluster_config.servers:
+        pid, listening, cost = results[server]
+        if pid is None:
             failed.append(EC_OBSERVER_FAIL_TO_START.format(server=server))
+        elif listening:
+            stdio.verbose('%s observer[pid: %s] started', server, pid)
+        else:
+            stdio.verbose('%s observer[pid: %s] started, but the rpc port is not listening yet', server, pid)
+        ready_time[server] = cost
+    check_time = time.time()
+
+    stdio.verbose('observer start cost: probe %.2fs, command construction %.2fs, launch %.2fs, health check %.2fs' % (
+        probe_time - start_time, construct_time - probe_time, launch_time - construct_time, check_time - launch_time))
+    for task in sorted(launch_tasks, key=lambda task: task.time, reverse=True)[:3]:
+        stdio.verbose('%s launched in %.2fs, ready in %.2fs' % (task.server, task.time, ready_time.get(task.server, 0)))
     if failed:
         stdio.stop_loading('fail')
         for msg in failed:
@@ -33,10 +33,23 @@ stdio = None
 success = True
 production_mode = False
 
-def get_port_socket_inode(client, port):
+HOST_FACT_COMMANDS = [
+    'cat /proc/sys/fs/aio-max-nr /proc/sys/fs/aio-nr',
+    'ulimit -a',
+    'sysctl -a',
+    'cat /proc/meminfo',
+    'df --block-size=1024 ',
+    'df --block-size=1024 /'
+]
+
+
+def get_port_socket_inode_command(port):
     port = hex(port)[2:].zfill(4).upper()
-    cmd = "bash -c 'cat /proc/net/{tcp*,udp*}' | awk -F' ' '{print $2,$10}' | grep '00000000:%s' | awk -F' ' '{print $2}' | uniq" % port
-    res = client.execute_command(cmd)
+    return "bash -c 'cat /proc/net/{tcp*,udp*}' | awk -F' ' '{print $2,$10}' | grep '00000000:%s' | awk -F' ' '{print $2}' | uniq" % port
+
+
+def get_port_socket_inode(client, port):
+    res = client.execute_command(get_port_socket_inode_command(port))
     if not res or not res.stdout.strip():
         return False
     stdio.verbose(res.stdout)
@@ -99,6 +112,53 @@ def get_system_memory(memory_limit, min_pool_memory):
     return max(system_memory, min_pool_memory)
 
 
+def get_dir_probe_commands(path, empty_check):
+    commands = []
+    while True:
+        commands.append('bash -c "[ -a %s ]"' % path)
+        commands.append('[ -d {} ]'.format(path))
+        commands.append('[ -w {} ]'.format(path))
+        if empty_check:
+            commands.append('ls %s' % path)
+        parent = os.path.dirname(path)
+        if not parent or parent == path:
+            return commands
+        path = parent
+        empty_check = False
+
+
+def get_server_probe_commands(server_config, original_server_conf, precheck=False, work_dir_check=False, work_dir_empty_check=True):
+    # the commands which the checks below will execute on the server, they can be predicted from the config
+    home_path = server_config['home_path']
+    data_dir = server_config['data_dir'] if server_config.get('data_dir') else '%s/store' % home_path
+    redo_dir = server_config['redo_dir'] if server_config.get('redo_dir') else data_dir
+    clog_dir = server_config['clog_dir'] if server_config.get('clog_dir') else '%s/clog' % redo_dir
+    commands = []
+    if not precheck:
+        commands.append('ls %s/clog/tenant_1/' % data_dir)
+        commands.append('cat %s/run/observer.pid' % home_path)
+    if work_dir_check:
+        dirs = {
+            'home_path': home_path,
+            'data_dir': data_dir,
+            'redo_dir': redo_dir,
+            'clog_dir': clog_dir,
+            'ilog_dir': server_config['ilog_dir'] if server_config.get('ilog_dir') else '%s/ilog' % redo_dir,
+            'slog_dir': server_config['slog_dir'] if server_config.get('slog_dir') else '%s/slog' % data_dir
+        }
+        for key in dirs:
+            if key in original_server_conf:
+                commands += get_dir_probe_commands(dirs[key], work_dir_empty_check)
+    for key in ['mysql_port', 'rpc_port']:
+        commands.append(get_port_socket_inode_command(int(server_config[key])))
+    commands.append('ls %s/sstable/block_file' % data_dir)
+    if server_config.get('devname'):
+        commands.append("grep -e '^ *%s:' /proc/net/dev" % server_config['devname'])
+    for path in [data_dir, clog_dir]:
+        commands.append('df --block-size=1024 {}'.format(path))
+    return commands
+
+
 def get_disk_info_by_path(path, client, stdio):
     disk_info = {}
     ret = client.execute_command('df --block-size=1024 {}'.format(path))
@@ -260,11 +320,22 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
     port_check = True
     kernel_check = True
     is_running_opt = source_option in ['restart', 'upgrade']
+
+    # collect everything the checks below may ask a host for with one probe script per ip
+    probe_commands = {}
+    for server in cluster_config.servers:
+        ip = server.ip
+        if ip not in probe_commands:
+            probe_commands[ip] = list(HOST_FACT_COMMANDS)
+            servers_clients[ip] = clients[server]
+        server_config = cluster_config.get_server_conf_with_default(server)
+        probe_commands[ip] += get_server_probe_commands(server_config, cluster_config.get_server_conf(server), precheck, work_dir_check, work_dir_empty_check)
+    servers_clients = plugin_context.parallel_probe(probe_commands, clients=servers_clients)
+
     for server in cluster_config.servers:
         ip = server.ip
-        client = clients[server]
+        client = servers_clients[ip]
         server_generate_config = generate_configs.get(server, {})
-        servers_clients[ip] = client
         server_config = cluster_config.get_server_conf_with_default(server)
         home_path = server_config['home_path']
         production_mode = server_config.get('production_mode', False)
@@ -734,11 +805,38 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
                     suggest.auto_fix = False
                 error('ocp meta db', err.EC_OCP_EXPRESS_META_DB_NOT_ENOUGH_LOG_DISK.format(), [suggest])
 
+    if success:
+        # ping from all ips at the same time, the loop below reads the results
+        def ping_command(devname, _ip):
+            return 'ping -W 1 -c 1 -I %s %s' % (devname, _ip) if devname is not None else 'ping -W 1 -c 1 %s' % _ip
+
+        def wrong_devname(client, devname):
+            return client.is_localhost() and (devname != 'lo' and devname is not None) or (not client.is_localhost() and devname == 'lo')
+
+        def ping(ip, client, stdio):
+            # the same devices and peers as the loop below, which stops at the first peer a device fails to reach
+            returns = {}
+            for devname in servers_net_interface[ip]:
+                if wrong_devname(client, devname):
+                    continue
+                for _ip in servers_clients:
+                    if ip == _ip:
+                        continue
+                    ping_cmd = ping_command(devname, _ip)
+                    returns[ping_cmd] = client.execute_command(ping_cmd)
+                    if not returns[ping_cmd]:
+                        break
+            return returns
+
+        ping_returns = {}
+        for task in plugin_context.parallel_execute(ping, servers=list(servers_net_interface.keys()), clients=servers_clients):
+            ping_returns[task.server] = task.value or {}
+
     if success:
         for ip in servers_net_interface:
             client = servers_clients[ip]
             for devname in servers_net_interface[ip]:
-                if client.is_localhost() and (devname != 'lo' and devname is not None) or (not client.is_localhost() and devname == 'lo'):
+                if wrong_devname(client, devname):
                     suggest = err.SUG_NO_SUCH_NET_DEVIC.format(ip=ip)
                     suggest.auto_fix = client.is_localhost() and 'devname' not in global_generate_config and 'devname' not in server_generate_config
                     for server in ip_servers:
@@ -747,8 +845,7 @@ def start_check(plugin_context, init_check_status=False, strict_check=False, wor
                 for _ip in servers_clients:
                     if ip == _ip:
                         continue
-                    ping_cmd = 'ping -W 1 -c 1 -I %s %s' % (devname, _ip) if devname is not None else 'ping -W 1 -c 1 %s' % _ip
-                    if not client.execute_command(ping_cmd):
+                    if not ping_returns[ip].get(ping_command(devname, _ip)):
                         suggest = err.SUG_NO_SUCH_NET_DEVIC.format(ip=ip)
                         suggest.auto_fix = 'devname' not in global_generate_config and 'devname' not in server_generate_config
                         for server in ip_servers:
@@ -29,20 +29,24 @@ try:
 except:
     import subprocess
 from ssh import LocalClient
+from _benchmark import SysbenchResultParser
 
 
 stdio = None
 
 
-def exec_cmd(cmd):
+def exec_cmd(cmd, parser=None):
     stdio.verbose('execute: %s' % cmd)
     process = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    while process.poll() is None:
-        line = process.stdout.readline()
+    # read until EOF, the summary is printed right before sysbench exits
+    for line in iter(process.stdout.readline, b''):
         line = line.strip()
         if line:
-            stdio.print(line.decode("utf8", 'ignore'))
-    return process.returncode == 0
+            line = line.decode("utf8", 'ignore')
+            stdio.print(line)
+            if parser:
+                parser.feed(line)
+    return process.wait() == 0
 
 
 def run_test(plugin_context, *args, **kwargs):
@@ -59,6 +63,8 @@ def run_test(plugin_context, *args, **kwargs):
     opt_keys = list(vars(options).keys())
     for used_key in ['component', 'test_server', 'skip_cluster_status_check', 'obclient_bin', 'optimization']:
         opt_keys.remove(used_key)
+    if 'compare' in opt_keys:
+        opt_keys.remove('compare')
 
     host = get_option('host', '127.0.0.1')
     port = get_option('port', 2881)
@@ -104,8 +110,9 @@ def run_test(plugin_context, *args, **kwargs):
             sysbench_cmd += ' --percentile=%s' % percentile
         for opt_key in opt_keys:
             sysbench_cmd += ' --%s=%s' % (opt_key.replace('_', '-'), getattr(options, opt_key))
-        if exec_cmd('%s cleanup' % sysbench_cmd) and exec_cmd('%s prepare' % sysbench_cmd) and exec_cmd('%s --db-ps-mode=disable run' % sysbench_cmd):
-            return plugin_context.return_true()
+        parser = SysbenchResultParser()
+        if exec_cmd('%s cleanup' % sysbench_cmd) and exec_cmd('%s prepare' % sysbench_cmd) and exec_cmd('%s --db-ps-mode=disable run' % sysbench_cmd, parser):
+            return plugin_context.return_true(result=parser.result)
     except KeyboardInterrupt:
         pass
     except:
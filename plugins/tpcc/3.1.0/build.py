@@ -29,6 +29,7 @@ import time
 import re
 
 from ssh import LocalClient
+from tool import CompactionWaiter
 from _errno import EC_TPCC_LOAD_DATA_FAILED
 
 
@@ -133,33 +134,10 @@ def build(plugin_context, cursor, odp_cursor, *args, **kwargs):
     bmsql_sql_path = kwargs.get('bmsql_sql_path', '')
     run_sql(sql_file=os.path.join(bmsql_sql_path, 'tableDrops.sql'), force=True)
 
-    merge_version = cursor.fetchone("select value from oceanbase.__all_zone where name='frozen_version'")
-    if merge_version is False:
-        return
-    merge_version = merge_version['value']
     stdio.start_loading('Merge')
-    if cursor.fetchone('alter system major freeze') is False:
+    if not CompactionWaiter(cursor, stdio=stdio).major_freeze():
+        stdio.stop_loading('fail')
         return
-    sql = "select value from oceanbase.__all_zone where name='frozen_version' and value != %s" % merge_version
-    while True:
-        res = cursor.fetchone(sql)
-        if res is False:
-            return
-        if res:
-            break
-        time.sleep(1)
-
-    while True:
-        res = cursor.fetchone("""select * from  oceanbase.__all_zone 
-                                 where name='last_merged_version'
-                                 and value != (select value from oceanbase.__all_zone where name='frozen_version' limit 1)
-                                 and zone in (select zone from  oceanbase.__all_zone where name='status' and info = 'ACTIVE')
-                              """)
-        if res is False:
-            return
-        if not res:
-            break
-        time.sleep(5)
     stdio.stop_loading('succeed')
 
     # create new tables
@@ -31,6 +31,7 @@ except:
     import subprocess
 
 from ssh import LocalClient
+from tool import CompactionWaiter
 from _errno import EC_TPCC_RUN_TEST_FAILED
 
 stdio = None
@@ -85,33 +86,10 @@ def run_test(plugin_context, cursor, odp_cursor=None, *args, **kwargs):
         stdio.exception('')
         return
 
-    merge_version = cursor.fetchone("select value from oceanbase.__all_zone where name='frozen_version'")
-    if merge_version is False:
-        return
-    merge_version = merge_version['value']
     stdio.start_loading('Merge')
-    if cursor.fetchone('alter system major freeze') is False:
+    if not CompactionWaiter(cursor, stdio=stdio).major_freeze():
+        stdio.stop_loading('fail')
         return
-    sql = "select value from oceanbase.__all_zone where name='frozen_version' and value != %s" % merge_version
-    while True:
-        res = cursor.fetchone(sql)
-        if res is False:
-            return
-        if res:
-            break
-        time.sleep(1)
-
-    while True:
-        res = cursor.fetchone("""select * from  oceanbase.__all_zone 
-                                 where name='last_merged_version'
-                                 and value != (select value from oceanbase.__all_zone where name='frozen_version' limit 1)
-                                 and zone in (select zone from  oceanbase.__all_zone where name='status' and info = 'ACTIVE')
-                              """)
-        if res is False:
-            return
-        if not res:
-            break
-        time.sleep(5)
     stdio.stop_loading('succeed')
 
     stdio.verbose('Benchmark run')
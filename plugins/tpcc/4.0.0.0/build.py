@@ -29,6 +29,7 @@ import time
 import re
 
 from ssh import LocalClient
+from tool import CompactionWaiter
 
 
 def build(plugin_context, cursor, odp_cursor, *args, **kwargs):
@@ -136,31 +137,9 @@ def build(plugin_context, cursor, odp_cursor, *args, **kwargs):
 
     # Major freeze
     stdio.start_loading('Merge')
-    sql_frozen_scn = "select FROZEN_SCN, LAST_SCN from oceanbase.CDB_OB_MAJOR_COMPACTION where tenant_id = %s" % tenant_id
-    merge_version = cursor.fetchone(sql_frozen_scn)
-    if merge_version is False:
-        return
-    merge_version = merge_version['FROZEN_SCN']
-    if cursor.fetchone("alter system major freeze tenant = %s" % tenant_name) is False:
+    if not CompactionWaiter(cursor, tenant_id=tenant_id, stdio=stdio).major_freeze(tenant_name):
+        stdio.stop_loading('fail')
         return
-    # merge version changed
-    while True:
-        current_version = cursor.fetchone(sql_frozen_scn)
-        if current_version is False:
-            return
-        current_version = current_version['FROZEN_SCN']
-        if int(current_version) > int(merge_version):
-            break
-        time.sleep(5)
-    stdio.verbose('current merge version is: %s' % current_version)
-    # version updated
-    while True:
-        ret = cursor.fetchone(sql_frozen_scn)
-        if ret is False:
-            return
-        if int(ret.get("FROZEN_SCN", 0)) / 1000 == int(ret.get("LAST_SCN", 0)) / 1000:
-            break
-        time.sleep(5)
     stdio.stop_loading('succeed')
 
     # create new tables
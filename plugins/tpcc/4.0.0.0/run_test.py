@@ -31,7 +31,7 @@ except:
     import subprocess
 from collections import OrderedDict
 from ssh import LocalClient
-from tool import FileUtil
+from tool import FileUtil, CompactionWaiter
 
 stdio = None
 
@@ -93,28 +93,9 @@ def run_test(plugin_context, cursor, odp_cursor=None, *args, **kwargs):
 
     # Major freeze
     stdio.start_loading('Merge')
-    sql_frozen_scn = "select FROZEN_SCN, LAST_SCN from oceanbase.CDB_OB_MAJOR_COMPACTION where tenant_id = %s" % tenant_id
-    merge_version = cursor.fetchone(sql_frozen_scn)
-    if merge_version is False:
-        return
-    merge_version = merge_version['FROZEN_SCN']
-    if cursor.fetchone("alter system major freeze tenant = %s" % tenant_name) is False:
+    if not CompactionWaiter(cursor, tenant_id=tenant_id, stdio=stdio).major_freeze(tenant_name):
+        stdio.stop_loading('fail')
         return
-    while True:
-        current_version = cursor.fetchone(sql_frozen_scn)
-        if current_version is False:
-            return
-        current_version = current_version['FROZEN_SCN']
-        if int(current_version) > int(merge_version):
-            break
-        time.sleep(5)
-    while True:
-        ret = cursor.fetchone(sql_frozen_scn)
-        if ret is False:
-            return
-        if int(ret.get("FROZEN_SCN", 0)) / 1000 == int(ret.get("LAST_SCN", 0)) / 1000:
-            break
-        time.sleep(5)
     # analyze
     local_dir, _ = os.path.split(__file__)
     analyze_path = os.path.join(local_dir, 'analyze.sql')
@@ -24,11 +24,14 @@ from __future__ import absolute_import, division, print_function
 import re
 import os
 import time
+import random
+from multiprocessing.pool import ThreadPool
 try:
     import subprocess32 as subprocess
 except:
     import subprocess
 from ssh import LocalClient
+from tool import CompactionWaiter
 
 
 stdio = None
@@ -56,6 +59,25 @@ def exec_cmd(cmd):
     return process.returncode == 0
 
 
+def run_concurrently(func, args_list, workers):
+    # the results keep the order of args_list and the first error is raised again
+    if workers <= 1 or len(args_list) <= 1:
+        return [func(*args) for args in args_list]
+    pool = ThreadPool(processes=min(workers, len(args_list)))
+    try:
+        return pool.map(lambda args: func(*args), args_list)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def stream_queries(sql_path, stream):
+    # every stream of the throughput test runs all the queries in an order fixed by the stream number
+    queries = list(sql_path)
+    random.Random(stream).shuffle(queries)
+    return queries
+
+
 def run_test(plugin_context, db, cursor, *args, **kwargs):
     def get_option(key, default=''):
         value = getattr(options, key, default)
@@ -66,6 +88,36 @@ def run_test(plugin_context, db, cursor, *args, **kwargs):
     def local_execute_command(command, env=None, timeout=None):
         return LocalClient.execute_command(command, env, timeout, stdio)
 
+    def load_table(path, parallel):
+        _, fn = os.path.split(path)
+        stdio.verbose('load %s' % path)
+        start_time = time.time()
+        ret = local_execute_command("""%s -c -e "load data /*+ parallel(%s) */ infile '%s' into table %s fields terminated by '|';" """ % (sql_cmd_prefix, parallel, path, fn[:-4]))
+        if not ret:
+            raise Exception(ret.stderr)
+        return {'phase': 'load', 'name': fn[:-4], 'stream': None, 'start': start_time, 'cost': time.time() - start_time}
+
+    def exec_query(path, phase='power', stream=None, verbose=False):
+        _, fn = os.path.split(path)
+        log_path = os.path.join(tmp_dir, '%s.log' % fn if stream is None else '%s.%s.log' % (fn, stream))
+        start_time = time.time()
+        if verbose:
+            stdio.print('[%s]: start %s' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time)), path))
+        ret = local_execute_command('echo source %s | %s -c > %s' % (path, sql_cmd_prefix, log_path))
+        end_time = time.time()
+        cost = end_time - start_time
+        if verbose:
+            stdio.print('[%s]: end %s, cost %.2fs' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time)), path, cost))
+        if not ret:
+            raise Exception(ret.stderr)
+        return {'phase': phase, 'name': fn[:-4], 'stream': stream, 'start': start_time, 'cost': cost}
+
+    def exec_stream(stream):
+        start_time = time.time()
+        queries = [exec_query(path, 'throughput', stream) for path in stream_queries(sql_path, stream)]
+        stdio.verbose('stream %s finished, cost %.2fs' % (stream, time.time() - start_time))
+        return queries
+
     global stdio
     cluster_config = plugin_context.cluster_config
     stdio = plugin_context.stdio
@@ -85,6 +137,9 @@ def run_test(plugin_context, db, cursor, *args, **kwargs):
     sql_path = get_option('sql_path')
     tmp_dir = get_option('tmp_dir')
     obclient_bin = get_option('obclient_bin', 'obclient')
+    scale_factor = get_option('scale_factor', 1)
+    load_workers = max(get_option('load_workers', 1), 1)
+    streams = max(get_option('streams', 0), 0)
 
     sql_path = sorted(sql_path, key=lambda x: (len(x), x))
 
@@ -116,6 +171,7 @@ def run_test(plugin_context, db, cursor, *args, **kwargs):
         else:
             server_config = cluster_config.get_server_conf(server)
             cpu_total += int(server_config.get('cpu_count', 0))
+    result = {'summary': {'scale_factor': scale_factor, 'load_workers': load_workers, 'streams': streams}, 'timings': []}
     try:
         sql = "select value from oceanbase.__all_virtual_sys_variable where tenant_id = %d and name = 'secure_file_priv'" % tenant_id
         ret = cursor.fetchone(sql)
@@ -157,40 +213,17 @@ def run_test(plugin_context, db, cursor, *args, **kwargs):
             stdio.stop_loading('succeed')
 
             stdio.start_loading('Load data')
-            for path in tbl_path:
-                _, fn = os.path.split(path)
-                stdio.verbose('load %s' % path)
-                ret = local_execute_command("""%s -c -e "load data /*+ parallel(%s) */ infile '%s' into table %s fields terminated by '|';" """ % (sql_cmd_prefix, parallel_num, path, fn[:-4]))
-                if not ret:
-                    raise Exception(ret.stderr)
+            # the tables loaded at the same time share the parallelism of the tenant
+            load_parallel = max(parallel_num // min(load_workers, len(tbl_path) or 1), 1)
+            start_time = time.time()
+            result['timings'] += run_concurrently(load_table, [(path, load_parallel) for path in tbl_path], load_workers)
+            result['summary']['load_cost'] = time.time() - start_time
             stdio.stop_loading('succeed')
 
-            merge_version = cursor.fetchone("select value from oceanbase.__all_zone where name='frozen_version'")
-            if merge_version is False:
-                return
-            merge_version = merge_version['value']
             stdio.start_loading('Merge')
-            if cursor.fetchone('alter system major freeze') is False:
+            if not CompactionWaiter(cursor, stdio=stdio).major_freeze():
+                stdio.stop_loading('fail')
                 return
-            sql = "select value from oceanbase.__all_zone where name='frozen_version' and value != %s" % merge_version
-            while True:
-                res = cursor.fetchone(sql)
-                if res is False:
-                    return
-                if res:
-                    break
-                
-            while True:
-                res = cursor.fetchone("""select * from  oceanbase.__all_zone 
-                                         where name='last_merged_version'
-                                         and value != (select value from oceanbase.__all_zone where name='frozen_version' limit 1)
-                                         and zone in (select zone from  oceanbase.__all_zone where name='status' and info = 'ACTIVE')
-                                         """)
-                if res is False:
-                    return
-                if not res:
-                    break
-                time.sleep(5)
             stdio.stop_loading('succeed')
 
 
@@ -209,30 +242,36 @@ def run_test(plugin_context, db, cursor, *args, **kwargs):
 
         #warmup预热
         stdio.start_loading('Warmup')
-        times = 2
-        for path in sql_path:
-            _, fn = os.path.split(path)
-            log_path = os.path.join(tmp_dir, '%s.log' % fn)
-            ret = local_execute_command('echo source %s | %s -c > %s' % (path, sql_cmd_prefix, log_path))
-            if not ret:
-                raise Exception(ret.stderr)
+        run_concurrently(exec_query, [(path, 'warmup') for path in sql_path], streams)
         stdio.stop_loading('succeed')
 
-        total_cost = 0
-        for path in sql_path:
-            start_time = time.time()
-            _, fn = os.path.split(path)
-            log_path = os.path.join(tmp_dir, '%s.log' % fn)
-            stdio.print('[%s]: start %s' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time)), path))
-            ret = local_execute_command('echo source %s | %s -c > %s' % (path, sql_cmd_prefix, log_path))
-            end_time = time.time()
-            cost = end_time - start_time
-            total_cost += cost
-            stdio.print('[%s]: end %s, cost %.2fs' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time)), path, cost))
-            if not ret:
-                raise Exception(ret.stderr)
+        power = [exec_query(path, verbose=True) for path in sql_path]
+        result['timings'] += power
+        total_cost = sum([query['cost'] for query in power])
+        result['summary']['power_cost'] = total_cost
         stdio.print('Total Cost: %.2fs' % total_cost)
-        return plugin_context.return_true()
+
+        throughput = []
+        if streams:
+            stdio.start_loading('Throughput test (%s streams)' % streams)
+            start_time = time.time()
+            for queries in run_concurrently(exec_stream, [(stream, ) for stream in range(1, streams + 1)], streams):
+                throughput += queries
+            throughput_cost = time.time() - start_time
+            stdio.stop_loading('succeed')
+            result['summary']['throughput_cost'] = throughput_cost
+            # queries per hour of all the streams, scaled by the scale factor like Throughput@Size
+            result['summary']['throughput'] = streams * len(sql_path) * 3600.0 / max(throughput_cost, 0.001) * scale_factor
+            stdio.print('Throughput Cost: %.2fs, Throughput@%s: %.2f' % (throughput_cost, scale_factor, result['summary']['throughput']))
+
+        result['timings'] += throughput
+
+        rows = []
+        for query in power:
+            costs = [item['cost'] for item in throughput if item['name'] == query['name']]
+            rows.append([query['name'], '%.2f' % query['cost']] + (['%.2f' % (sum(costs) / len(costs)), '%.2f' % max(costs)] if costs else []))
+        stdio.print_list(rows, ['Query', 'Power Cost(s)'] + (['Stream Avg(s)', 'Stream Max(s)'] if streams else []), title='TPC-H Query Cost')
+        return plugin_context.return_true(result=result)
     except KeyboardInterrupt:
         stdio.stop_loading('fail')
     except Exception as e:
@@ -19,7 +19,8 @@
 
 from typing import Optional
 
-from fastapi import APIRouter, Path, Header
+from fastapi import APIRouter, Path, Header, Response
+from http import HTTPStatus
 
 from service.api.response import OBResponse, DataList
 
@@ -48,13 +49,16 @@ async def list_component_parameters(parameter_request: ParameterRequest = ..., a
             description='query component by component name',
             tags=['Components'],
             operation_id='queryComponentByComponentName')
-async def get_component(component: str = Path(description='component name')):
+async def get_component(response: Response, component: str = Path(description='component name'), if_none_match: Optional[str] = Header(None)):
     handler = handler_utils.new_component_handler()
     try:
-        ret = handler.get_component(component)
+        etag, ret = handler.get_component(component)
+        if if_none_match == etag:
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers={'ETag': etag})
         if ret is None:
             return response_utils.new_not_found_exception(Exception("component {0} not found".format(component)))
         else:
+            response.headers['ETag'] = etag
             return response_utils.new_ok_response(ret)
     except Exception as ex:
         return response_utils.new_service_unavailable_exception(ex)
@@ -65,10 +69,13 @@ async def get_component(component: str = Path(description='component name')):
             description='query all component versions',
             operation_id='queryAllComponentVersions',
             tags=['Components'])
-async def list_components():
+async def list_components(response: Response, if_none_match: Optional[str] = Header(None)):
     handler = handler_utils.new_component_handler()
     try:
-        components = handler.list_components()
+        etag, components = handler.list_components()
+        if if_none_match == etag:
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers={'ETag': etag})
+        response.headers['ETag'] = etag
         return response_utils.new_ok_response(components)
     except Exception as ex:
         return response_utils.new_service_unavailable_exception(ex)
@@ -92,10 +92,10 @@ async def recover(name: str = Path(description='deployment name')):
              description='deploy and start a deployment',
              operation_id='deployAndStartADeployment',
              tags=['Deployments'])
-async def install(name: str, background_tasks: BackgroundTasks):
+async def install(name: str):
     handler = handler_utils.new_deployment_handler()
     try:
-        handler.install(name, background_tasks)
+        handler.install(name)
     except Exception as ex:
         return response_utils.new_internal_server_error_exception(ex)
     return response_utils.new_ok_response("")
@@ -128,6 +128,18 @@ async def get_connect_info(name: str = Path(description='deployment name')):
         return response_utils.new_ok_response(connection_info_list)
 
 
+@router.post("/deployments/{name}/install/cancel",
+             response_model=OBResponse,
+             description='cancel install, the running component finishes first',
+             operation_id='cancelInstall',
+             tags=['Deployments'])
+async def cancel_install(name: str = Path(description='deployment name')):
+    handler = handler_utils.new_deployment_handler()
+    if not handler.cancel_install(name):
+        return response_utils.new_not_found_exception(Exception("running install task {0} not found".format(name)))
+    return response_utils.new_ok_response("cancel install {0}".format(name))
+
+
 @router.get("/deployments/{name}/install/log",
             response_model=OBResponse[InstallLog],
             description='query install log',
@@ -140,8 +152,12 @@ async def get_install_log(name: str = Path(description='deployment name'),
     task_info = handler.get_install_task_info(name)
     if task_info is None:
         return response_utils.new_not_found_exception("task {0} not found".format(name))
-    log_content = handler.buffer.read() if component_name is None else handler.get_install_log_by_component(component_name)
-    log_info = InstallLog(log=log_content[offset:], offset=len(log_content))
+    if component_name is None:
+        log_content = handler.get_install_log(name)
+        log_info = InstallLog(log=log_content[offset:], offset=len(log_content))
+    else:
+        log_content, log_offset = handler.get_install_log_by_component(name, component_name, offset)
+        log_info = InstallLog(log=log_content, offset=log_offset)
     return response_utils.new_ok_response(log_info)
 
 
@@ -16,10 +16,43 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
+import os
+from threading import Lock
+from optparse import Values
 from collections import defaultdict
 from singleton_decorator import singleton
 
-from _stdio import BufferIO
+from _stdio import IO, BufferIO
+from service.common import task
+
+
+def new_stdio(output_stream, msg_lv):
+    """
+    A root stdio of the service which prints into output_stream and keeps its own trace.
+    """
+    stdio = IO(1, msg_lv=msg_lv, input_stream=BufferIO(False), output_stream=output_stream)
+    stdio.set_trace_buffer(True)
+    return stdio
+
+
+class DeployHome(object):
+
+    """
+    The ObdHome, io buffer and context of one deployment, so the tasks of different deployments run concurrently.
+    The ObdHome is forked from the one of the service and shares its managers and locks,
+    but has its own deploy, namespaces, ssh clients, options and output.
+    """
+
+    def __init__(self, obd):
+        self.buffer = BufferIO(False)
+        self.obd = obd.fork(stdio=new_stdio(self.buffer, obd.stdio.msg_lv))
+        self.obd.deploy = None
+        self.obd.repositories = None
+        self.obd.cmds = []
+        self.obd.options = Values()
+        self.obd.namespaces = {}
+        self.obd.ssh_clients = {}
+        self.context = defaultdict(lambda: defaultdict(lambda: None))
 
 
 @singleton
@@ -33,8 +66,12 @@ class CoreManager(object):
         self._buffer = BufferIO(False)
         CoreManager.INSTANCE.stdio.set_output_stream(self._buffer)
         CoreManager.INSTANCE.stdio.set_input_stream(BufferIO(False))
+        CoreManager.INSTANCE.stdio.set_trace_buffer(True)
+        task.get_task_manager().set_persist_path(os.path.join(CoreManager.INSTANCE.home_path, 'service', 'tasks.json'))
         self._obd = CoreManager.INSTANCE
         self._context = defaultdict(lambda: defaultdict(lambda: None))
+        self._deploy_homes = {}
+        self._deploy_homes_lock = Lock()
 
     def get_obd(self):
         return self._obd
@@ -45,4 +82,11 @@ class CoreManager(object):
     def get_context(self):
         return self._context
 
-
+    def get_deploy_home(self, name):
+        with self._deploy_homes_lock:
+            if name not in self._deploy_homes:
+                # the managers are created before the fork, so all the deployments share them
+                for manager in ['mirror_manager', 'repository_manager', 'deploy_manager', 'plugin_manager']:
+                    getattr(self._obd, manager)
+                self._deploy_homes[name] = DeployHome(self._obd)
+            return self._deploy_homes[name]
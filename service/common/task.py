@@ -17,10 +17,13 @@
 # You should have received a copy of the GNU General Public License
 # along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
+import json
 import time
 import functools
-from threading import Lock
-from collections import defaultdict
+from threading import Lock, RLock, Event, local
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from singleton_decorator import singleton
 
 from enum import auto
@@ -29,10 +32,25 @@ from service.common import log
 
 DEFAULT_TASK_TYPE="undefined"
 
+_CURRENT = local()
+
+
 def get_task_manager():
     return TaskManager()
 
 
+def get_task_engine():
+    return TaskEngine()
+
+
+def current_task():
+    return getattr(_CURRENT, 'task_info', None)
+
+
+class TaskCancelled(Exception):
+    pass
+
+
 class TaskStatus(StrEnum):
     PENDING = auto()
     RUNNING = auto()
@@ -54,6 +72,60 @@ class TaskInfo(object):
         self.result = TaskResult.RUNNING
         self.ret = None
         self.exception = None
+        self.total = 0
+        self.finished = 0
+        self.current = ''
+        self._cancel = Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise TaskCancelled('task cancelled')
+
+    def progress(self, finished=None, total=None, current=None):
+        if total is not None:
+            self.total = total
+        if finished is not None:
+            self.finished = finished
+        if current is not None:
+            self.current = current
+        get_task_manager().dump()
+
+    def to_dict(self):
+        return {
+            'status': self.status.value,
+            'result': self.result.value,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'total': self.total,
+            'finished': self.finished,
+            'current': self.current,
+            'exception': None if self.exception is None else str(self.exception)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        task_info = cls()
+        task_info.status = TaskStatus(data['status'])
+        task_info.result = TaskResult(data['result'])
+        task_info.start_time = data.get('start_time')
+        task_info.end_time = data.get('end_time')
+        task_info.total = data.get('total', 0)
+        task_info.finished = data.get('finished', 0)
+        task_info.current = data.get('current', '')
+        if data.get('exception') is not None:
+            task_info.exception = Exception(data['exception'])
+        if task_info.status != TaskStatus.FINISHED:
+            # the service stopped while it was running
+            task_info.exception = Exception('task interrupted by service restart')
+            task_info.fail()
+        return task_info
 
     def run(self):
         self.status = TaskStatus.RUNNING
@@ -77,6 +149,41 @@ class TaskManager(object):
     def __init__(self):
         self.all_tasks = defaultdict(dict)
         self.lock = Lock()
+        self.persist_path = None
+
+    def set_persist_path(self, path):
+        """
+        Keep the state of the tasks in a file, and load the tasks of the last run of the service from it.
+        """
+        with self.lock:
+            self.persist_path = path
+            if not os.path.exists(path):
+                return
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                for task_type in data:
+                    for name in data[task_type]:
+                        if name not in self.all_tasks[task_type]:
+                            self.all_tasks[task_type][name] = TaskInfo.from_dict(data[task_type][name])
+            except:
+                log.get_logger().exception("load tasks from %s failed", path)
+
+    def dump(self):
+        if not self.persist_path:
+            return
+        with self.lock:
+            data = {}
+            for task_type in self.all_tasks:
+                data[task_type] = {name: task_info.to_dict() for name, task_info in self.all_tasks[task_type].items()}
+            try:
+                tmp_path = '%s.tmp' % self.persist_path
+                os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.rename(tmp_path, self.persist_path)
+            except:
+                log.get_logger().exception("dump tasks to %s failed", self.persist_path)
 
     def get_task_info(self, name, task_type=DEFAULT_TASK_TYPE):
         ret = None
@@ -98,6 +205,113 @@ class TaskManager(object):
         log.get_logger().info("register task %s", name)
         self.all_tasks[task_type][name] = task_info
         self.lock.release()
+        self.dump()
+
+
+def run_task(name, task_info, func, *args, **kwargs):
+    _CURRENT.task_info = task_info
+    try:
+        log.get_logger().info("start run task %s", name)
+        task_info.run()
+        get_task_manager().dump()
+        task_info.check_cancelled()
+        task_info.ret = func(*args, **kwargs)
+        log.get_logger().info("task %s run finished", name)
+        task_info.success()
+        log.get_logger().info("task %s finished successful", name)
+    except BaseException as ex:
+        msg = "task {0} got exception".format(name)
+        log.get_logger().exception(msg)
+        task_info.exception = ex
+        task_info.fail()
+        log.get_logger().info("task %s finished failed", name)
+    finally:
+        _CURRENT.task_info = None
+        get_task_manager().dump()
+
+
+@singleton
+class TaskEngine(object):
+
+    """
+    Run the tasks on a bounded pool of workers. The tasks with the same key, such as the tasks of one deployment,
+    run one after another while the tasks with different keys run concurrently. A task waiting for the one before it
+    with the same key is only handed to the pool when that one finishes, so it does not hold a worker.
+    """
+
+    MAX_WORKERS = 4
+
+    def __init__(self):
+        self.lock = RLock()
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix='obd-task')
+        # (task_type, name) -> (key, future) of the tasks handed to the pool
+        self.futures = {}
+        # key -> the tasks waiting for the running task of the key
+        self.waiting = defaultdict(deque)
+        self.busy_keys = set()
+
+    def submit(self, name, func, *args, task_type=DEFAULT_TASK_TYPE, key=None, **kwargs):
+        task_manager = get_task_manager()
+        key = name if key is None else key
+        with self.lock:
+            task_info = task_manager.get_task_info(name, task_type=task_type)
+            if task_info is not None and task_info.status != TaskStatus.FINISHED:
+                raise Exception("task {0} exists and not finished".format(name))
+            task_info = TaskInfo()
+            task_manager.register_task(name, task_info, task_type=task_type)
+            job = (task_type, name, task_info, func, args, kwargs)
+            if key in self.busy_keys:
+                self.waiting[key].append(job)
+            else:
+                self.busy_keys.add(key)
+                self._start(key, job)
+        return task_info
+
+    def _start(self, key, job):
+        task_type, name = job[:2]
+        self.futures[(task_type, name)] = (key, self.executor.submit(self._run, key, job))
+
+    def _run(self, key, job):
+        task_type, name, task_info, func, args, kwargs = job
+        try:
+            run_task(name, task_info, func, *args, **kwargs)
+        finally:
+            self._next(key, task_type, name)
+
+    def _next(self, key, task_type, name):
+        with self.lock:
+            self.futures.pop((task_type, name), None)
+            if self.waiting[key]:
+                self._start(key, self.waiting[key].popleft())
+            else:
+                del self.waiting[key]
+                self.busy_keys.discard(key)
+
+    def cancel(self, name, task_type=DEFAULT_TASK_TYPE):
+        """
+        Stop a task which has not started at once, a running task stops at its next check_cancelled.
+        """
+        task_info = get_task_manager().get_task_info(name, task_type=task_type)
+        if task_info is None or task_info.status == TaskStatus.FINISHED:
+            return False
+        task_info.cancel()
+        cancelled = False
+        with self.lock:
+            for key in list(self.waiting.keys()):
+                for job in list(self.waiting[key]):
+                    if job[0] == task_type and job[1] == name:
+                        self.waiting[key].remove(job)
+                        cancelled = True
+            key, future = self.futures.get((task_type, name), (None, None))
+            if future is not None and future.cancel():
+                cancelled = True
+                # _run never runs for it, so the next task of the key is started here
+                self._next(key, task_type, name)
+        if cancelled:
+            task_info.exception = TaskCancelled('task cancelled')
+            task_info.fail()
+            get_task_manager().dump()
+        return True
 
 
 class AutoRegister(object):
@@ -113,19 +327,7 @@ class AutoRegister(object):
             task_manager = get_task_manager()
             task_info = TaskInfo()
             task_manager.register_task(name, task_info, task_type=self._task_type)
-            try:
-                log.get_logger().info("start run task %s", name)
-                task_info.run()
-                task_info.ret = func(*args, **kwargs)
-                log.get_logger().info("task %s run finished", name)
-                task_info.success()
-                log.get_logger().info("task %s finished successful", name)
-            except BaseException as ex:
-                msg = "task {0} got exception".format(name)
-                log.get_logger().exception(msg)
-                task_info.exception = ex
-                task_info.fail()
-                log.get_logger().info("task %s finished failed", name)
+            run_task(name, task_info, func, *args, **kwargs)
         return wrapper
 
 
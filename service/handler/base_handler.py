@@ -39,3 +39,6 @@ class BaseHandler(object):
     @property
     def context(self):
         return self._context
+
+    def deploy_home(self, name):
+        return core.CoreManager().get_deploy_home(name)
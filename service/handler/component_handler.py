@@ -17,8 +17,11 @@
 # You should have received a copy of the GNU General Public License
 # along with OceanBase Deploy.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
 import uuid
+import hashlib
 import tempfile
+from threading import Lock, Thread
 from service.handler.base_handler import BaseHandler
 from service.model.components import Component, ComponentInfo, ConfigParameter, ParameterMeta
 from service.common import log
@@ -52,6 +55,69 @@ def map_to_config_parameter(param, is_cn):
 @singleton
 class ComponentHandler(BaseHandler):
 
+    def __init__(self):
+        super(ComponentHandler, self).__init__()
+        # (signature of the mirrors, etag, components by name, component list)
+        self._catalog = None
+        self._catalog_lock = Lock()
+        self._refresh_lock = Lock()
+        self._refreshing = False
+
+    @staticmethod
+    def __file_signature(path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    def __catalog_signature(self):
+        local_mirror = self.obd.mirror_manager.local_mirror
+        signature = [self.__file_signature(local_mirror.catalog_path), len(local_mirror.db)]
+        for mirror in self.obd.mirror_manager.get_remote_mirrors():
+            signature.append((mirror.section_name, mirror.repo_age, mirror.repomd_age, self.__file_signature(mirror.get_catalog_file(mirror.mirror_path))))
+        return tuple(signature)
+
+    def __get_catalog(self):
+        catalog = self._catalog
+        if catalog is None:
+            return self.__build_catalog()
+        if catalog[0] != self.__catalog_signature():
+            # the old catalog is served until the new one is built
+            self.refresh_catalog()
+        return catalog
+
+    def __build_catalog(self):
+        signature = self.__catalog_signature()
+        with self._catalog_lock:
+            catalog = self._catalog
+            if catalog is None or catalog[0] != signature:
+                log.get_logger().info("rebuild component catalog")
+                component_dict = self.__get_all_components()
+                etag = '"%s"' % hashlib.md5(repr(signature).encode('utf-8')).hexdigest()
+                catalog = self._catalog = (signature, etag, component_dict, self.__build_component_list(component_dict))
+        return catalog
+
+    def refresh_catalog(self):
+        """
+        Rebuild the catalog in the background after a mirror is updated. The requests are served from the old
+        catalog until the new one is ready.
+        """
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self.__build_catalog()
+            except:
+                log.get_logger().exception("refresh component catalog failed")
+            finally:
+                self._refreshing = False
+        thread = Thread(target=refresh, name='component-catalog')
+        thread.daemon = True
+        thread.start()
 
     def __get_all_components(self, component_filter=const.VERSION_FILTER):
         local_packages = self.obd.mirror_manager.local_mirror.get_all_pkg_info()
@@ -97,10 +163,17 @@ class ComponentHandler(BaseHandler):
         return component_dict
 
     def list_components(self):
+        """
+        Return (etag, components) of the same catalog, the etag changes whenever the components may change.
+        """
         if self.context['mirror']['remote_mirror_info_status'] != const.FINISHED:
             raise Exception("startup event mirror update still not finished")
+        catalog = self.__get_catalog()
+        return catalog[1], list(catalog[3])
+
+    def __build_component_list(self, component_dict):
         component_list = list()
-        component_dict = self.__get_all_components()
+        component_dict = defaultdict(list, [(name, [info.copy() for info in infos]) for name, infos in component_dict.items()])
         for componentInfo in component_dict[const.OCEANBASE_CE]:
             componentInfo.version_type = const.CE
         for componentInfo in component_dict[const.OCEANBASE]:
@@ -140,13 +213,17 @@ class ComponentHandler(BaseHandler):
         return component_list
 
     def get_component(self, component_name):
+        """
+        Return (etag, component) of the same catalog, the component is None if it is not found.
+        """
         if self.context['mirror']['remote_mirror_info_status'] != const.FINISHED:
             raise Exception("startup event mirror update still not finished")
         component = None
-        component_dict = self.__get_all_components()
+        catalog = self.__get_catalog()
+        component_dict = catalog[2]
         if component_name in component_dict.keys():
-            component = Component(name=component_name, info=component_dict[component_name])
-        return component
+            component = Component(name=component_name, info=list(component_dict[component_name]))
+        return catalog[1], component
 
 
     def list_component_parameters(self, parameter_request, accept_language):
@@ -182,12 +259,12 @@ class ComponentHandler(BaseHandler):
             ## use plugin.params to generate parameter meta
             config_parameters = list()
             is_cn = 'zh-CN' in accept_language
-            for param in parameter_plugin.params.values():
+            params = parameter_plugin.essential_params if parameter_filter.is_essential_only else parameter_plugin.params.values()
+            for param in params:
                 config_parameter = map_to_config_parameter(param, is_cn)
                 if config_parameter.name in auto_keys:
                     config_parameter.auto = True
-                if config_parameter.is_essential or not parameter_filter.is_essential_only:
-                    config_parameters.append(config_parameter)
+                config_parameters.append(config_parameter)
             parameter_metas.append(ParameterMeta(component=parameter_filter.component, version=parameter_filter.version, config_parameters=config_parameters))
             self.obd.deploy_manager.remove_deploy_config(name)
         return parameter_metas
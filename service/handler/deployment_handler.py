@@ -19,7 +19,9 @@
 
 import json
 import tempfile
+from threading import Lock
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from uuid import uuid1 as uuid
 from optparse import Values
 from singleton_decorator import singleton
@@ -28,12 +30,13 @@ from _deploy import DeployStatus, DeployConfigStatus
 from _errno import CheckStatus, FixEval
 from service.api.v1.deployments import DeploymentInfo
 from service.handler.base_handler import BaseHandler
+from service.handler.component_handler import ComponentHandler
 from service.model.deployments import DeploymentConfig, PreCheckResult, RecoverChangeParameter, TaskInfo, \
     ComponentInfo, PrecheckTaskResult, \
     DeployMode, ConnectionInfo, PreCheckInfo, RecoverAdvisement, DeploymentReport, Deployment, Auth, DeployConfig, \
     DeploymentStatus, Parameter
 
-from service.common import log, task, util, const
+from service.common import log, task, util, const, core
 from service.common.task import TaskStatus, TaskResult
 from service.common.task import Serial as serial
 from service.common.task import AutoRegister as auto_register
@@ -264,80 +267,139 @@ class DeploymentHandler(BaseHandler):
         return all_passed, finished, total
 
     @serial("install")
-    def install(self, name, background_tasks):
-        task_manager = task.get_task_manager()
-        task_info = task_manager.get_task_info(name, task_type="install")
-        if task_info is not None and task_info.status != TaskStatus.FINISHED:
-            raise Exception("task {0} exists and not finished".format(name))
-        task_manager.del_task_info(name, task_type="install")
-        background_tasks.add_task(self._do_install, name)
+    def install(self, name):
+        # every deployment is installed in its own ObdHome, the installs of different deployments run concurrently
+        task.get_task_engine().submit(name, self._do_install, name, task_type="install", key=name)
+
+    def cancel_install(self, name):
+        return task.get_task_engine().cancel(name, task_type="install")
+
+    def _check_install_cancelled(self, obd, task_info):
+        if task_info.cancelled:
+            obd.set_options(Values())
+            task_info.check_cancelled()
+
+    def _init_trace(self, home, component, stdio):
+        trace_id = str(uuid())
+        home.context['component_trace'][component] = trace_id
+        home.context['component_stdio'][component] = stdio
+        return stdio.init_trace_logger(self.obd.stdio.log_path, trace_id=trace_id, recreate=True)
 
-    @auto_register("install")
     def _do_install(self, name):
+        task_info = task.current_task()
+        home = self.deploy_home(name)
+        obd = home.obd
+        deploy = self.obd.deploy_manager.get_deploy_config(name)
+        if not deploy:
+            raise Exception("no such deploy {0}".format(name))
+        obd.set_deploy(deploy)
         log.get_logger().info("clean io buffer before start install")
-        self.buffer.clear()
+        home.buffer.clear()
         log.get_logger().info("clean namespace for init")
-        for c in self.obd.deploy.deploy_config.components:
+        for c in obd.deploy.deploy_config.components:
             for plugin in const.INIT_PLUGINS:
-                self.obd.namespaces[c].set_return(plugin, None)
+                obd.get_namespace(c).set_return(plugin, None)
         log.get_logger().info("clean namespace for start")
-        for component in self.obd.deploy.deploy_config.components:
+        for component in obd.deploy.deploy_config.components:
             for plugin in const.START_PLUGINS:
-                self.obd.namespaces[component].set_return(plugin, None)
+                obd.get_namespace(component).set_return(plugin, None)
 
         log.get_logger().info("start do deploy %s", name)
-        self.obd.set_options(Values())
-        trace_id = str(uuid())
-        self.context['component_trace']['deploy'] = trace_id
-        ret = self.obd.stdio.init_trace_logger(self.obd.stdio.log_path, trace_id=trace_id, recreate=True)
-        if ret is False:
+        task_info.progress(finished=0, total=len(obd.deploy.deploy_config.components) + 1, current='deploy')
+        obd.set_options(Values())
+        if self._init_trace(home, 'deploy', obd.stdio) is False:
             log.get_logger().warn("component deploy log init error")
-        deploy_success = self.obd.deploy_cluster(name)
+        deploy_success = obd.deploy_cluster(name)
+        # the packages of the deployment may have been downloaded to the local mirror
+        ComponentHandler().refresh_catalog()
         if not deploy_success:
             log.get_logger().warn("deploy %s failed", name)
         log.get_logger().info("finish do deploy %s", name)
+        task_info.progress(finished=1)
+        self._check_install_cancelled(obd, task_info)
         log.get_logger().info("start do start %s", name)
 
-        repositories = self.obd.load_local_repositories(self.obd.deploy.deploy_info, False)
-        repositories = self.obd.sort_repository_by_depend(repositories, self.obd.deploy.deploy_config)
-        start_success = True
-        connection_info_list = list()
-        for repository in repositories:
-            opt = Values()
-            setattr(opt, "components", repository.name)
-            self.obd.set_options(opt)
-            trace_id = str(uuid())
-            self.context['component_trace'][repository.name] = trace_id
-            ret = self.obd.stdio.init_trace_logger(self.obd.stdio.log_path, trace_id=trace_id, recreate=True)
-            if ret is False:
-                log.get_logger().warn("component: {}, start log init error".format(repository.name))
-            ret = self.obd._start_cluster(self.obd.deploy, repositories)
-            if not ret:
-                log.get_logger().warn("failed to start component: %s", repository.name)
-                start_success = False
-            else:
-                display_ret = self.obd.namespaces[repository.name].get_return("display")
-                connection_info = self.__build_connection_info(repository.name, display_ret.get_return("info"))
-                if connection_info is not None:
-                    connection_info_list.append(connection_info)
-        self.obd.set_options(Values)
+        repositories = obd.load_local_repositories(obd.deploy.deploy_info, False)
+        repositories = obd.sort_repository_by_depend(repositories, obd.deploy.deploy_config)
+        results = self._start_components(home, repositories, task_info)
+        start_success = len(results) == len(repositories) and all([ret for ret, _ in results.values()])
+        connection_info_list = [results[repository.name][1] for repository in repositories if repository.name in results and results[repository.name][1] is not None]
+        self._check_install_cancelled(obd, task_info)
+        obd.set_options(Values())
         if not deploy_success:
             raise Exception("task {0} deploy failed".format(name))
         if not start_success:
             raise Exception("task {0} start failed".format(name))
-        self.obd.deploy.update_deploy_status(DeployStatus.STATUS_RUNNING)
+        obd.deploy.update_deploy_status(DeployStatus.STATUS_RUNNING)
         log.get_logger().info("finish do start %s", name)
-        self.context["connection_info"][name] = connection_info_list
+        home.context["connection_info"][name] = connection_info_list
         deployment_report = self.get_deployment_report(name)
-        self.context["deployment_report"][name] = deployment_report
-        self.obd.deploy.deploy_config.dump()
-        self.obd.set_deploy(None)
+        home.context["deployment_report"][name] = deployment_report
+        obd.deploy.deploy_config.dump()
+        obd.set_deploy(None)
+
+    def _start_components(self, home, repositories, task_info):
+        """
+        Start the components in the order of their dependencies. A component starts as soon as the components
+        it depends on are done, so the independent ones run concurrently, such as obagent and obproxy once oceanbase is up.
+        Return (success, connection info) of every component which has been started.
+        """
+        obd = home.obd
+        deploy_config = obd.deploy.deploy_config
+        names = set([repository.name for repository in repositories])
+        pending = list(repositories)
+        results = {}
+        futures = {}
+        progress_lock = Lock()
+        with ThreadPoolExecutor(max_workers=max(len(repositories), 1), thread_name_prefix='obd-start') as executor:
+            while pending or futures:
+                if not task_info.cancelled:
+                    for repository in list(pending):
+                        depends = [depend for depend in deploy_config.components[repository.name].depends if depend in names]
+                        if all(depend in results for depend in depends):
+                            pending.remove(repository)
+                            futures[executor.submit(self._start_component, home, repository, repositories, task_info, progress_lock)] = repository
+                    if pending and not futures:
+                        # the dependencies are cyclic, start the rest one by one in the sorted order
+                        repository = pending.pop(0)
+                        futures[executor.submit(self._start_component, home, repository, repositories, task_info, progress_lock)] = repository
+                elif not futures:
+                    break
+                done, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    repository = futures.pop(future)
+                    try:
+                        results[repository.name] = future.result()
+                    except:
+                        log.get_logger().exception("failed to start component: %s", repository.name)
+                        results[repository.name] = (False, None)
+        return results
+
+    def _start_component(self, home, repository, repositories, task_info, progress_lock):
+        # every branch has its own options and trace, the deploy and the namespaces are shared
+        opt = Values()
+        setattr(opt, "components", repository.name)
+        stdio = core.new_stdio(home.buffer, home.obd.stdio.msg_lv)
+        obd = home.obd.fork(options=opt, stdio=stdio)
+        with progress_lock:
+            task_info.progress(current=repository.name)
+        if self._init_trace(home, repository.name, stdio) is False:
+            log.get_logger().warn("component: {}, start log init error".format(repository.name))
+        ret = obd._start_cluster(obd.deploy, repositories)
+        with progress_lock:
+            task_info.progress(finished=task_info.finished + 1)
+        if not ret:
+            log.get_logger().warn("failed to start component: %s", repository.name)
+            return False, None
+        display_ret = obd.namespaces[repository.name].get_return("display")
+        return True, self.__build_connection_info(repository.name, display_ret.get_return("info"))
 
     def get_install_task_info(self, name):
         task_info = task.get_task_manager().get_task_info(name, task_type="install")
         if task_info is None:
             raise Exception("task {0} not found".format(name))
         deploy = self.get_deploy(name)
+        namespaces = self.deploy_home(name).obd.namespaces
         components = deploy.deploy_config.components
         total_count = (len(const.START_PLUGINS) + len(const.INIT_PLUGINS)) * len(components)
         finished_count = 0
@@ -348,24 +410,24 @@ class DeploymentHandler(BaseHandler):
         for component in components:
             info_dict[component] = ComponentInfo(component=component, status=TaskStatus.PENDING,
                                                  result=TaskResult.RUNNING)
-            if component in self.obd.namespaces:
+            if component in namespaces:
                 for plugin in const.INIT_PLUGINS:
-                    if self.obd.namespaces[component].get_return(plugin) is not None:
+                    if namespaces[component].get_return(plugin) is not None:
                         info_dict[component].status = TaskStatus.RUNNING
                         finished_count += 1
                         current = "{0}: {1} finished".format(component, plugin)
-                        if not self.obd.namespaces[component].get_return(plugin):
+                        if not namespaces[component].get_return(plugin):
                             info_dict[component].result = TaskResult.FAILED
 
         for component in components:
             for plugin in const.START_PLUGINS:
-                if component not in self.obd.namespaces:
+                if component not in namespaces:
                     break
-                if self.obd.namespaces[component].get_return(plugin) is not None:
+                if namespaces[component].get_return(plugin) is not None:
                     info_dict[component].status = TaskStatus.RUNNING
                     finished_count += 1
                     current = "{0}: {1} finished".format(component, plugin)
-                    if not self.obd.namespaces[component].get_return(plugin):
+                    if not namespaces[component].get_return(plugin):
                         info_dict[component].result = TaskResult.FAILED
                     else:
                         if plugin == const.START_PLUGINS[-1]:
@@ -394,9 +456,10 @@ class DeploymentHandler(BaseHandler):
                               connect_url=info['cmd'] if info['type'] == 'db' else info['url'])
 
     def list_connection_info(self, name):
-        if self.context["connection_info"][name] is not None:
+        home = self.deploy_home(name)
+        if home.context["connection_info"][name] is not None:
             log.get_logger().info("get deployment {0} connection info from context".format(name))
-            return self.context["connection_info"][name]
+            return home.context["connection_info"][name]
         deploy = self.get_deploy(name)
         connection_info_list = list()
         task_info = self.get_install_task_info(name)
@@ -410,7 +473,7 @@ class DeploymentHandler(BaseHandler):
             if not start_ok:
                 log.get_logger().warn("component %s start failed", component)
                 continue
-            display_ret = self.obd.namespaces[component].get_return("display")
+            display_ret = home.obd.namespaces[component].get_return("display")
             connection_info = self.__build_connection_info(component, display_ret.get_return("info"))
             if connection_info is not None:
                 connection_info_list.append(connection_info)
@@ -419,10 +482,10 @@ class DeploymentHandler(BaseHandler):
         return connection_info_list
 
     def get_deploy(self, name):
-        if self.obd.deploy is not None and self.obd.deploy.name == name:
-            deploy = self.obd.deploy
-        else:
-            deploy = self.obd.deploy_manager.get_deploy_config(name)
+        for obd in [self.deploy_home(name).obd, self.obd]:
+            if obd.deploy is not None and obd.deploy.name == name:
+                return obd.deploy
+        deploy = self.obd.deploy_manager.get_deploy_config(name)
         if not deploy:
             raise Exception("no such deploy {0}".format(name))
         return deploy
@@ -549,14 +612,15 @@ class DeploymentHandler(BaseHandler):
 
 
     def get_deployment_report(self, name):
-        if self.context["deployment_report"][name] is not None:
+        home = self.deploy_home(name)
+        if home.context["deployment_report"][name] is not None:
             log.get_logger().info("get deployment {0} report from context".format(name))
-            return self.context["deployment_report"][name]
+            return home.context["deployment_report"][name]
         deploy = self.get_deploy(name)
         report_list = list()
         for component, config in deploy.deploy_config.components.items():
             status = TaskResult.FAILED
-            if self.obd.namespaces[component].get_return("display"):
+            if component in home.obd.namespaces and home.obd.namespaces[component].get_return("display"):
                 status = TaskResult.SUCCESSFUL
             report_list.append(
                 DeploymentReport(name=component, version=config.version, servers=[s.ip for s in config.servers],
@@ -723,12 +787,21 @@ class DeploymentHandler(BaseHandler):
                 return config_dict, old_value
         return None, None
 
-    def get_install_log_by_component(self, component_name):
-        trace_id = self.context['component_trace'][component_name]
-        cmd = 'grep -h "\[{}\]" {}* | sed "s/\[{}\] //g" '.format(trace_id, self.obd.stdio.log_path, trace_id)
-        stdout = LocalClient.execute_command(cmd).stdout
-        if not stdout:
-            trace_id = self.context['component_trace']['deploy']
-            cmd = 'grep -h "\[{}\]" {}* | sed "s/\[{}\] //g" '.format(trace_id, self.obd.stdio.log_path, trace_id)
-            stdout = LocalClient.execute_command(cmd).stdout
-        return stdout
+    def get_install_log(self, name):
+        return self.deploy_home(name).buffer.read()
+
+    def get_install_log_by_component(self, name, component_name, offset=None):
+        home = self.deploy_home(name)
+        for component in [component_name, 'deploy']:
+            trace_id = home.context['component_trace'][component]
+            if trace_id is None:
+                continue
+            ret = home.context['component_stdio'][component].read_trace_log(trace_id, offset)
+            if ret is None:
+                # the trace is not in memory, such as one logged before the service restarted
+                cmd = 'grep -h "\[{}\]" {}* | sed "s/\[{}\] //g" '.format(trace_id, self.obd.stdio.log_path, trace_id)
+                stdout = LocalClient.execute_command(cmd).stdout
+                ret = stdout[offset:], len(stdout)
+            if ret[1]:
+                return ret
+        return '', 0
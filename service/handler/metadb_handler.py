@@ -24,6 +24,7 @@ from optparse import Values
 from singleton_decorator import singleton
 
 from service.handler.base_handler import BaseHandler
+from service.handler.component_handler import ComponentHandler
 from service.common import log, task, util, const
 from service.common.task import Serial as serial
 from service.common.task import AutoRegister as auto_register
@@ -606,6 +607,8 @@ class MetadbHandler(BaseHandler):
         setattr(opt, "force", True)
         self.obd.set_options(opt)
         deploy_success = self.obd.deploy_cluster(name)
+        # the packages of the deployment may have been downloaded to the local mirror
+        ComponentHandler().refresh_catalog()
         if not deploy_success:
             log.get_logger().warn("deploy %s failed", name)
         log.get_logger().info("start %s", name)
@@ -21,6 +21,7 @@ from _errno import LockError
 from service.common import log
 from service.common import const
 from service.handler.base_handler import BaseHandler
+from service.handler.component_handler import ComponentHandler
 from singleton_decorator import singleton
 from service.model.mirror import Mirror
 
@@ -53,4 +54,5 @@ class MirrorHandler(BaseHandler):
             log.get_logger().exception("got exception {} when init mirror".format(ex))
         finally:
             self.context['mirror']['remote_mirror_info_status'] = const.FINISHED
+            ComponentHandler().refresh_catalog()
 
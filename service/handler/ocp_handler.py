@@ -27,6 +27,7 @@ import json
 from collections import defaultdict
 
 from service.handler.base_handler import BaseHandler
+from service.handler.component_handler import ComponentHandler
 from service.common import log, task, util, const
 from service.common.task import Serial as serial
 from service.common.task import AutoRegister as auto_register
@@ -719,6 +720,9 @@ class OcpHandler(BaseHandler):
         except:
             self.context['deploy_status'] = 'failed'
             raise Exception('deploy failed')
+        finally:
+            # the packages of the deployment may have been downloaded to the local mirror
+            ComponentHandler().refresh_catalog()
         log.get_logger().info("deploy %s succeed", name)
 
         repositories = self.obd.load_local_repositories(self.obd.deploy.deploy_info, False)
@@ -1307,6 +1311,8 @@ class OcpHandler(BaseHandler):
         except:
             log.get_logger().info("upgrade %s failed", app_name)
             self.context['upgrade']['succeed'] = False
+        finally:
+            ComponentHandler().refresh_catalog()
 
     def _ocp_upgrade_use_obd(self, repositories, deploy):
         deploy_config = deploy.deploy_config
@@ -20,33 +20,42 @@
 
 from __future__ import absolute_import, division, print_function
 
+import atexit
 import enum
 import getpass
 import os
+import stat
+import tarfile
 import tempfile
+import threading
+import time
+import uuid
 import warnings
+from collections import OrderedDict
 from glob import glob
+from io import BytesIO
 
 from subprocess32 import Popen, PIPE
+try:
+    from shlex import quote as shell_quote
+except ImportError:
+    from pipes import quote as shell_quote
 
 # paramiko import cryptography 模块在python2下会报不支持警报
 warnings.filterwarnings("ignore")
 
-from paramiko import AuthenticationException, SFTPClient
-from paramiko.client import SSHClient, AutoAddPolicy
-from paramiko.ssh_exception import NoValidConnectionsError, SSHException
+# paramiko and cryptography take most of the import time of obd, they are imported by the first remote call instead
 
-from multiprocessing.queues import Empty
-from multiprocessing import Queue, Process
 from multiprocessing.pool import ThreadPool
+from six.moves import queue
 
 from tool import COMMAND_ENV, DirectoryUtil, FileUtil, NetUtil, Timeout
 from _stdio import SafeStdio
 from _errno import EC_SSH_CONNECT
-from _environ import ENV_DISABLE_RSYNC, ENV_DISABLE_RSA_ALGORITHMS, ENV_HOST_IP_MODE
+from _environ import ENV_DISABLE_RSYNC, ENV_DISABLE_RSA_ALGORITHMS, ENV_HOST_IP_MODE, ENV_DISABLE_SSH_POOL, ENV_DISABLE_TAR_TRANSPORT, ENV_DISABLE_FILE_CACHE
 
 
-__all__ = ("SshClient", "SshConfig", "LocalClient", "ConcurrentExecutor")
+__all__ = ("SshClient", "SshConfig", "LocalClient", "ConcurrentExecutor", "SshConnectionPool", "BatchCommand", "RemoteTransporter", "FanoutDistributor")
 
 
 class SshConfig(object):
@@ -63,6 +72,250 @@ class SshConfig(object):
         return '%s@%s' % (self.username ,self.host)
 
 
+class PooledConnection(object):
+
+    def __init__(self, key, ssh_client):
+        self.key = key
+        self.ssh_client = ssh_client
+        self.borrowers = 0
+        self.channels = 0
+        self.broken = False
+        self.last_used = time.time()
+
+    def is_active(self):
+        if self.broken or self.ssh_client is None:
+            return False
+        transport = self.ssh_client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def check(self):
+        # an idle transport may have been dropped silently by a firewall, so probe it before lending it again
+        if not self.is_active():
+            return False
+        try:
+            self.ssh_client.get_transport().send_ignore()
+            return True
+        except Exception:
+            self.broken = True
+            return False
+
+    def close(self):
+        if self.ssh_client is None:
+            return
+        try:
+            self.ssh_client.close()
+        except Exception:
+            pass
+
+
+class SshConnectionPool(object):
+
+    """
+    Host keyed pool of ssh transports.
+    Every borrower opens its own paramiko channel on a shared transport, so exec and sftp sessions of the same host do not pay for a new handshake.
+    A transport is lent to at most max_sessions borrowers, and at most max_channels channels are open on it at the same time,
+    which stays below the MaxSessions of sshd (10 by default). A borrower waits when all the transports of the host are full.
+    """
+
+    def __init__(self, max_size=256, max_connections=4, max_sessions=4, max_channels=8, idle_timeout=300, check_interval=30, wait_timeout=60):
+        self.max_size = max_size
+        self.max_connections = max_connections
+        self.max_sessions = max_sessions
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.wait_timeout = wait_timeout
+        # a reentrant lock, the release of a garbage collected SshClient may happen on a thread which holds it
+        self._lock = threading.Condition(threading.RLock())
+        self._pid = os.getpid()
+        self._connections = {}
+
+    @staticmethod
+    def get_key(config):
+        return (config.host, config.port, config.username, config.password, config.key_filename)
+
+    @property
+    def disabled(self):
+        return COMMAND_ENV.get(ENV_DISABLE_SSH_POOL) == "1"
+
+    def size(self):
+        return sum([len(conns) for conns in self._connections.values()])
+
+    def _check_pid(self):
+        # transports can not be shared with a forked child process
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._connections = {}
+            self._lock = threading.Condition(threading.RLock())
+
+    @staticmethod
+    def _close(conns):
+        # closing a transport may wait for the network, so it is never done under the lock
+        for conn in conns:
+            conn.close()
+
+    def _remove(self, conn):
+        conns = self._connections.get(conn.key, [])
+        if conn in conns:
+            conns.remove(conn)
+            if not conns:
+                del self._connections[conn.key]
+        return conn
+
+    def _evict(self, now):
+        removed = []
+        idle_conns = []
+        for conns in list(self._connections.values()):
+            for conn in list(conns):
+                if conn.borrowers:
+                    continue
+                if not conn.is_active() or now - conn.last_used > self.idle_timeout:
+                    removed.append(self._remove(conn))
+                else:
+                    idle_conns.append(conn)
+        overflow = self.size() - self.max_size + 1
+        if overflow > 0:
+            idle_conns.sort(key=lambda conn: conn.last_used)
+            for conn in idle_conns[:overflow]:
+                removed.append(self._remove(conn))
+        return removed
+
+    def _choose(self, key):
+        candidate = None
+        for conn in self._connections.get(key, []):
+            if not conn.is_active() or conn.borrowers >= self.max_sessions:
+                continue
+            if candidate is None or (conn.borrowers, conn.channels) < (candidate.borrowers, candidate.channels):
+                candidate = conn
+        return candidate
+
+    def _is_full(self, key):
+        # every connection slot of the host is taken, and they are connecting or lent to max_sessions borrowers
+        return len(self._connections.get(key, [])) >= self.max_connections
+
+    def acquire(self, config, connector):
+        if self.disabled:
+            return connector()
+        key = self.get_key(config)
+        start_time = time.time()
+        while True:
+            unpooled = False
+            with self._lock:
+                self._check_pid()
+                lock = self._lock
+                now = time.time()
+                removed = self._evict(now)
+                conn = self._choose(key)
+                if conn:
+                    idle_time = now - conn.last_used if conn.borrowers == 0 else 0
+                    conn.borrowers += 1
+                    conn.last_used = now
+                elif self._is_full(key):
+                    conn = None
+                    if now - start_time > self.wait_timeout:
+                        # a thread which already holds all the sessions of the host would wait for itself
+                        unpooled = True
+                    elif not removed:
+                        self._lock.wait(1)
+                else:
+                    # the slot is taken before connecting, so the concurrent borrowers of the host see it
+                    conn = PooledConnection(key, None)
+                    conn.borrowers = 1
+                    self._connections.setdefault(key, []).append(conn)
+            self._close(removed)
+            if unpooled:
+                # it is closed by release since the pool does not know it
+                return connector()
+            if conn is None:
+                continue
+
+            if conn.ssh_client is None:
+                try:
+                    ssh_client = connector()
+                except BaseException:
+                    with lock:
+                        conn.broken = True
+                        self._remove(conn)
+                        lock.notify_all()
+                    raise
+                with lock:
+                    conn.ssh_client = ssh_client
+                    lock.notify_all()
+                return ssh_client
+
+            # an idle transport is probed outside the lock, only the borrower who holds it waits for the network
+            if idle_time <= self.check_interval or conn.check():
+                return conn.ssh_client
+            with lock:
+                conn.broken = True
+                conn.borrowers -= 1
+                if conn.borrowers == 0:
+                    removed = [self._remove(conn)]
+                else:
+                    removed = []
+            self._close(removed)
+
+    def _find(self, ssh_client):
+        for conns in self._connections.values():
+            for conn in conns:
+                if conn.ssh_client is ssh_client:
+                    return conn
+        return None
+
+    def release(self, ssh_client, discard=False):
+        removed = []
+        with self._lock:
+            conn = self._find(ssh_client)
+            if conn is not None:
+                conn.borrowers = max(conn.borrowers - 1, 0)
+                conn.last_used = time.time()
+                if discard:
+                    conn.broken = True
+                if conn.broken and conn.borrowers == 0:
+                    removed.append(self._remove(conn))
+                self._lock.notify_all()
+        if conn is None:
+            try:
+                ssh_client.close()
+            except Exception:
+                pass
+        self._close(removed)
+
+    def open_channel(self, ssh_client, block=True):
+        """
+        Take a channel slot of the transport of ssh_client before opening a channel on it, and give it back with close_channel.
+        Return False if block is False and all the slots are taken. A client which is not pooled is not limited.
+        """
+        with self._lock:
+            while True:
+                conn = self._find(ssh_client)
+                if conn is None:
+                    return True
+                if conn.channels < self.max_channels:
+                    conn.channels += 1
+                    return True
+                if not block:
+                    return False
+                self._lock.wait(1)
+
+    def close_channel(self, ssh_client):
+        with self._lock:
+            conn = self._find(ssh_client)
+            if conn is not None and conn.channels > 0:
+                conn.channels -= 1
+                self._lock.notify_all()
+
+    def close_all(self):
+        with self._lock:
+            removed = [conn for conns in self._connections.values() for conn in conns]
+            self._connections = {}
+        self._close(removed)
+
+
+SSH_CONNECTION_POOL = SshConnectionPool()
+atexit.register(SSH_CONNECTION_POOL.close_all)
+
+
 class SshReturn(object):
 
     def __init__(self, code, stdout, stderr):
@@ -77,6 +330,65 @@ class SshReturn(object):
         return self.__bool__()
     
 
+class BatchCommand(object):
+
+    """
+    Run many read only commands in one shell script, so they cost a single round trip.
+    Every command keeps its own stdout, stderr and exit code, which are split out of the script output by parse.
+    """
+
+    def __init__(self, commands):
+        self.commands = []
+        for command in commands:
+            if command not in self.commands:
+                self.commands.append(command)
+        self.token = 'obd_batch_%s' % uuid.uuid4().hex
+
+    @property
+    def script(self):
+        lines = ['_obd_err=`mktemp 2>/dev/null || echo /tmp/.%s`' % self.token]
+        for idx, command in enumerate(self.commands):
+            lines.append("printf '%%s\\n' '%s:%s'" % (self.token, idx))
+            lines.append('(%s) 2>$_obd_err' % command)
+            lines.append("printf '\\n%%s\\n' '%s:%s:'$?" % (self.token, idx))
+            lines.append('cat $_obd_err')
+            lines.append("printf '\\n%%s\\n' '%s:%s:end'" % (self.token, idx))
+        lines.append('rm -f $_obd_err')
+        return '\n'.join(lines)
+
+    def parse(self, output):
+        returns = {}
+        pos = 0
+        for idx, command in enumerate(self.commands):
+            begin = '%s:%s\n' % (self.token, idx)
+            code_mark = '\n%s:%s:' % (self.token, idx)
+            end = '\n%s:%s:end\n' % (self.token, idx)
+            start = output.find(begin, pos)
+            if start == -1:
+                break
+            start += len(begin)
+            code_start = output.find(code_mark, start)
+            if code_start == -1:
+                break
+            code_end = output.find('\n', code_start + len(code_mark))
+            stop = output.find(end, code_end)
+            if code_end == -1 or stop == -1:
+                break
+            try:
+                code = int(output[code_start + len(code_mark):code_end])
+            except ValueError:
+                break
+            returns[command] = SshReturn(code, output[start:code_start], output[code_end + 1:stop])
+            pos = stop + len(end)
+        return returns
+
+    def execute(self, client, timeout=None, stdio=None):
+        if not self.commands:
+            return {}
+        ret = client.execute_command(self.script, timeout=timeout, stdio=stdio)
+        return self.parse(ret.stdout) if ret.stdout else {}
+
+
 class FeatureSshReturn(SshReturn, SafeStdio):
 
     def __init__(self, popen, timeout, stdio):
@@ -159,7 +471,10 @@ class ConcurrentExecutor(object):
     @staticmethod
     def execute(future):
         client = SshClient(future.client.config, future.stdio)
-        future.set_return(client.execute_command(future.command, timeout=future.timeout))
+        try:
+            future.set_return(client.execute_command(future.command, timeout=future.timeout))
+        finally:
+            client.close()
         return future
 
     def submit(self):
@@ -300,9 +615,549 @@ class LocalClient(SafeStdio):
                 process.terminate()
         return SshReturn(code, stdout, stderr)
 
+class SftpTransfer(object):
+
+    """
+    Pipelined sftp transfer of many files for the client transporter.
+    Remote directories, symlinks and modes are handled by one uploaded shell script before and after the transfer,
+    and the files themselves are moved by several workers, each with its own sftp channel on the shared transport.
+    """
+
+    WORKERS = 4
+    WINDOW_SIZE = 1 << 26
+    ARGS_PER_LINE = 200
+    STORE_EXPIRE_DAYS = 30
+
+    def __init__(self, client, workers=None, stdio=None):
+        self.client = client
+        self.workers = workers if workers else self.WORKERS
+        self.stdio = stdio
+        self.transferred = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lines(prefix, paths, args_per_line):
+        lines = []
+        for i in range(0, len(paths), args_per_line):
+            lines.append('%s %s' % (prefix, ' '.join([shell_quote(path) for path in paths[i:i + args_per_line]])))
+        return lines
+
+    @classmethod
+    def _mode_lines(cls, prefix, items):
+        lines = []
+        mode = None
+        paths = []
+        for path, item_mode in items:
+            if item_mode != mode and paths:
+                lines += cls._lines(prefix % mode, paths, cls.ARGS_PER_LINE)
+                paths = []
+            mode = item_mode
+            paths.append(path)
+        if paths:
+            lines += cls._lines(prefix % mode, paths, cls.ARGS_PER_LINE)
+        return lines
+
+    def open_sftp(self, block=True):
+        """
+        Open a sftp channel of a worker, or return None if block is False and the transport has no free channel.
+        """
+        from paramiko import SFTPClient
+        ssh_client = self.client.ssh_client
+        if not SSH_CONNECTION_POOL.open_channel(ssh_client, block=block):
+            return None
+        try:
+            return SFTPClient.from_transport(ssh_client.get_transport(), window_size=self.WINDOW_SIZE)
+        except:
+            SSH_CONNECTION_POOL.close_channel(ssh_client)
+            raise
+
+    def close_sftp(self, sftp):
+        try:
+            sftp.close()
+        finally:
+            SSH_CONNECTION_POOL.close_channel(self.client.ssh_client)
+
+    def run_script(self, remote_dir, lines):
+        if not lines:
+            return True
+        script_path = os.path.join(remote_dir, '.obd_transfer_%s.sh' % uuid.uuid4().hex)
+        content = '\n'.join(['cd %s || exit 1' % shell_quote(remote_dir)] + lines + [''])
+        try:
+            self.client.sftp.putfo(BytesIO(content.encode('utf-8')), script_path, confirm=False)
+        except Exception:
+            self.stdio.exception('')
+            return False
+        return bool(self.client.execute_command('sh %s; code=$?; rm -f %s; exit $code' % (shell_quote(script_path), shell_quote(script_path)), stdio=self.stdio))
+
+    def _progress(self, size):
+        with self._lock:
+            self.transferred += size
+            self.stdio.update_progressbar(self.transferred)
+
+    def _run(self, tasks, transfer, text):
+        if not tasks:
+            return True
+        total_size = sum([task[2] for task in tasks])
+        task_queue = queue.Queue()
+        # the largest files go first so that no worker ends up alone with a big file at the end
+        for task in sorted(tasks, key=lambda task: task[2], reverse=True):
+            task_queue.put(task)
+        failed = []
+        self.transferred = 0
+        start_time = time.time()
+        self.stdio.start_progressbar(text, max(total_size, 1))
+
+        def worker(index):
+            # the first worker waits for a channel, the others only run if the transport has one to spare
+            try:
+                sftp = self.open_sftp(block=index == 0)
+                if sftp is None:
+                    return
+            except Exception:
+                self.stdio.exception('')
+                sftp = None
+            try:
+                while True:
+                    try:
+                        task = task_queue.get(block=False)
+                    except queue.Empty:
+                        return
+                    if sftp is None or not transfer(sftp, task):
+                        failed.append(task[1])
+            finally:
+                sftp and self.close_sftp(sftp)
+
+        pool = ThreadPool(processes=min(self.workers, len(tasks)))
+        try:
+            pool.map(worker, range(min(self.workers, len(tasks))))
+        finally:
+            pool.close()
+        if failed:
+            self.stdio.interrupt_progressbar()
+            for path in failed:
+                self.stdio.error('Fail to transfer %s' % path)
+            return False
+        self.stdio.finish_progressbar()
+        cost = max(time.time() - start_time, 0.001)
+        self.stdio.verbose('transfer %s files, %s bytes in %.2fs, %.2f MB/s' % (len(tasks), total_size, cost, total_size / cost / (1 << 20)))
+        return True
+
+    def put_dir(self, local_dir, remote_dir):
+        dirs = []
+        links = []
+        files = []
+        for root, dir_names, file_names in os.walk(local_dir):
+            for name in dir_names + file_names:
+                local_path = os.path.join(root, name)
+                remote_path = os.path.relpath(local_path, local_dir)
+                if os.path.islink(local_path):
+                    links.append((os.readlink(local_path), remote_path))
+                elif os.path.isdir(local_path):
+                    dirs.append((remote_path, oct(os.stat(local_path).st_mode)[-3:]))
+                elif os.path.isfile(local_path):
+                    st = os.stat(local_path)
+                    files.append((local_path, remote_path, st.st_size, oct(st.st_mode)[-3:]))
+        dirs.sort()
+        lines = self._mode_lines('mkdir -p -m %s', dirs)
+        lines += self._lines('rm -fr', [task[1] for task in files], self.ARGS_PER_LINE)
+        for target, remote_path in links:
+            lines.append('ln -sfn %s %s' % (shell_quote(target), shell_quote(remote_path)))
+        if not self.run_script(remote_dir, lines):
+            return False
+        if not self._run(files, lambda sftp, task: self._put(sftp, remote_dir, task), 'Send %s to %s' % (local_dir, self.client)):
+            return False
+        files.sort(key=lambda task: task[3])
+        return self.run_script(remote_dir, self._mode_lines('chmod %s', [(task[1], task[3]) for task in files]))
+
+    def _put(self, sftp, remote_dir, task):
+        local_path, remote_path, size, _ = task[:4]
+        last = [0]
+
+        def callback(current, total):
+            self._progress(current - last[0])
+            last[0] = current
+        try:
+            with open(local_path, 'rb') as f:
+                sftp.putfo(f, os.path.join(remote_dir, remote_path), size, callback=callback, confirm=False)
+            return True
+        except Exception:
+            self.stdio.exception('')
+            return False
+
+    def put_by_digest(self, store_dir, remote_dir, files, hard_link=False):
+        """
+        Send files through a content addressed store on the remote host. files is a list of
+        (local_path, remote_path, digest) where directories and symlinks have no digest. Only the contents not found
+        in store_dir are sent, and then all of them are hard linked (or copied) from the store into remote_dir.
+        """
+        links = []
+        entries = []
+        dirs = set()
+        for local_path, remote_path, digest in files:
+            if os.path.islink(local_path):
+                links.append((os.readlink(local_path), remote_path))
+                continue
+            if os.path.isdir(local_path):
+                dirs.add(remote_path)
+                continue
+            st = os.stat(local_path)
+            mode = oct(st.st_mode)[-3:]
+            # the mode is a part of the name because all the hard links of a file share it
+            entries.append((local_path, remote_path, st.st_size, mode, '%s.%s' % (digest, mode)))
+
+        names = sorted(set([entry[4] for entry in entries]))
+        missing = set()
+        for i in range(0, len(names), self.ARGS_PER_LINE * 5):
+            ret = self.client.execute_command('mkdir -p {store} && cd {store} && for name in {names}; do [ -f "$name" ] || echo "$name"; done'.format(
+                store=shell_quote(store_dir), names=' '.join(names[i:i + self.ARGS_PER_LINE * 5])), stdio=self.stdio)
+            if not ret:
+                return False
+            missing.update(ret.stdout.split())
+
+        tasks = {}
+        for entry in entries:
+            if entry[4] in missing and entry[4] not in tasks:
+                tasks[entry[4]] = (entry[0], '%s.part' % entry[4], entry[2], entry[3], entry[4])
+        tasks = list(tasks.values())
+        self.stdio.verbose('%s: %s of %s files found in %s' % (self.client, len(entries) - len(tasks), len(entries), store_dir))
+        if tasks:
+            if not self._run(tasks, lambda sftp, task: self._put(sftp, store_dir, task), 'Send to %s' % self.client):
+                return False
+            tasks.sort(key=lambda task: task[3])
+            lines = self._mode_lines('chmod %s', [(task[1], task[3]) for task in tasks])
+            lines += ['mv -f %s %s' % (task[1], task[4]) for task in tasks]
+            if not self.run_script(store_dir, lines):
+                return False
+
+        for _, remote_path, _, _, _ in entries:
+            dirs.add(os.path.dirname(remote_path) or '.')
+        for _, remote_path in links:
+            dirs.add(os.path.dirname(remote_path) or '.')
+        lines = self._lines('mkdir -p', sorted(dirs), self.ARGS_PER_LINE)
+        lines += self._lines('rm -fr', [entry[1] for entry in entries] + [link[1] for link in links], self.ARGS_PER_LINE)
+        for _, remote_path, _, _, name in entries:
+            source = shell_quote(os.path.join(store_dir, name))
+            if hard_link:
+                lines.append('ln -f %s %s 2>/dev/null || cp -f %s %s || exit 1' % (source, shell_quote(remote_path), source, shell_quote(remote_path)))
+            else:
+                lines.append('cp -f --reflink=auto %s %s || exit 1' % (source, shell_quote(remote_path)))
+        for target, remote_path in links:
+            lines.append('ln -sfn %s %s' % (shell_quote(target), shell_quote(remote_path)))
+        # entries not linked anywhere and not used for a month are dropped
+        lines.append('cd %s || exit 1' % shell_quote(store_dir))
+        lines += self._lines('touch -c', names, self.ARGS_PER_LINE)
+        lines.append('find . -type f -links 1 -mtime +%d -delete 2>/dev/null; true' % self.STORE_EXPIRE_DAYS)
+        return self.run_script(remote_dir, lines)
+
+    def get_dir(self, local_dir, remote_dir):
+        if '*' in remote_dir:
+            remote_base_dir = os.path.dirname(remote_dir)
+        else:
+            remote_base_dir = remote_dir
+        ret = self.client.execute_command("find %s -printf '%%y %%m %%s %%p\\t%%l\\n'" % remote_dir, stdio=self.stdio)
+        if not ret:
+            return False
+        dirs = []
+        links = []
+        files = []
+        for line in ret.stdout.split('\n'):
+            if not line:
+                continue
+            try:
+                file_type, mode, size, paths = line.split(' ', 3)
+                remote_path, target = paths.split('\t', 1)
+            except ValueError:
+                continue
+            local_path = os.path.normpath(os.path.join(local_dir, os.path.relpath(remote_path, remote_base_dir)))
+            if file_type == 'd':
+                dirs.append((local_path, int(mode, 8)))
+            elif file_type == 'l':
+                links.append((target, local_path))
+            elif file_type == 'f':
+                files.append((remote_path, local_path, int(size), int(mode, 8)))
+        try:
+            for local_path, mode in sorted(dirs):
+                if not os.path.exists(local_path):
+                    os.makedirs(local_path, mode=mode)
+            for _, local_path, _, _ in files:
+                if not os.path.isdir(os.path.dirname(local_path)):
+                    os.makedirs(os.path.dirname(local_path))
+            for target, local_path in links:
+                if os.path.lexists(local_path):
+                    os.remove(local_path)
+                os.symlink(target, local_path)
+        except Exception as e:
+            self.stdio.exception('Fail to make directory in local: %s' % e)
+            return False
+
+        def get(sftp, task):
+            remote_path, local_path, size, mode = task
+            last = [0]
+
+            def callback(current, total):
+                self._progress(current - last[0])
+                last[0] = current
+            try:
+                sftp.get(remote_path, local_path, callback=callback)
+                os.chmod(local_path, stat.S_IMODE(mode))
+                return True
+            except Exception:
+                self.stdio.exception('')
+                return False
+
+        return self._run(files, get, 'Get %s from %s' % (remote_dir, self.client))
+
+
+class _TrustedTarFile(tarfile.TarFile):
+
+    # files taken from a remote server belong to the local user, like the other transporters do
+    def chown(self, *args, **kwargs):
+        pass
+
+
+class TarTransfer(object):
+
+    """
+    Stream a directory as one compressed tar archive over a single ssh exec channel.
+    Modes and symlinks are kept. zstd or lz4 is used instead of gzip when both ends support it.
+    """
+
+    BUFFER_SIZE = 1 << 20
+    CODECS = ['zstd', 'lz4', 'gzip']
+
+    def __init__(self, client, codec='gzip', stdio=None):
+        self.client = client
+        self.codec = codec
+        self.stdio = stdio
+
+    @staticmethod
+    def local_codecs():
+        codecs = ['gzip']
+        try:
+            import zstandard
+            codecs.append('zstd')
+        except ImportError:
+            pass
+        try:
+            import lz4.frame
+            codecs.append('lz4')
+        except ImportError:
+            pass
+        return codecs
+
+    @classmethod
+    def choose_codec(cls, remote_codecs):
+        local_codecs = cls.local_codecs()
+        for codec in cls.CODECS:
+            if codec in local_codecs and codec in remote_codecs:
+                return codec
+        return None
+
+    def _compressor(self, fileobj):
+        if self.codec == 'zstd':
+            import zstandard
+            return zstandard.ZstdCompressor(level=3).stream_writer(fileobj, closefd=False), 'w|'
+        if self.codec == 'lz4':
+            import lz4.frame
+            return lz4.frame.LZ4FrameFile(fileobj, mode='wb'), 'w|'
+        return fileobj, 'w|gz'
+
+    def _decompressor(self, fileobj):
+        if self.codec == 'zstd':
+            import zstandard
+            return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False), 'r|'
+        if self.codec == 'lz4':
+            import lz4.frame
+            return lz4.frame.LZ4FrameFile(fileobj, mode='rb'), 'r|'
+        return fileobj, 'r|gz'
+
+    def _remote_pipe(self, compress):
+        if self.codec == 'zstd':
+            return ('zstd -q -c', '') if compress else ('zstd -q -dc', '')
+        if self.codec == 'lz4':
+            return ('lz4 -q -c', '') if compress else ('lz4 -q -dc', '')
+        return ('', 'z')
+
+    def _open_channel(self, command):
+        ssh_client = self.client.ssh_client
+        SSH_CONNECTION_POOL.open_channel(ssh_client)
+        try:
+            channel = ssh_client.get_transport().open_session(window_size=SftpTransfer.WINDOW_SIZE)
+            channel.exec_command('(%s %s)' % (self.client.env_str, command))
+        except:
+            SSH_CONNECTION_POOL.close_channel(ssh_client)
+            raise
+        return channel
+
+    def _close_channel(self, channel):
+        channel.close()
+        SSH_CONNECTION_POOL.close_channel(self.client.ssh_client)
+
+    def _finish(self, channel):
+        error = channel.makefile_stderr('rb').read().decode(errors='replace')
+        code = channel.recv_exit_status()
+        self._close_channel(channel)
+        if code:
+            self.stdio.verbose('exited code %s, error output:\n%s' % (code, error))
+            return False
+        return True
+
+    @staticmethod
+    def extract_command(remote_dir, codec_cmd='', tar_flag=''):
+        # the modes of the archive are kept whatever the umask of the remote shell is, as the sftp transporter does
+        return 'mkdir -p {dir} && {codec}tar -x{flag}p -U --no-same-owner -C {dir} -f -'.format(
+            dir=shell_quote(remote_dir), codec='%s | ' % codec_cmd if codec_cmd else '', flag=tar_flag)
+
+    def put_dir(self, local_dir, remote_dir):
+        codec_cmd, tar_flag = self._remote_pipe(compress=False)
+        command = self.extract_command(remote_dir, codec_cmd, tar_flag)
+        self.stdio.verbose('%s stream %s to %s with %s tar' % (self.client, local_dir, remote_dir, self.codec))
+        start_time = time.time()
+        channel = self._open_channel(command)
+        try:
+            stream = channel.makefile('wb', self.BUFFER_SIZE)
+            compressor, mode = self._compressor(stream)
+            archive = tarfile.open(fileobj=compressor, mode=mode, bufsize=self.BUFFER_SIZE)
+            for name in sorted(os.listdir(local_dir)):
+                archive.add(os.path.join(local_dir, name), arcname=name)
+            archive.close()
+            if compressor is not stream:
+                compressor.close()
+            stream.flush()
+            channel.shutdown_write()
+        except Exception:
+            self.stdio.exception('')
+            self._close_channel(channel)
+            return False
+        ret = self._finish(channel)
+        self.stdio.verbose('stream %s to %s in %.2fs' % (local_dir, remote_dir, time.time() - start_time))
+        return ret
+
+    def get_dir(self, local_dir, remote_dir):
+        if '*' in remote_dir:
+            tar_dir, names = os.path.dirname(remote_dir), os.path.basename(remote_dir)
+        else:
+            tar_dir, names = remote_dir, '.'
+        codec_cmd, tar_flag = self._remote_pipe(compress=True)
+        command = 'cd {dir} && tar -c{flag}f - {names}{codec}'.format(
+            dir=shell_quote(tar_dir), names=names, flag=tar_flag, codec=' | %s' % codec_cmd if codec_cmd else '')
+        self.stdio.verbose('%s stream %s to %s with %s tar' % (self.client, remote_dir, local_dir, self.codec))
+        start_time = time.time()
+        channel = self._open_channel(command)
+        try:
+            channel.shutdown_write()
+            stream = channel.makefile('rb', self.BUFFER_SIZE)
+            decompressor, mode = self._decompressor(stream)
+            archive = _TrustedTarFile.open(fileobj=decompressor, mode=mode, bufsize=self.BUFFER_SIZE)
+            if hasattr(tarfile, 'fully_trusted_filter'):
+                archive.extractall(local_dir, filter='fully_trusted')
+            else:
+                archive.extractall(local_dir)
+            archive.close()
+        except Exception:
+            self.stdio.exception('')
+            self._close_channel(channel)
+            return False
+        ret = self._finish(channel)
+        self.stdio.verbose('stream %s to %s in %.2fs' % (remote_dir, local_dir, time.time() - start_time))
+        return ret
+
+
+class FanoutDistributor(object):
+
+    """
+    Distribute the same files to many hosts as a tree. The control machine uploads to `fanout` seeds and every
+    host that has the files relays them to up to `fanout` more hosts, so the number of rounds grows with
+    log(hosts) instead of the control machine sending everything itself.
+    push(target) uploads from the control machine and relay(source, target) copies from host to host,
+    both return bool. Targets whose relay fails are pushed from the control machine at last.
+    """
+
+    MAX_WORKERS = 64
+
+    def __init__(self, fanout, stdio=None):
+        self.fanout = max(int(fanout), 1)
+        self.stdio = stdio
+
+    @staticmethod
+    def _interleave(targets, zones):
+        # seeds of the first rounds should be spread over zones, later relays stay inside a zone
+        groups = OrderedDict()
+        for target in targets:
+            groups.setdefault(zones.get(target), []).append(target)
+        ordered = []
+        while groups:
+            for zone in list(groups.keys()):
+                ordered.append(groups[zone].pop(0))
+                if not groups[zone]:
+                    del groups[zone]
+        return ordered
+
+    def _pair(self, sources, pending, zones):
+        pairs = []
+        for source in sources:
+            if not pending:
+                break
+            target = pending[0]
+            if source is not None:
+                for candidate in pending:
+                    if zones.get(candidate) == zones.get(source):
+                        target = candidate
+                        break
+            pending.remove(target)
+            pairs.append((source, target))
+        return pairs
+
+    def distribute(self, targets, push, relay, zones=None):
+        zones = zones or {}
+        pending = self._interleave(targets, zones)
+        sources = [None] * self.fanout
+        results = {}
+        fallback = []
+
+        def run(pair):
+            source, target = pair
+            try:
+                if source is None:
+                    return push(target)
+                return relay(source, target)
+            except Exception:
+                self.stdio and self.stdio.exception('')
+                return False
+
+        def run_round(pairs):
+            pool = ThreadPool(processes=min(len(pairs), self.MAX_WORKERS))
+            try:
+                return pool.map(run, pairs)
+            finally:
+                pool.close()
+
+        rounds = 0
+        while pending:
+            rounds += 1
+            pairs = self._pair(sources, pending, zones)
+            for (source, target), ret in zip(pairs, run_round(pairs)):
+                if ret:
+                    results[target] = True
+                    sources += [target] * self.fanout
+                elif source is None:
+                    results[target] = False
+                else:
+                    self.stdio and self.stdio.verbose('relay from %s to %s failed, push it from the control machine' % (source, target))
+                    fallback.append(target)
+        if fallback:
+            rounds += 1
+            pairs = [(None, target) for target in fallback]
+            for target, ret in zip(fallback, run_round(pairs)):
+                results[target] = ret
+        self.stdio and self.stdio.verbose('distributed to %d hosts in %d rounds, %d relays fell back' % (len(results), rounds, len(fallback)))
+        return results
+
+
 class RemoteTransporter(enum.Enum):
     CLIENT = 0
     RSYNC = 1
+    TAR = 2
 
     def __lt__(self, other):
         return self.value < other.value
@@ -316,17 +1171,18 @@ class SshClient(SafeStdio):
     DEFAULT_PATH = '/sbin:/usr/local/bin:/usr/bin:/usr/local/sbin:/usr/sbin:'
     LOCAL_HOST = ['127.0.0.1', 'localhost', '127.1', '127.0.1']
     DISABLED_ALGORITHMS = dict(pubkeys=["rsa-sha2-512", "rsa-sha2-256"])
+    TAR_FILE_THRESHOLD = 256
+    FILE_STORE_DIR = 'cache/files'
 
     def __init__(self, config, stdio=None):
         self.config = config
         self.stdio = stdio
         self.sftp = None
         self.is_connected = False
-        self.ssh_client = SSHClient()
+        self.ssh_client = None
         self.env_str = ''
         self._remote_transporter = None
-        self.task_queue = None
-        self.result_queue = None
+        self._tar_codec = None
         self._is_local = self.is_local()
         if self._is_local:
             self.env = {}
@@ -339,10 +1195,6 @@ class SshClient(SafeStdio):
             self._disabled_rsa_algorithms = self.DISABLED_ALGORITHMS
         super(SshClient, self).__init__()
 
-    def _init_queue(self):
-        self.task_queue = Queue()
-        self.result_queue = Queue()
-
     def _update_env(self):
         env = []
         for key in self.env:
@@ -391,19 +1243,11 @@ class SshClient(SafeStdio):
     def _login(self, stdio=None, exit=True):
         if self.is_connected:
             return True
+        from paramiko import AuthenticationException
+        from paramiko.ssh_exception import NoValidConnectionsError
         err = None
         try:
-            self.ssh_client.set_missing_host_key_policy(AutoAddPolicy())
-            stdio.verbose('host: %s, port: %s, user: %s, password: %s' % (self.config.host, self.config.port, self.config.username, self.config.password))
-            self.ssh_client.connect(
-                self.config.host,
-                port=self.config.port,
-                username=self.config.username,
-                password=self.config.password,
-                key_filename=self.config.key_filename,
-                timeout=self.config.timeout,
-                disabled_algorithms=self._disabled_rsa_algorithms
-            )
+            self.ssh_client = SSH_CONNECTION_POOL.acquire(self.config, lambda: self._connect(stdio=stdio))
             self.is_connected = True
         except AuthenticationException:
             stdio.exception('')
@@ -422,12 +1266,33 @@ class SshClient(SafeStdio):
             return err
         return self.is_connected
 
+    def _connect(self, stdio=None):
+        from paramiko.client import SSHClient, AutoAddPolicy
+        ssh_client = SSHClient()
+        ssh_client.set_missing_host_key_policy(AutoAddPolicy())
+        stdio.verbose('host: %s, port: %s, user: %s, password: %s' % (self.config.host, self.config.port, self.config.username, self.config.password))
+        ssh_client.connect(
+            self.config.host,
+            port=self.config.port,
+            username=self.config.username,
+            password=self.config.password,
+            key_filename=self.config.key_filename,
+            timeout=self.config.timeout,
+            disabled_algorithms=self._disabled_rsa_algorithms
+        )
+        return ssh_client
+
     def _open_sftp(self, stdio=None):
         if self.sftp:
             return True
         if self._login(stdio=stdio):
-            SFTPClient.from_transport(self.ssh_client.get_transport())
-            self.sftp = self.ssh_client.open_sftp()
+            from paramiko import SFTPClient
+            SSH_CONNECTION_POOL.open_channel(self.ssh_client)
+            try:
+                self.sftp = SFTPClient.from_transport(self.ssh_client.get_transport(), window_size=SftpTransfer.WINDOW_SIZE)
+            except:
+                SSH_CONNECTION_POOL.close_channel(self.ssh_client)
+                raise
             return True
         return False
 
@@ -441,16 +1306,23 @@ class SshClient(SafeStdio):
         return self._login(stdio=stdio, exit=exit)
 
     def reconnect(self, stdio=None):
-        self.close(stdio=stdio)
+        self.close(discard=True, stdio=stdio)
         return self.connect(stdio=stdio)
 
-    def close(self, stdio=None):
+    def close(self, discard=False, stdio=None):
         if self._is_local:
             return True
-        if self.is_connected:
-            self.ssh_client.close()
         if self.sftp:
+            try:
+                self.sftp.close()
+            except Exception:
+                pass
             self.sftp = None
+            SSH_CONNECTION_POOL.close_channel(self.ssh_client)
+        if self.is_connected:
+            self.is_connected = False
+            SSH_CONNECTION_POOL.release(self.ssh_client, discard=discard)
+            self.ssh_client = None
 
     def __del__(self):
         self.close()
@@ -458,10 +1330,17 @@ class SshClient(SafeStdio):
     def _execute_command(self, command, timeout=None, retry=3, stdio=None):
         if not self._login(stdio):
             return SshReturn(255, '', 'connect failed')
+        from paramiko.ssh_exception import SSHException
+        ssh_client = self.ssh_client
+        SSH_CONNECTION_POOL.open_channel(ssh_client)
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command(command, timeout=timeout)
-            output = stdout.read().decode(errors='replace')
-            error = stderr.read().decode(errors='replace')
+            try:
+                stdin, stdout, stderr = ssh_client.exec_command(command, timeout=timeout)
+                output = stdout.read().decode(errors='replace')
+                error = stderr.read().decode(errors='replace')
+                stdout.channel.close()
+            finally:
+                SSH_CONNECTION_POOL.close_channel(ssh_client)
             if output:
                 idx = output.rindex('\n')
                 code = int(output[idx:])
@@ -474,8 +1353,8 @@ class SshClient(SafeStdio):
             stdio.verbose(verbose_msg)
         except SSHException as e:
             if retry:
-                self.close()
-                return self._execute_command(command, retry-1, stdio)
+                self.close(discard=True)
+                return self._execute_command(command, timeout=timeout, retry=retry-1, stdio=stdio)
             else:
                 stdio.exception('')
                 stdio.critical('%s@%s connect failed: %s' % (self.config.username, self.config.host, e))
@@ -519,6 +1398,91 @@ class SshClient(SafeStdio):
         self.stdio.verbose("current remote_transporter {}".format(self._remote_transporter))
         return self._remote_transporter
 
+    @property
+    def disable_tar(self):
+        return COMMAND_ENV.get(ENV_DISABLE_TAR_TRANSPORT) == "1"
+
+    @property
+    def tar_codec(self):
+        if self._tar_codec is None:
+            self._tar_codec = ''
+            if not self._is_local and not self.disable_tar:
+                ret = self.execute_command('tar --version > /dev/null 2>&1 && echo gzip && (command -v zstd > /dev/null && echo zstd; command -v lz4 > /dev/null && echo lz4; true)', stdio=self.stdio)
+                if ret:
+                    self._tar_codec = TarTransfer.choose_codec(ret.stdout.split()) or ''
+            self.stdio.verbose("current tar codec {}".format(self._tar_codec or None))
+        return self._tar_codec
+
+    def _dir_transporter(self, count_files):
+        # rsync already streams in one session and only sends the changed files
+        if self.remote_transporter == RemoteTransporter.CLIENT and self.tar_codec and count_files() >= self.TAR_FILE_THRESHOLD:
+            return RemoteTransporter.TAR
+        return self.remote_transporter
+
+    @staticmethod
+    def _count_local_files(local_dir):
+        count = 0
+        for _, dir_names, file_names in os.walk(local_dir):
+            count += len(dir_names) + len(file_names)
+        return count
+
+    def _count_remote_files(self, remote_dir, stdio=None):
+        ret = self.execute_command('find %s | wc -l' % remote_dir, stdio=stdio)
+        try:
+            return int(ret.stdout.strip()) if ret else 0
+        except ValueError:
+            return 0
+
+    @property
+    def disable_file_cache(self):
+        return COMMAND_ENV.get(ENV_DISABLE_FILE_CACHE) == "1"
+
+    def put_files_by_digest(self, files, remote_dir, hard_link=False, stdio=None):
+        """
+        Send (local_path, remote_path, digest) files to remote_dir, skipping the contents already cached on the host.
+        remote_path is relative to remote_dir.
+        """
+        if self._is_local or self.disable_file_cache:
+            for local_path, remote_path, _ in files:
+                remote_path = os.path.join(remote_dir, remote_path)
+                if os.path.islink(local_path):
+                    if not self.execute_command('mkdir -p %s && ln -sfn %s %s' % (
+                            shell_quote(os.path.dirname(remote_path)), shell_quote(os.readlink(local_path)), shell_quote(remote_path)), stdio=stdio):
+                        return False
+                elif os.path.isdir(local_path):
+                    if not self.execute_command('mkdir -p %s' % shell_quote(remote_path), stdio=stdio):
+                        return False
+                elif not self.put_file(local_path, remote_path, stdio=stdio):
+                    return False
+            return True
+        if not self._open_sftp(stdio=stdio):
+            return False
+        ret = self.execute_command('echo ${OBD_HOME:-"$HOME"}/.obd', stdio=stdio)
+        if not ret:
+            return False
+        store_dir = os.path.join(ret.stdout.strip(), self.FILE_STORE_DIR)
+        return SftpTransfer(self, stdio=stdio).put_by_digest(store_dir, remote_dir, files, hard_link=hard_link)
+
+    def relay_dir(self, target, source_dir, target_dir, names=None, stdio=None):
+        """
+        Copy source_dir on this host to target_dir on the target host through the ssh of this host.
+        It needs passwordless ssh between the two hosts and fails fast otherwise, the caller falls back to sending from the control machine.
+        The host key of the target is only accepted when this host does not know it yet, a changed key fails the relay.
+        """
+        if self._is_local or target._is_local or target.is_localhost():
+            return False
+        ssh_cmd = 'ssh -o BatchMode=yes -o StrictHostKeyChecking=accept-new -o ConnectTimeout=10 -p %d %s@%s' % (
+            target.config.port, target.config.username, target.config.host)
+        extract_cmd = TarTransfer.extract_command(target_dir)
+        cmd = 'tar -C {source_dir} -cf - {names} | {ssh} {extract}'.format(
+            source_dir=shell_quote(source_dir),
+            names=' '.join([shell_quote(name) for name in names]) if names else '.',
+            ssh=ssh_cmd,
+            extract=shell_quote(extract_cmd)
+        )
+        stdio.verbose('relay %s:%s to %s:%s' % (self.config.host, source_dir, target.config.host, target_dir))
+        return bool(self.execute_command(cmd, stdio=stdio))
+
     def put_file(self, local_path, remote_path, stdio=None):
         if not os.path.isfile(local_path):
             stdio.error('path: %s is not file' % local_path)
@@ -602,8 +1566,15 @@ class SshClient(SafeStdio):
             return False
         if not self.execute_command('mkdir -p %s' % remote_dir, stdio=stdio):
             return False
+        transporter = self._dir_transporter(lambda: self._count_local_files(local_dir))
+        if transporter == RemoteTransporter.CLIENT:
+            # the client transporter reports its progress by itself
+            return self._client_put_dir(local_dir, remote_dir, stdio=stdio)
         stdio.start_loading('Send %s to %s' % (local_dir, remote_dir))
-        ret = self._put_dir(local_dir, remote_dir, stdio=stdio)
+        if transporter == RemoteTransporter.TAR:
+            ret = self._tar_put_dir(local_dir, remote_dir, stdio=stdio)
+        else:
+            ret = self._put_dir(local_dir, remote_dir, stdio=stdio)
         stdio.stop_loading('succeed' if ret else 'fail')
         return ret
 
@@ -614,29 +1585,11 @@ class SshClient(SafeStdio):
         else:
             return self._client_put_dir
 
+    def _tar_put_dir(self, local_dir, remote_dir, stdio=None):
+        return TarTransfer(self, codec=self.tar_codec, stdio=stdio).put_dir(local_dir, remote_dir)
+
     def _client_put_dir(self, local_dir, remote_dir, stdio=None):
-        has_failed = False
-        ret = LocalClient.execute_command('find %s -type f' % local_dir)
-        if not ret:
-            has_failed = True
-        all_files = ret.stdout.strip().split('\n') if ret.stdout else []
-        ret = LocalClient.execute_command('find %s -type d' % local_dir)
-        if not ret:
-            has_failed = True
-        all_dirs = ret.stdout.strip().split('\n') if ret.stdout else []
-        self._filter_dir_in_file_path(all_files, all_dirs)
-        for local_path in all_files:
-            remote_path = os.path.join(remote_dir, os.path.relpath(local_path, local_dir))
-            if not self._client_put_file(local_path, remote_path, stdio=stdio):
-                stdio.error('Fail to get %s' % remote_path)
-                has_failed = True
-        for local_path in all_dirs:
-            remote_path = os.path.join(remote_dir, os.path.relpath(local_path, local_dir))
-            stat = oct(os.stat(local_path).st_mode)[-3:]
-            cmd = '[ -d "{remote_path}" ] || (mkdir -p {remote_path}; chmod {stat} {remote_path})'.format(remote_path=remote_path, stat=stat)
-            if not self.execute_command(cmd):
-                has_failed = True
-        return not has_failed
+        return SftpTransfer(self, stdio=stdio).put_dir(local_dir, remote_dir)
 
     def get_file(self, local_path, remote_path, stdio=None):
         dirname, _ = os.path.split(local_path)
@@ -716,8 +1669,14 @@ class SshClient(SafeStdio):
             return LocalClient.get_dir(local_dir, remote_dir, stdio=stdio)
         if not self._open_sftp(stdio=stdio):
             return False
+        transporter = self._dir_transporter(lambda: self._count_remote_files(remote_dir, stdio=stdio))
+        if transporter == RemoteTransporter.CLIENT:
+            return self._client_get_dir(local_dir, remote_dir, stdio=stdio)
         stdio.start_loading('Get %s from %s' % (local_dir, remote_dir))
-        ret = self._get_dir(local_dir, remote_dir, stdio=stdio)
+        if transporter == RemoteTransporter.TAR:
+            ret = DirectoryUtil.mkdir(local_dir, stdio=stdio) and self._tar_get_dir(local_dir, remote_dir, stdio=stdio)
+        else:
+            ret = self._get_dir(local_dir, remote_dir, stdio=stdio)
         stdio.stop_loading('succeed' if ret else 'fail')
         return ret
 
@@ -728,95 +1687,14 @@ class SshClient(SafeStdio):
         else:
             return self._client_get_dir
 
-    def _client_get_dir(self, local_dir, remote_dir, stdio=None):
-        task_queue = []
-        has_failed = False
-        if DirectoryUtil.mkdir(local_dir, stdio=stdio):
-            try:
-                ret = self.execute_command('find %s -type f' % remote_dir)
-                if not ret:
-                    stdio.verbose(ret.stderr)
-                    has_failed = True
-                all_files = ret.stdout.strip().split('\n') if ret.stdout else []
-                ret = self.execute_command('find %s -type d' % remote_dir)
-                if not ret:
-                    has_failed = True
-                all_dirs = ret.stdout.strip().split('\n') if ret.stdout else []
-                self._filter_dir_in_file_path(all_files, all_dirs)
-                for f in all_files:
-                    task_queue.append(f)
-                if "*" in remote_dir:
-                    remote_base_dir = os.path.dirname(remote_dir)
-                else:
-                    remote_base_dir = remote_dir
-                for remote_path in task_queue:
-                    local_path = os.path.join(local_dir, os.path.relpath(remote_path, remote_dir))
-                    if not self._client_get_file(local_path, remote_path, stdio=stdio):
-                        stdio.error('Fail to get %s' % remote_path)
-                        has_failed = True
-                for remote_path in all_dirs:
-                    try:
-                        local_path = os.path.join(local_dir, os.path.relpath(remote_path, remote_base_dir))
-                        if not os.path.exists(local_path):
-                            stat = self.sftp.stat(remote_path)
-                            os.makedirs(local_path, mode=stat.st_mode)
-                    except Exception as e:
-                        stdio.exception('Fail to make directory %s in local: %s' % (remote_path, e))
-                        has_failed = True
-                return not has_failed
-            except Exception as e:
-                stdio.exception('Fail to get %s: %s' % (remote_dir, e))
+    def _tar_get_dir(self, local_dir, remote_dir, stdio=None):
+        return TarTransfer(self, codec=self.tar_codec, stdio=stdio).get_dir(local_dir, remote_dir)
 
-    @staticmethod
-    def _filter_dir_in_file_path(files, directories):
-        skip_directories = []
-        for path in files:
-            dir_name = os.path.dirname(path)
-            while dir_name not in ["/", ".", ""]:
-                if dir_name in skip_directories:
-                    break
-                if dir_name in directories:
-                    directories.remove(dir_name)
-                    skip_directories.append(dir_name)
-                dir_name = os.path.dirname(dir_name)
-
-    def file_downloader(self, local_dir, remote_dir, stdio=None):
-        try:
-            client = SshClient(config=self.config, stdio=None)
-            client._open_sftp(stdio=stdio)
-            client._remote_transporter = self.remote_transporter
-            while True:
-                remote_path = self.task_queue.get(block=False)
-                local_path = os.path.join(local_dir, os.path.relpath(remote_path, remote_dir))
-                if client.get_file(local_path, remote_path, stdio=stdio):
-                    self.result_queue.put(remote_path)
-                else:
-                    stdio.error('Fail to get %s' % remote_path)
-        except Empty:
-            return
-        except:
-            stdio.exception("")
-            stdio.exception('Failed to get %s' % remote_dir)
-
-    def file_uploader(self, local_dir, remote_dir, stdio=None):
+    def _client_get_dir(self, local_dir, remote_dir, stdio=None):
+        if not DirectoryUtil.mkdir(local_dir, stdio=stdio):
+            return False
         try:
-            client = SshClient(config=self.config, stdio=None)
-            client._remote_transporter = self.remote_transporter
-            while True:
-                local_path, is_dir = self.task_queue.get(block=False)
-                remote_path = os.path.join(remote_dir, os.path.relpath(local_path, local_dir))
-                if is_dir:
-                    stat = oct(os.stat(local_path).st_mode)[-3:]
-                    cmd = '[ -d "{remote_path}" ] || (mkdir -p {remote_path}; chmod {stat} {remote_path})'.format(remote_path=remote_path, stat=stat)
-                    if client.execute_command(cmd):
-                        self.result_queue.put(remote_path)
-                else:
-                    if client.put_file(local_path, remote_path, stdio=stdio):
-                        self.result_queue.put(remote_path)
-                    else:
-                        stdio.error('Fail to get %s' % remote_path)
-        except Empty:
-            return
-        except:
-            stdio.exception("")
-            stdio.verbose('Failed to get %s' % remote_dir)
+            return SftpTransfer(self, stdio=stdio).get_dir(local_dir, remote_dir)
+        except Exception as e:
+            stdio.exception('Fail to get %s: %s' % (remote_dir, e))
+            return False
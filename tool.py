@@ -34,6 +34,7 @@ import re
 import json
 import hashlib
 import socket
+import time
 import datetime
 from io import BytesIO
 from copy import copy
@@ -43,9 +44,9 @@ from ruamel.yaml import YAML, YAMLContextManager, representer
 
 from _errno import EC_SQL_EXECUTE_FAILED
 from _stdio import SafeStdio
+from _environ import ENV_MAJOR_COMPACTION_TIMEOUT
 _open = open
 if sys.version_info.major == 2:
-    import MySQLdb as mysql
     from collections import OrderedDict
     from backports import lzma
     from io import open as _open
@@ -64,7 +65,6 @@ if sys.version_info.major == 2:
 
 else:
     import lzma
-    import pymysql as mysql
     encoding_open = open
 
     class OrderedDict(dict):
@@ -783,11 +783,14 @@ class Cursor(SafeStdio):
 
     if sys.version_info.major == 2:
         def _connect(self):
+            import MySQLdb as mysql
             self.stdio.verbose('connect %s -P%s -u%s -p%s' % (self.ip, self.port, self.user, self.password))
             self.db = mysql.connect(host=self.ip, user=self.user, port=int(self.port), passwd=str(self.password))
             self.cursor = self.db.cursor(cursorclass=mysql.cursors.DictCursor)
     else:
         def _connect(self):
+            # the mysql driver is only needed by the commands which connect to a cluster
+            import pymysql as mysql
             self.stdio.verbose('connect %s -P%s -u%s -p%s' % (self.ip, self.port, self.user, self.password))
             self.db = mysql.connect(host=self.ip, user=self.user, port=int(self.port), password=str(self.password),
                                     cursorclass=mysql.cursors.DictCursor)
@@ -832,3 +835,129 @@ class Cursor(SafeStdio):
         if self.db:
             self.db.close()
             self.db = None
+
+
+class CompactionWaiter(SafeStdio):
+
+    """
+    Start a major compaction and wait for it to finish. With tenant_id the CDB views of OceanBase 4.x are used,
+    otherwise the __all_zone table of OceanBase 3.x. The interval between the polls grows while nothing changes
+    and shrinks to the estimated time left while the progress moves, and the progress of every zone is shown
+    in the loading text.
+    """
+
+    MIN_INTERVAL = 0.5
+    MAX_INTERVAL = 10
+    BACKOFF = 1.5
+
+    def __init__(self, cursor, tenant_id=None, timeout=None, text='Merge', stdio=None):
+        self.cursor = cursor
+        self.tenant_id = tenant_id
+        if timeout is None:
+            timeout = int(COMMAND_ENV.get(ENV_MAJOR_COMPACTION_TIMEOUT, 0) or 0)
+        self.timeout = timeout
+        self.text = text
+        self.stdio = stdio
+        self._show_progress = True
+
+    def _sleep(self, interval, start_time, stdio=None):
+        if self.timeout and time.time() + interval - start_time > self.timeout:
+            remain = self.timeout - (time.time() - start_time)
+            if remain <= 0:
+                stdio.error('Wait for major compaction timeout: %ss' % self.timeout)
+                return False
+            interval = remain
+        time.sleep(interval)
+        return True
+
+    def _frozen_version(self):
+        if self.tenant_id is None:
+            ret = self.cursor.fetchone("select value from oceanbase.__all_zone where name='frozen_version'")
+            return ret and int(ret['value'])
+        ret = self.cursor.fetchone("select FROZEN_SCN, LAST_SCN from oceanbase.CDB_OB_MAJOR_COMPACTION where tenant_id = %s" % self.tenant_id)
+        return ret and int(ret['FROZEN_SCN'])
+
+    def _zone_progress(self, frozen_version):
+        # {zone: merged percent}, None if the views can not be read
+        if self.tenant_id is None:
+            rows = self.cursor.fetchall("select zone, name, value, info from oceanbase.__all_zone where name in ('last_merged_version', 'status') and zone != ''")
+            if rows is False:
+                return None
+            active_zones = set([row['zone'] for row in rows if row['name'] == 'status' and row['info'] == 'ACTIVE'])
+            return dict([(row['zone'], 100.0 if int(row['value']) >= frozen_version else 0.0) for row in rows if row['name'] == 'last_merged_version' and row['zone'] in active_zones])
+        if not self._show_progress:
+            return {}
+        sql = "select ZONE, sum(TOTAL_TABLET_COUNT) as TOTAL, sum(UNFINISHED_TABLET_COUNT) as UNFINISHED " \
+              "from oceanbase.GV$OB_COMPACTION_PROGRESS where TENANT_ID = %s and COMPACTION_SCN = %s group by ZONE" % (self.tenant_id, frozen_version)
+        rows = self.cursor.fetchall(sql, exc_level='verbose')
+        if rows is False:
+            # the view is optional, wait without the progress
+            self._show_progress = False
+            return {}
+        return dict([(row['ZONE'], 100.0 * (1 - float(row['UNFINISHED'] or 0) / float(row['TOTAL'])) if row['TOTAL'] else 0.0) for row in rows])
+
+    def _merged(self, frozen_version):
+        if self.tenant_id is None:
+            ret = self.cursor.fetchone("""select * from oceanbase.__all_zone
+                                          where name='last_merged_version' and value < %s
+                                          and zone in (select zone from oceanbase.__all_zone where name='status' and info = 'ACTIVE')
+                                       """ % frozen_version)
+            return None if ret is False else not ret
+        ret = self.cursor.fetchone("select FROZEN_SCN, LAST_SCN from oceanbase.CDB_OB_MAJOR_COMPACTION where tenant_id = %s" % self.tenant_id)
+        return None if ret is False else int(ret['FROZEN_SCN']) // 1000 == int(ret['LAST_SCN']) // 1000
+
+    def major_freeze(self, tenant_name=None, stdio=None):
+        merge_version = self._frozen_version()
+        if merge_version is False or merge_version is None:
+            return False
+        if tenant_name:
+            sql = "alter system major freeze tenant = %s" % tenant_name
+        else:
+            sql = "alter system major freeze"
+        if self.cursor.execute(sql) is False:
+            return False
+        return self.wait(merge_version)
+
+    def wait(self, merge_version, stdio=None):
+        """
+        Wait until the frozen version is newer than merge_version and the compaction of that version is done.
+        """
+        start_time = time.time()
+        interval = self.MIN_INTERVAL
+        while True:
+            frozen_version = self._frozen_version()
+            if frozen_version is False or frozen_version is None:
+                return False
+            if frozen_version > merge_version:
+                break
+            if not self._sleep(interval, start_time):
+                return False
+            interval = min(interval * self.BACKOFF, self.MAX_INTERVAL)
+        stdio.verbose('current merge version is: %s' % frozen_version)
+
+        interval = self.MIN_INTERVAL
+        merge_start_time = time.time()
+        last_percent = 0
+        while True:
+            merged = self._merged(frozen_version)
+            if merged is None:
+                return False
+            if merged:
+                stdio.verbose('major compaction of %s finished in %.2fs' % (frozen_version, time.time() - start_time))
+                return True
+            progress = self._zone_progress(frozen_version)
+            if progress is None:
+                return False
+            percent = sum(progress.values()) / len(progress) if progress else 0
+            if progress:
+                stdio.update_loading_text('%s %.1f%% (%s)' % (self.text, percent, ', '.join(['%s %.1f%%' % (zone, progress[zone]) for zone in sorted(progress)])))
+            if percent > last_percent:
+                # poll again at about half of the estimated time left
+                elapsed = time.time() - merge_start_time
+                interval = elapsed * (100 - percent) / percent / 2
+                last_percent = percent
+            else:
+                interval *= self.BACKOFF
+            interval = min(max(interval, self.MIN_INTERVAL), self.MAX_INTERVAL)
+            if not self._sleep(interval, start_time):
+                return False